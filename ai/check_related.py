@@ -1,3 +1,4 @@
+import re
 import yaml
 import json
 import tempfile
@@ -7,12 +8,89 @@ from pathlib import Path
 import multiprocessing
 from functools import partial
 import argparse
+from relevance_model import RelevanceModel, PREFILTER_SOURCE
+from llm_ledger import LLMLedger, BudgetExceeded, print_summary, current_run_id
+
+# Exit code gen_struct.py uses when the LLM budget is used up (keep in sync with gen_struct.py)
+EXIT_BUDGET_EXHAUSTED = 3
+
+class ClassificationJournal:
+    """Append-only JSONL log of classification verdicts, fsync'd in groups."""
+
+    def __init__(self, path, fsync_every=5):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.pending = 0
+        self.file = None
+
+    def replay(self):
+        """Return {url: (is_related, source)} for every verdict already in the journal."""
+        verdicts = {}
+        if not self.path.exists():
+            return verdicts
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a truncated last line behind
+                    continue
+                verdicts[entry['url']] = (entry['is_related'], entry.get('source'))
+        return verdicts
+
+    def append(self, url, is_related, source=None):
+        """Append one verdict, syncing to disk every fsync_every records."""
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        entry = {'url': url, 'is_related': is_related}
+        if source:
+            entry['source'] = source
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.pending += 1
+        if self.pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        if self.file is None or not self.pending:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        """Delete the journal once its verdicts are compacted into links.yml."""
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
 
 def load_template(template_path):
     """Load the template file"""
     with open(template_path, 'r', encoding='utf-8') as f:
         return f.read()
 
+def warn_unstable_prefix(template, template_path):
+    """Warn when instructions follow the per-link fields.
+
+    Providers cache identical prompt prefixes; text after the first {placeholder}
+    differs per link and is re-read in full on every call. The template is used
+    as written: reorder it by hand so the instructions come before the fields.
+    """
+    lines = template.rstrip('\n').split('\n')
+    dynamic = [i for i, line in enumerate(lines) if re.search(r'\{\w+\}', line)]
+    if not dynamic:
+        return
+    # Blank lines and closing code fences after the last field are harmless
+    trailing = [line for line in lines[dynamic[-1] + 1:] if line.strip() and line.strip().strip('`')]
+    if trailing:
+        print(f"Warning: {template_path} has {len(trailing)} instruction lines after its per-link fields; "
+              "move them above the first {placeholder} so prompts share a cacheable prefix")
+
 def get_ai_classification(title, link, snippet, gen_struct_path, template):
     """Ask AI to classify if the content is related"""
     # Define the JSON schema for classification
@@ -48,18 +126,29 @@ def get_ai_classification(title, link, snippet, gen_struct_path, template):
     with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.json') as temp_output:
         temp_output_path = temp_output.name
 
+    # Attribute the spend in the LLM ledger
+    env = os.environ.copy()
+    env['LLM_STAGE'] = 'check_related'
+    env['LLM_DOCUMENT'] = link
+
     try:
         # Run gen_struct.py
         subprocess.run([
             'python', gen_struct_path,
             temp_input_path, temp_output_path, schema_file
-        ], check=True)
+        ], check=True, env=env)
 
         # Read the result
         with open(temp_output_path, 'r', encoding='utf-8') as f:
             result = json.load(f)
         print(f"Result: {result}")
         return result["is_related"].lower()  # Convert to lowercase to match YAML
+    except subprocess.CalledProcessError as e:
+        if e.returncode == EXIT_BUDGET_EXHAUSTED:
+            print(f"LLM budget exhausted, leaving {link} unclassified")
+        else:
+            print(f"Error during AI classification: {e}")
+        return "unknown"
     except Exception as e:
         print(f"Error during AI classification: {e}")
         return "unknown"
@@ -72,6 +161,12 @@ def get_ai_classification(title, link, snippet, gen_struct_path, template):
 def process_url(template, gen_struct_path, url_data):
     """Process a single URL (to be run in parallel)"""
     url, data = url_data
+    # Stop scheduling new LLM work once the budget is used up; the entry stays unknown
+    try:
+        LLMLedger().check_budget()
+    except BudgetExceeded as e:
+        print(f"Skipping {url}: {e}")
+        return None
     print(f"Processing: {url}")
     result = get_ai_classification(
         data.get('title'),
@@ -93,6 +188,16 @@ def main():
                       help='Path to template file')
     parser.add_argument('-g', '--gen-struct', type=Path, default=Path('.github/scripts/ai/gen_struct.py'),
                       help='Path to gen_struct.py script')
+    parser.add_argument('-j', '--journal', type=Path, default=None,
+                      help='Path to the verdict journal (default: <input>.journal.jsonl)')
+    parser.add_argument('--fsync-every', type=int, default=5,
+                      help='Number of verdicts to buffer before syncing the journal to disk')
+    parser.add_argument('--prefilter', type=Path, default=None,
+                      help='Path to a relevance_model.py model used to auto-label confident entries')
+    parser.add_argument('--prefilter-low', type=float, default=0.05,
+                      help='Auto-label False at or below this prefilter probability')
+    parser.add_argument('--prefilter-high', type=float, default=0.95,
+                      help='Auto-label True at or above this prefilter probability')
     args = parser.parse_args()
 
     # Validate paths
@@ -108,51 +213,81 @@ def main():
         links_data = yaml.safe_load(f)
 
     template = load_template(args.template)
+    warn_unstable_prefix(template, args.template)
+
+    # Replay verdicts from an interrupted run so they are not paid for again
+    journal_path = args.journal or args.input.with_name(args.input.name + '.journal.jsonl')
+    journal = ClassificationJournal(journal_path, args.fsync_every)
+    replayed = 0
+    for url, (is_related, source) in journal.replay().items():
+        if url in links_data:
+            links_data[url]['is_related'] = is_related
+            if source:
+                links_data[url]['is_related_source'] = source
+            replayed += 1
+    if replayed:
+        print(f"Replayed {replayed} verdicts from {journal_path}")
+    modified = replayed > 0
 
-    # Process each unknown entry
-    modified = False
-    batch_count = 0
-    
     # Get items needing processing
     to_process = [(url, data) for url, data in links_data.items() 
                  if not data.get('is_related') or data.get('is_related') == 'unknown']
+
+    # Auto-label the confident ends locally and only send the uncertain band to the LLM
+    if args.prefilter:
+        model = RelevanceModel.load(args.prefilter)
+        uncertain = []
+        auto_counts = {'true': 0, 'false': 0}
+        for url, data in to_process:
+            probability = model.predict(data.get('title'), data.get('snippet'))
+            if probability >= args.prefilter_high:
+                is_related = 'true'
+            elif probability <= args.prefilter_low:
+                is_related = 'false'
+            else:
+                uncertain.append((url, data))
+                continue
+            journal.append(url, is_related, PREFILTER_SOURCE)
+            links_data[url]['is_related'] = is_related
+            links_data[url]['is_related_source'] = PREFILTER_SOURCE
+            auto_counts[is_related] += 1
+            modified = True
+        print(f"Prefilter auto-labeled {auto_counts['true']} True and {auto_counts['false']} False, "
+              f"{len(uncertain)}/{len(to_process)} left for the LLM")
+        to_process = uncertain
+    total = len(to_process)
     
     # Create a pool with 5 processes
-    with multiprocessing.Pool(5) as pool:
-        # Create a partial function with template and gen_struct_path
-        process_func = partial(process_url, template, args.gen_struct)
-        
-        # Process items in chunks of 5
-        for i in range(0, len(to_process), 5):
-            chunk = to_process[i:i + 5]
-            print(f"Processing batch {i//5 + 1}/{(len(to_process) + 4)//5}")
-            
-            # Process chunk in parallel
-            results = pool.map(process_func, chunk)
-            
-            # Update results
-            modified_in_batch = False
-            for result in results:
+    try:
+        with multiprocessing.Pool(5) as pool:
+            # Create a partial function with template and gen_struct_path
+            process_func = partial(process_url, template, args.gen_struct)
+
+            # Journal each verdict as soon as it arrives
+            for done, result in enumerate(pool.imap_unordered(process_func, to_process), 1):
                 if result:
                     url, is_related = result
+                    journal.append(url, is_related)
                     links_data[url]['is_related'] = is_related
                     modified = True
-                    modified_in_batch = True
-                    batch_count += 1
-                    print(f"Updated {url} to {is_related}")
-            
-            # Write changes after every 6 batches
-            if modified_in_batch and (i//5 + 1) % 6 == 0:
-                with open(args.input, 'w', encoding='utf-8') as f:
-                    yaml.dump(links_data, f, allow_unicode=True)
-                    f.flush()
-                    print(f"Batch of {batch_count} changes saved to links.yml")
-                    batch_count = 0
-
-    with open(args.input, 'w', encoding='utf-8') as f:
-        yaml.dump(links_data, f, allow_unicode=True)
+                    print(f"Updated {url} to {is_related} ({done}/{total})")
+    finally:
+        journal.close()
+
+    # Compact the journal into links.yml once at the end; write a partial file and
+    # rename it, so a crash never truncates links.yml and the journal is kept until then
+    if modified:
+        links_part = args.input.with_name(args.input.name + '.part')
+        with open(links_part, 'w', encoding='utf-8') as f:
+            yaml.dump(links_data, f, allow_unicode=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(links_part, args.input)
+        print(f"Saved classifications to {args.input}")
+    journal.remove()
     if not modified:
         print("No changes were necessary")
+    print_summary(run_id=current_run_id())
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,17 @@
 import os
+import sys
+import time
 import json
 import openai
 import argparse
 from openai import OpenAI
 from dotenv import load_dotenv
 import base64
+from llm_cache import LLMCache, make_key
+from llm_ledger import LLMLedger, BudgetExceeded
+from model_router import (routing_enabled, load_policy, choose_route, small_model_name,
+                          structured_needs_escalation, ROUTE_DEFAULT, ROUTE_LARGE, ROUTE_ESCALATED)
+from image_prep import prepare_image, DEFAULT_MAX_EDGE, DEFAULT_FORMAT, FORMATS
 
 load_dotenv()
 openai.api_key = os.getenv('OPENAI_API_KEY')
@@ -17,6 +24,13 @@ if not temperature:
     temperature = 0.7
 print(f"Using temperature: {temperature}")
 client = OpenAI()
+cache = LLMCache()
+ledger = LLMLedger()
+
+# Exit codes understood by process_dir.py
+EXIT_FAILED = 1
+EXIT_RATE_LIMITED = 2
+EXIT_BUDGET_EXHAUSTED = 3
 
 def read_file(file_path):
     """Read the content of the input file."""
@@ -28,12 +42,50 @@ def write_file(file_path, content):
     with open(file_path, 'w', encoding='utf-8') as file:
         file.write(content)
 
-def encode_image(image_path):
-    """Encode image to base64 string."""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+def encode_image(image_path, max_edge=DEFAULT_MAX_EDGE, image_format=DEFAULT_FORMAT):
+    """Prepare the image and encode it to a base64 string, returning (data, mime type)."""
+    data, mime = prepare_image(image_path, max_edge, image_format)
+    return base64.b64encode(data).decode('utf-8'), mime
+
+def request_completion(model, messages, schema, route):
+    """Get a raw JSON completion from the cache or the API; returns (text, ledger row id).
+
+    Invalid JSON raises json.JSONDecodeError with the ledger row id as its row_id.
+    """
+    cache_key = make_key(model, temperature, messages, schema)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        print(f"Cache hit: {cache_key[:12]}")
+        return cached, ledger.record(model, cache_hit=True, route=route)
+
+    ledger.check_budget()
+    started = time.monotonic()
+    completion = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        response_format={
+            "type": "json_schema",
+            "json_schema": {
+                "name": "response",
+                "schema": schema,
+                "strict": True
+            }
+        }
+    )
 
-def generate_cleanup_content(content, schema, image_path=None):
+    row_id = ledger.record(model, completion.usage, time.monotonic() - started, route=route)
+    result = completion.choices[0].message.content
+    try:
+        json.loads(result)
+    except json.JSONDecodeError as e:
+        # Not cached, but billed; the caller marks the row when it escalates
+        e.row_id = row_id
+        raise
+    cache.put(cache_key, result)
+    return result, row_id
+
+def generate_cleanup_content(content, schema, image_path=None,
+                             image_max_edge=DEFAULT_MAX_EDGE, image_format=DEFAULT_FORMAT):
     """Send the prompt and content to OpenAI's API and get the structured content."""
     
     messages = [
@@ -42,7 +94,7 @@ def generate_cleanup_content(content, schema, image_path=None):
 
     # Prepare user message with optional image
     if image_path:
-        base64_image = encode_image(image_path)
+        base64_image, mime = encode_image(image_path, image_max_edge, image_format)
         messages.append({
             "role": "user",
             "content": [
@@ -53,7 +105,7 @@ def generate_cleanup_content(content, schema, image_path=None):
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{base64_image}"
+                        "url": f"data:{mime};base64,{base64_image}"
                     }
                 }
             ]
@@ -61,20 +113,27 @@ def generate_cleanup_content(content, schema, image_path=None):
     else:
         messages.append({"role": "user", "content": content})
 
-    completion = client.chat.completions.create(
-        model=model_name,
-        messages=messages,
-        response_format={
-            "type": "json_schema",
-            "json_schema": {
-                "name": "response",
-                "schema": schema,
-                "strict": True
-            }
-        }
-    )
+    if not routing_enabled():
+        return json.loads(request_completion(model_name, messages, schema, ROUTE_DEFAULT)[0])
+
+    policy = load_policy()
+    route, reason = choose_route(content, os.getenv('LLM_STAGE'), policy)
+    if route == ROUTE_LARGE:
+        print(f"Routing to {model_name}: {reason}")
+        return json.loads(request_completion(model_name, messages, schema, route)[0])
 
-    return json.loads(completion.choices[0].message.content)
+    print(f"Routing to {small_model_name()}: {reason}")
+    try:
+        result, row_id = request_completion(small_model_name(), messages, schema, route)
+        problem = structured_needs_escalation(result, schema, policy)
+    except json.JSONDecodeError as e:
+        result, row_id, problem = None, getattr(e, 'row_id', None), "invalid JSON"
+    if problem is None:
+        return json.loads(result)
+    print(f"Escalating to {model_name}: {problem}")
+    if row_id is not None:
+        ledger.set_outcome(row_id, 'escalated')
+    return json.loads(request_completion(model_name, messages, schema, ROUTE_ESCALATED)[0])
 
 def main():
     # Set up command-line argument parsing
@@ -85,6 +144,10 @@ def main():
     parser.add_argument('output_file', help='Path to save the structured output file')
     parser.add_argument('schema_file', help='Path to the JSON schema file')
     parser.add_argument('--image', help='Optional path to an image file', default=None)
+    parser.add_argument('--image-max-edge', type=int, default=DEFAULT_MAX_EDGE,
+                        help='Downscale the image so its longest edge is at most this many pixels')
+    parser.add_argument('--image-format', choices=sorted(FORMATS), default=DEFAULT_FORMAT,
+                        help='Format the image is re-encoded to before upload')
 
     args = parser.parse_args()
 
@@ -96,15 +159,23 @@ def main():
         schema = json.loads(read_file(args.schema_file))
 
         # Generate structured content with optional image
-        structured_content = generate_cleanup_content(input_content, schema, args.image)
+        structured_content = generate_cleanup_content(input_content, schema, args.image,
+                                                      args.image_max_edge, args.image_format)
 
         # Write to output file
         write_file(args.output_file, json.dumps(structured_content, indent=2))
 
         print(f"Successfully processed '{args.input_file}' and saved structured output to '{args.output_file}'.")
 
+    except BudgetExceeded as e:
+        print(f"LLM budget exhausted: {e}")
+        sys.exit(EXIT_BUDGET_EXHAUSTED)
+    except openai.RateLimitError as e:
+        print(f"Rate limited: {e}")
+        sys.exit(EXIT_RATE_LIMITED)
     except Exception as e:
         print(f"An error occurred: {e}")
+        sys.exit(EXIT_FAILED)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+
+DEFAULT_CACHE_PATH = '.github/cache/llm_cache.sqlite'
+DEFAULT_MAX_MB = 512
+
+def _normalize_messages(messages):
+    """Replace inline base64 images with their hash so keys stay small and stable."""
+    normalized = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, list):
+            parts = []
+            for part in content:
+                if part.get('type') == 'image_url':
+                    url = part['image_url']['url']
+                    parts.append({
+                        'type': 'image_url',
+                        'image_sha256': hashlib.sha256(url.encode('utf-8')).hexdigest()
+                    })
+                else:
+                    parts.append(part)
+            content = parts
+        normalized.append({'role': message.get('role'), 'content': content})
+    return normalized
+
+def make_key(model, temperature, messages, schema=None):
+    """Build a content-addressed cache key for one completion request."""
+    payload = {
+        'model': model,
+        'temperature': str(temperature),
+        'schema': schema,
+        'messages': _normalize_messages(messages)
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+class LLMCache:
+    """Persistent, size-bounded LRU cache of LLM completions backed by SQLite."""
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or os.getenv('LLM_CACHE_PATH') or DEFAULT_CACHE_PATH
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('LLM_CACHE_MAX_MB') or DEFAULT_MAX_MB) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.enabled = os.getenv('LLM_CACHE_DISABLE', '').lower() not in ('1', 'true', 'yes')
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            # Several gen.py processes may share the cache (check_related runs a pool)
+            self._conn = sqlite3.connect(self.path, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                'created REAL NOT NULL, last_access REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, count INTEGER NOT NULL)')
+            self._conn.commit()
+        return self._conn
+
+    def _bump(self, conn, name):
+        conn.execute(
+            'INSERT INTO stats (name, count) VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET count = count + 1',
+            (name,)
+        )
+
+    def get(self, key):
+        """Return the cached completion for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        conn = self._connect()
+        with conn:
+            row = conn.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._bump(conn, 'misses')
+                return None
+            conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+            self._bump(conn, 'hits')
+        return row[0]
+
+    def put(self, key, value):
+        """Store a completion and evict least recently used entries over the size bound."""
+        if not self.enabled:
+            return
+        conn = self._connect()
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, created, last_access) VALUES (?, ?, ?, ?, ?)',
+                (key, value, size, now, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute('SELECT key, size FROM entries ORDER BY last_access ASC').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        conn.execute(
+            'INSERT INTO stats (name, count) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET count = count + excluded.count',
+            ('evictions', evicted)
+        )
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current cache size."""
+        conn = self._connect()
+        counters = dict(conn.execute('SELECT name, count FROM stats').fetchall())
+        entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        lookups = hits + misses
+        return {
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'evictions': counters.get('evictions', 0),
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
+
+    def clear(self):
+        """Drop all cached entries and reset the counters."""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM entries')
+            conn.execute('DELETE FROM stats')
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the LLM response cache')
+    parser.add_argument('command', choices=['stats', 'clear'], help='Action to perform')
+    parser.add_argument('--path', default=None, help=f'Cache database path (default: {DEFAULT_CACHE_PATH})')
+    args = parser.parse_args()
+
+    cache = LLMCache(args.path)
+    if args.command == 'clear':
+        cache.clear()
+        print(f"Cleared cache at {cache.path}")
+        return
+
+    stats = cache.stats()
+    print(f"Cache: {cache.path}")
+    print(f"  Entries: {stats['entries']}")
+    print(f"  Size: {stats['bytes'] / 1024 / 1024:.2f} MB / {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+    print(f"  Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {stats['hit_rate']:.1%}")
+    print(f"  Evictions: {stats['evictions']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import re
+import json
+import math
+import zlib
+import random
+import argparse
+from pathlib import Path
+
+import yaml
+
+NUM_BUCKETS = 1 << 18
+NGRAM_SIZES = (1, 2, 3)
+PREFILTER_SOURCE = 'prefilter'
+
+def extract_features(title, snippet):
+    """Hash character n-grams and latin words of title+snippet into sparse counts."""
+    text = f"{title or ''} {snippet or ''}".lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    features = {}
+    for word in re.findall(r'[a-z0-9+]+', text):
+        bucket = zlib.crc32(f"w:{word}".encode('utf-8')) % NUM_BUCKETS
+        features[bucket] = features.get(bucket, 0) + 1
+    # Chinese has no word boundaries, so character n-grams carry most of the signal
+    chars = re.sub(r'[a-z0-9+\s]+', ' ', text)
+    for n in NGRAM_SIZES:
+        for i in range(len(chars) - n + 1):
+            gram = chars[i:i + n]
+            if ' ' in gram:
+                continue
+            bucket = zlib.crc32(f"c{n}:{gram}".encode('utf-8')) % NUM_BUCKETS
+            features[bucket] = features.get(bucket, 0) + 1
+    # L2-normalize so long snippets do not dominate the margin
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {k: v / norm for k, v in features.items()}
+
+def _sigmoid(x):
+    if x < -30:
+        return 0.0
+    if x > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-x))
+
+class RelevanceModel:
+    """Logistic regression over hashed n-grams, trained with plain SGD."""
+
+    def __init__(self, weights=None, bias=0.0):
+        self.weights = weights or {}
+        self.bias = bias
+
+    def predict(self, title, snippet):
+        """Return the probability that an entry is related."""
+        features = extract_features(title, snippet)
+        score = self.bias + sum(self.weights.get(k, 0.0) * v for k, v in features.items())
+        return _sigmoid(score)
+
+    def fit(self, samples, epochs=8, learning_rate=0.5, l2=1e-5, seed=42):
+        """Train on a list of (title, snippet, label) tuples with label 0 or 1."""
+        data = [(extract_features(title, snippet), label) for title, snippet, label in samples]
+        positives = sum(label for _, label in data) or 1
+        negatives = (len(data) - positives) or 1
+        # Most snippets are unrelated; weight classes so recall on True does not collapse
+        class_weight = {1: len(data) / (2 * positives), 0: len(data) / (2 * negatives)}
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch)
+            for features, label in data:
+                score = self.bias + sum(self.weights.get(k, 0.0) * v for k, v in features.items())
+                gradient = (_sigmoid(score) - label) * class_weight[label]
+                for k, v in features.items():
+                    w = self.weights.get(k, 0.0)
+                    self.weights[k] = w - rate * (gradient * v + l2 * w)
+                self.bias -= rate * gradient
+        return self
+
+    def save(self, path):
+        weights = {str(k): round(v, 6) for k, v in self.weights.items() if abs(v) > 1e-6}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'num_buckets': NUM_BUCKETS, 'bias': self.bias, 'weights': weights}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('num_buckets') != NUM_BUCKETS:
+            raise ValueError(f"Model {path} was trained with a different feature size")
+        return cls({int(k): v for k, v in data['weights'].items()}, data['bias'])
+
+def load_labeled_links(links_path):
+    """Return (url, title, snippet, label) for every LLM-labeled True/False entry."""
+    with open(links_path, 'r', encoding='utf-8') as f:
+        links_data = yaml.safe_load(f) or {}
+    samples = []
+    for url, data in links_data.items():
+        # Never train on the prefilter's own guesses
+        if data.get('is_related_source') == PREFILTER_SOURCE:
+            continue
+        label = str(data.get('is_related', '')).lower()
+        if label not in ('true', 'false'):
+            continue
+        samples.append((url, data.get('title'), data.get('snippet'), 1 if label == 'true' else 0))
+    return samples
+
+def is_holdout(url, holdout_fraction):
+    """Deterministically assign a URL to the held-out split."""
+    return zlib.crc32(url.encode('utf-8')) % 1000 < holdout_fraction * 1000
+
+def threshold_report(scored, thresholds):
+    """Precision/recall of the True class for each decision threshold."""
+    rows = []
+    for t in thresholds:
+        tp = sum(1 for p, label in scored if p >= t and label == 1)
+        fp = sum(1 for p, label in scored if p >= t and label == 0)
+        fn = sum(1 for p, label in scored if p < t and label == 1)
+        precision = tp / (tp + fp) if tp + fp else 1.0
+        recall = tp / (tp + fn) if tp + fn else 1.0
+        rows.append((t, precision, recall))
+    return rows
+
+def band_report(scored, low, high):
+    """How many entries a (low, high) band auto-labels and how often it disagrees with the LLM."""
+    auto_true = [label for p, label in scored if p >= high]
+    auto_false = [label for p, label in scored if p <= low]
+    auto = len(auto_true) + len(auto_false)
+    errors = auto_true.count(0) + auto_false.count(1)
+    return {
+        'auto_labeled': auto,
+        'coverage': auto / len(scored) if scored else 0.0,
+        'errors': errors,
+        'error_rate': errors / auto if auto else 0.0,
+        'missed_related': auto_false.count(1)
+    }
+
+def train(links_path, output_path, holdout_fraction=0.2, low=0.05, high=0.95, full=False):
+    samples = load_labeled_links(links_path)
+    train_set = [(t, s, y) for url, t, s, y in samples if not is_holdout(url, holdout_fraction)]
+    test_set = [(t, s, y) for url, t, s, y in samples if is_holdout(url, holdout_fraction)]
+    print(f"Loaded {len(samples)} labeled entries ({len(train_set)} train, {len(test_set)} held out)")
+    if not train_set:
+        print("No labeled entries to train on")
+        return None
+
+    model = RelevanceModel().fit(train_set)
+
+    if test_set:
+        scored = [(model.predict(t, s), y) for t, s, y in test_set]
+        print("\nHeld-out precision/recall for is_related=True:")
+        print("  threshold  precision  recall")
+        for t, precision, recall in threshold_report(scored, [i / 10 for i in range(1, 10)]):
+            print(f"  {t:9.2f}  {precision:9.3f}  {recall:6.3f}")
+        band = band_report(scored, low, high)
+        print(f"\nBand low={low} high={high}:")
+        print(f"  Auto-labeled: {band['auto_labeled']}/{len(scored)} ({band['coverage']:.1%})")
+        print(f"  Disagreements with LLM: {band['errors']} ({band['error_rate']:.1%})")
+        print(f"  Related entries auto-labeled False: {band['missed_related']}")
+
+    if full:
+        print("\nRefitting on all labeled entries")
+        model = RelevanceModel().fit([(t, s, y) for _, t, s, y in samples])
+
+    model.save(output_path)
+    print(f"\nModel saved to {output_path}")
+    return model
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the local relevance prefilter from links.yml verdicts')
+    parser.add_argument('-i', '--input', type=Path, default=Path('.github/links.yml'),
+                      help='Path to links.yml with historical is_related labels')
+    parser.add_argument('-o', '--output', type=Path, default=Path('.github/relevance_model.json'),
+                      help='Where to save the trained model')
+    parser.add_argument('--holdout', type=float, default=0.2,
+                      help='Fraction of labeled entries held out for the report')
+    parser.add_argument('--low', type=float, default=0.05,
+                      help='Probability at or below which entries are auto-labeled False')
+    parser.add_argument('--high', type=float, default=0.95,
+                      help='Probability at or above which entries are auto-labeled True')
+    parser.add_argument('--full', action='store_true',
+                      help='Refit on all labeled entries after reporting')
+    args = parser.parse_args()
+
+    if not args.input.exists():
+        raise FileNotFoundError(f"Input file not found: {args.input}")
+    train(args.input, args.output, args.holdout, args.low, args.high, args.full)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_CJK = re.compile(r'[　-〿㐀-䶿一-鿿豈-﫿＀-￯]')
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding('o200k_base')
+        except Exception:
+            _encoding = tiktoken.get_encoding('cl100k_base')
+    return _encoding
+
+def count_tokens(text):
+    """Count tokens with tiktoken when installed, otherwise estimate them."""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_get_encoding().encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+def estimate_tokens(text):
+    """Rough token estimate: about one token per CJK character, four other characters per token."""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
@@ -166,6 +166,13 @@ def process_webpages(date_dir: Path) -> None:
             "HTML_CLEANER_CONFIG": ".github/downloader/web_cleanup/cleaner/configs/default.json"
         }, check=True)
 
+        # Move metadata extracted by the cleaner's selectors into page.yml
+        subprocess.run([
+            "python3", ".github/downloader/web_cleanup/config/merge_extracted_meta.py",
+            str(cleaned_dir),
+            str(downloads_dir / "page.yml")
+        ], check=True)
+
         # Convert to Markdown
         subprocess.run([
             "python3", ".github/downloader/web_cleanup/batch.py",
@@ -179,7 +186,8 @@ def process_webpages(date_dir: Path) -> None:
             "python3", ".github/downloader/web_cleanup/ai/process_dir.py",
             str(markdown_dir),
             str(ready_dir),
-            ".github/downloader/web_cleanup/ai/prompt/clean.template"
+            ".github/downloader/web_cleanup/ai/prompt/clean.template",
+            "--concurrency", "4"
         ], check=True)
 
         # Copy to workspace
@@ -203,6 +211,9 @@ def main() -> None:
     search_dir = date_dir / "search_result"
     search_dir.mkdir(parents=True, exist_ok=True)
 
+    # Attribute LLM spend of every stage to this run (see llm_ledger.py for budgets)
+    os.environ.setdefault("LLM_RUN_ID", f"daily-{datetime.now().strftime('%Y-%m-%d-%H%M%S')}")
+
     # Execute pipeline
     execute_searches(search_dir)
     process_daily_results(search_dir, date_dir)
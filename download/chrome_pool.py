@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import subprocess
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+DEFAULT_VIRTUAL_TIME_BUDGET = 9000
+DEFAULT_PAGE_TIMEOUT = 300
+
+class CDPError(Exception):
+    """An error answer from the DevTools protocol."""
+
+def find_chrome():
+    return shutil.which('chromium') or shutil.which('chrome') or shutil.which('google-chrome')
+
+def process_tree_rss_mb(pid):
+    """Resident memory of a process and all its children in MB (Linux only, 0 elsewhere)."""
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children', 'r') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+class CDPConnection:
+    """Minimal synchronous DevTools client over the browser websocket, using flat sessions."""
+
+    def __init__(self, ws_url, timeout=30):
+        self.ws = websocket.create_connection(ws_url, timeout=timeout, suppress_origin=True)
+        self.next_id = 0
+        self.events = []
+
+    def _recv(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("DevTools did not answer in time")
+        self.ws.settimeout(remaining)
+        try:
+            return json.loads(self.ws.recv())
+        except websocket.WebSocketTimeoutException:
+            raise TimeoutError("DevTools did not answer in time")
+
+    def send(self, method, params=None, session_id=None, timeout=30):
+        """Send a command and wait for its result, buffering events that arrive meanwhile."""
+        self.next_id += 1
+        message_id = self.next_id
+        message = {'id': message_id, 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+        self.ws.send(json.dumps(message))
+        deadline = time.monotonic() + timeout
+        while True:
+            reply = self._recv(deadline)
+            if reply.get('id') == message_id:
+                if 'error' in reply:
+                    raise CDPError(f"{method}: {reply['error'].get('message')}")
+                return reply.get('result', {})
+            if 'method' in reply:
+                self.events.append(reply)
+
+    def wait_event(self, method, session_id, timeout):
+        """Wait for an event of one session; earlier buffered events count too."""
+        deadline = time.monotonic() + timeout
+        while True:
+            for event in self.events:
+                if event['method'] == method and event.get('sessionId') == session_id:
+                    self.events.remove(event)
+                    return event.get('params', {})
+            self.events.append(self._recv(deadline))
+
+    def close(self):
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+class ChromeInstance:
+    """One long-lived headless Chrome that renders pages in throwaway browser contexts."""
+
+    def __init__(self, chrome_path, startup_timeout=30):
+        self.user_data_dir = tempfile.mkdtemp(prefix='chrome_pool_')
+        self.process = subprocess.Popen([
+            chrome_path,
+            '--headless',
+            '--no-sandbox',
+            '--disable-gpu',
+            '--window-size=1920,1080',
+            '--run-all-compositor-stages-before-draw',
+            '--no-first-run',
+            '--no-default-browser-check',
+            '--remote-debugging-port=0',
+            f'--user-data-dir={self.user_data_dir}',
+            'about:blank'
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            self.cdp = CDPConnection(self._wait_for_endpoint(startup_timeout))
+        except Exception:
+            self.close()
+            raise
+        self.pages = 0
+        self.baseline_rss = process_tree_rss_mb(self.process.pid)
+
+    def _wait_for_endpoint(self, timeout):
+        # With port 0 Chrome picks a free port and writes it to DevToolsActivePort
+        port_file = os.path.join(self.user_data_dir, 'DevToolsActivePort')
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Chrome exited during startup with code {self.process.returncode}")
+            if os.path.exists(port_file):
+                with open(port_file, 'r') as f:
+                    lines = f.read().split()
+                if len(lines) >= 2:
+                    return f"ws://127.0.0.1:{lines[0]}{lines[1]}"
+            time.sleep(0.1)
+        raise TimeoutError("Chrome did not open its DevTools port")
+
+    def render(self, url, virtual_time_budget=DEFAULT_VIRTUAL_TIME_BUDGET, timeout=DEFAULT_PAGE_TIMEOUT):
+        """Load url like --virtual-time-budget --dump-dom and return the serialized DOM."""
+        context_id = self.cdp.send('Target.createBrowserContext')['browserContextId']
+        try:
+            target_id = self.cdp.send('Target.createTarget', {
+                'url': 'about:blank',
+                'browserContextId': context_id,
+                'width': 1920,
+                'height': 1080
+            })['targetId']
+            session_id = self.cdp.send('Target.attachToTarget', {'targetId': target_id, 'flatten': True})['sessionId']
+
+            # Hold virtual time while navigating, then let it run until the budget is spent
+            self.cdp.send('Emulation.setVirtualTimePolicy', {'policy': 'pause'}, session_id)
+            self.cdp.send('Page.navigate', {'url': url}, session_id, timeout=timeout)
+            self.cdp.send('Emulation.setVirtualTimePolicy', {
+                'policy': 'pauseIfNetworkFetchesPending',
+                'budget': virtual_time_budget
+            }, session_id)
+            self.cdp.wait_event('Emulation.virtualTimeBudgetExpired', session_id, timeout)
+
+            result = self.cdp.send('Runtime.evaluate', {
+                'expression': 'document.documentElement ? document.documentElement.outerHTML : ""',
+                'returnByValue': True
+            }, session_id)
+            if 'exceptionDetails' in result:
+                raise CDPError(f"Failed to serialize DOM: {result['exceptionDetails'].get('text')}")
+            return result['result'].get('value') or ''
+        finally:
+            self.pages += 1
+            # Disposing the context closes its targets and drops cookies and storage
+            self.cdp.send('Target.disposeBrowserContext', {'browserContextId': context_id})
+            self.cdp.events.clear()
+
+    def rss_growth_mb(self):
+        return process_tree_rss_mb(self.process.pid) - self.baseline_rss
+
+    def close(self):
+        if getattr(self, 'cdp', None) is not None:
+            try:
+                self.cdp.send('Browser.close', timeout=5)
+            except Exception:
+                pass
+            self.cdp.close()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+class ChromePool:
+    """A fixed number of long-lived Chrome instances shared by download threads.
+
+    Instances start lazily and are replaced after recycle_after pages, when their
+    process tree has grown by more than max_rss_growth_mb, or when they break.
+    """
+
+    def __init__(self, size=2, recycle_after=50, max_rss_growth_mb=1024,
+                 virtual_time_budget=DEFAULT_VIRTUAL_TIME_BUDGET, page_timeout=DEFAULT_PAGE_TIMEOUT,
+                 chrome_path=None):
+        if websocket is None:
+            raise RuntimeError("The Chrome pool needs websocket-client (pip install websocket-client)")
+        self.chrome_path = chrome_path or find_chrome()
+        if not self.chrome_path:
+            raise RuntimeError("Chrome/Chromium not found in PATH")
+        self.recycle_after = recycle_after
+        self.max_rss_growth_mb = max_rss_growth_mb
+        self.virtual_time_budget = virtual_time_budget
+        self.page_timeout = page_timeout
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(None)
+        self.lock = threading.Lock()
+        self.rendered = 0
+        self.recycled = 0
+
+    def _needs_recycle(self, instance):
+        if self.recycle_after and instance.pages >= self.recycle_after:
+            return f"after {instance.pages} pages"
+        growth = instance.rss_growth_mb()
+        if self.max_rss_growth_mb and growth > self.max_rss_growth_mb:
+            return f"memory grew by {growth:.0f} MB"
+        return None
+
+    def render(self, url):
+        """Render url on an idle instance and return its serialized DOM."""
+        instance = self.idle.get()
+        try:
+            if instance is None:
+                instance = ChromeInstance(self.chrome_path)
+            html = instance.render(url, self.virtual_time_budget, self.page_timeout)
+            with self.lock:
+                self.rendered += 1
+            return html
+        except CDPError:
+            # The page failed, the browser is fine
+            raise
+        except Exception:
+            # Timeouts and broken connections leave the browser in an unknown state
+            if instance is not None:
+                instance.close()
+                instance = None
+            raise
+        finally:
+            if instance is not None:
+                reason = self._needs_recycle(instance)
+                if reason:
+                    print(f"Recycling Chrome instance {reason}")
+                    instance.close()
+                    instance = None
+                    with self.lock:
+                        self.recycled += 1
+            self.idle.put(instance)
+
+    def close(self):
+        while True:
+            try:
+                instance = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if instance is not None:
+                instance.close()
+        print(f"Chrome pool: rendered {self.rendered} pages, recycled {self.recycled} instances")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,63 +1,93 @@
 from datetime import datetime
 import random
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 import os
 import argparse
 from pathlib import Path
-import json
-from pdfdown import download_pdf, get_file_md5
+from pdfdown import download_pdf
 from webdown import download_webpage
+from chrome_pool import ChromePool
+from fetch_cache import FetchCache, NOT_MODIFIED, file_hashes, DEFAULT_FETCH_CACHE_PATH
+from neardup import NearDupIndex, file_fingerprint, DEFAULT_THRESHOLD, DEFAULT_NEARDUP_PATH
+from raw_archive import RawArchive, ARCHIVE_SUFFIXES
+from politeness import PolitenessScheduler, load_politeness, host_of, DEFAULT_POLITENESS_PATH
+from progress_log import ProgressLog, write_atomic, save_results, save_page_yml, DEFAULT_COMPACT_EVERY
+from visited_ledger import VisitedLedger, DEFAULT_VISIT_LINKS_PATH, DEFAULT_INDEX_PATH
+from retry_queue import RetryQueue, format_time, DEFAULT_RETRY_QUEUE_PATH, DEFAULT_BREAKER_THRESHOLD
 from jinadown import download_jina
-import hashlib
+from httpdown import make_session, load_fetch_rules, download_http, domain_needs_js, js_dependence, DEFAULT_FETCH_RULES_PATH
 import re
 
-def check_file_exists_by_md5(md5_hash):
-    """Check if file exists in visit_links.yml"""
-    try:
-        with open('.github/visit_links.yml', 'r', encoding='utf-8') as f:
-            visited_data = yaml.safe_load(f) or {}
-            return md5_hash in visited_data
-    except FileNotFoundError:
-        return False
-
-def update_visit_links(url, info, md5, output_path):
-    """Update visit_links.yml with new download information"""
-    try:
-        # Read existing data
-        visit_links_path = '.github/visit_links.yml'
-        try:
-            with open(visit_links_path, 'r', encoding='utf-8') as f:
-                visited_data = yaml.safe_load(f) or {}
-        except FileNotFoundError:
-            visited_data = {}
-
-        # Add new entry
-        visited_data[md5] = {
-            'snippet': info.get('snippet', ''),
-            'title': info.get('title', ''),
-            'link': url,
-            'visited_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+def visit_entry(url, info, backend=None):
+    """visit_links.yml entry for a new download"""
+    entry = {
+        'snippet': info.get('snippet', ''),
+        'title': info.get('title', ''),
+        'link': url,
+        'visited_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+    if backend:
+        entry['backend'] = backend
+    return entry
 
-        # Save updated data
-        with open(visit_links_path, 'w', encoding='utf-8') as f:
-            yaml.dump(visited_data, f, allow_unicode=True)
-        
-        print("✓ Updated visit_links.yml")
-        return True
-    except Exception as e:
-        print(f"✗ Error updating visit_links.yml: {e}")
-        return False
+def download_auto(url, output_dir, title, session, fetch_rules, chrome_pool=None, cached=None):
+    """
+    Fetch a URL with the cheapest backend that works for it
+
+    Plain HTTP first; headless Chrome for domains configured as JS-dependent or
+    pages that come back as an empty shell; Jina if enabled and Chrome fails too.
+    Domains configured as static never go to Chrome.
 
-def check_link_exists(url, visited_data):
-    """Check if a URL has already been processed"""
-    for entry in visited_data.values():
-        if entry.get('link') == url:
-            return True
-    return False
+    Returns:
+        tuple: (success (bool), result (str), backend (str or None), validators (dict))
+    """
+    error = None
+    needs_js = domain_needs_js(url, fetch_rules)
+    if needs_js:
+        print("→ Domain is configured as JS-dependent, rendering with Chrome")
+    else:
+        status, result, validators = download_http(url, output_dir, title, session, fetch_rules, cached=cached)
+        if status in ('ok', 'unchanged'):
+            return True, result, 'http', validators
+        if status == 'binary':
+            # Documents are streamed to disk with the size limit and HTML check of the PDF downloader
+            success, result, details = download_pdf(url, output_dir, title, cached, session)
+            return (True, result, 'http', details) if success else (False, result, None, {})
+        if status == 'gone':
+            return False, result, None, {}
+        error = result
 
-def process_links_file(yaml_path, output_dir, related_filter='true', file_pattern=r'.*pdf.*', download_type='both', sleep_duration=30, download_order='sequential'):
+    if needs_js is False:
+        # Configured as static: a browser would fetch the same page
+        print(f"→ Plain HTTP failed ({error}), not rendering a static domain with Chrome")
+    else:
+        if error:
+            print(f"→ Plain HTTP not enough ({error}), rendering with Chrome")
+        success, result = download_webpage(url, output_dir, title, chrome_pool)
+        if success:
+            with open(result, 'r', encoding='utf-8', errors='replace') as f:
+                reason = js_dependence(f.read(), fetch_rules)
+            if not (reason and fetch_rules['jinaFallback']):
+                return True, result, 'chrome', {}
+            # Chrome got an empty page as well, e.g. a block page; let Jina try before keeping it
+            print(f"→ Chrome page still empty ({reason}), trying Jina")
+            os.remove(result)
+            error = reason
+        else:
+            print(f"→ Chrome failed ({result})")
+            error = result
+
+    if fetch_rules['jinaFallback']:
+        success, result = download_jina(url, output_dir, title)
+        if success:
+            return True, result, 'jina', {}
+        error = result
+    return False, error, None, {}
+
+def process_links_file(yaml_path, output_dir, related_filter='true', file_pattern=r'.*pdf.*', download_type='both', sleep_duration=30, download_order='sequential', chrome_pool=None, workers=4, politeness_path=DEFAULT_POLITENESS_PATH, fetch_rules_path=DEFAULT_FETCH_RULES_PATH, jina_fallback=False, fetch_cache=None, refetch=False, neardup_index=None, raw_archive=None, retry_queue=None, compact_every=DEFAULT_COMPACT_EVERY, visited_ledger=None):
     """Process YAML file and download files based on is_related filter and file pattern"""
     print("\n" + "="*50)
     print(f"Starting download process:")
@@ -67,6 +97,8 @@ def process_links_file(yaml_path, output_dir, related_filter='true', file_patter
     print(f"  File pattern: {file_pattern}")
     print(f"  Download type: {download_type}")
     print(f"  Download order: {download_order}")
+    print(f"  Workers: {workers}")
+    print(f"  Re-fetch visited links: {refetch}")
     print("="*50 + "\n")
     
     # Create output directory if it doesn't exist
@@ -79,66 +111,151 @@ def process_links_file(yaml_path, output_dir, related_filter='true', file_patter
         print(f"✓ Successfully loaded YAML file with {len(data)} entries")
     except Exception as e:
         print(f"✗ Error loading YAML file: {e}")    
-    # Track results
-    results = {
-        'success': [],
-        'failed': [],
-        'skipped': []
-    }
-    
     # Create results.json path
     results_file = os.path.join(output_dir, 'results.json')
     
-    # Load visit_links.yml at the start
-    try:
-        with open('.github/visit_links.yml', 'r', encoding='utf-8') as f:
-            visited_data = yaml.safe_load(f) or {}
-    except FileNotFoundError:
-        visited_data = {}
-    
-    # Initialize seen_md5s from visit_links.yml
-    seen_md5s = set(visited_data.keys())
+    # Load visit_links.yml at the start, indexed by URL and MD5
+    start = time.time()
+    ledger = (visited_ledger or VisitedLedger()).load()
+    stats = ledger.stats()
+    print(f"✓ Loaded {stats['urls']} visited links ({stats['md5s']} files) in {time.time() - start:.1f}s")
+
+    # Outcomes go to an append-only journal; results.json, visit_links.yml and links.yml
+    # are written from it every compact_every events and at the end, page.yml at the end
+    progress = ProgressLog(output_dir, compact_every)
+    replayed = progress.load()
+    if replayed:
+        print(f"Resuming interrupted run: replayed {replayed} events from {progress.path}")
+    # links.yml duplicate marks not written yet; replayed visits are pending in the ledger
+    for md5, visit in progress.visits().items():
+        ledger.add(visit['link'], md5, visit)
+    pending_marks = set()
+    for url in progress.marked():
+        if url in data and data[url].get('is_related') != 'duplicate':
+            data[url]['is_related'] = 'duplicate'
+            pending_marks.add(url)
     
     # Convert data items to list and randomize if needed
     data_items = list(data.items())
     if download_order == 'random':
         random.shuffle(data_items)
+
+    # Downloads of different hosts run in parallel; each host is paced by its own rule
+    scheduler = PolitenessScheduler(load_politeness(politeness_path, sleep_duration))
+    # Guards the journal, the ledger's additions and the pending links.yml changes;
+    # downloads, hashing and the near-duplicate and archive stores run outside it
+    state_lock = threading.Lock()
+    # auto picks a backend per URL; the other types always use the same one
+    backends = {'pdf': 'http', 'webpage': 'chrome', 'jina': 'jina'}
+    if download_type in ('pdf', 'auto'):
+        session = make_session(workers)
+    if download_type == 'auto':
+        fetch_rules = load_fetch_rules(fetch_rules_path)
+        fetch_rules['jinaFallback'] = fetch_rules['jinaFallback'] or jina_fallback
     
-    # Process each entry (modified to use data_items instead of data.items())
+    def log_event(event, url, entry, visit=None, mark=False):
+        if progress.record(event, url, entry, visit, mark):
+            flush_progress()
+
+    def flush_progress(final=False):
+        """Write everything the journal holds to the files it stands for, then shrink it."""
+        visits_saved = False
+        try:
+            written = ledger.flush()
+            if written:
+                print(f"✓ Updated visit_links.yml ({written} new)")
+            visits_saved = True
+        except Exception as e:
+            print(f"✗ Error updating visit_links.yml: {e}")
+        if pending_marks:
+            write_atomic(yaml_path, yaml.dump(data, allow_unicode=True))
+            print(f"→ Marked {len(pending_marks)} duplicates as not related in {yaml_path}")
+            pending_marks.clear()
+        results = progress.results()
+        save_results(results_file, results)
+        print("✓ Updated results.json")
+        if final:
+            save_page_yml(os.path.join(output_dir, 'page.yml'), results['success'])
+            # Keep the journal if visit_links.yml could not be written; the next run replays it
+            progress.close(remove=visits_saved)
+            ledger.close()
+        else:
+            progress.compact()
+        return results
+
+    # Filter entries up front; skipped entries do not wait for anything
     total = len(data_items)
+    queued = 0
     for idx, (url, info) in enumerate(data_items, 1):
-        print(f"\nProcessing entry {idx}/{total}:")
-        print(f"URL: {url}")
-        print(f"is_related: '{info.get('is_related', 'unknown')}'")
-        
-        # Check if link already exists in visit_links.yml
-        if check_link_exists(url, visited_data):
-            print("→ Skipping: Link already processed")
-            results['skipped'].append((url, "Link already processed"))
+        # Check if link already exists in visit_links.yml; with refetch it is checked for changes instead
+        if ledger.has_url(url) and not refetch:
+            print(f"→ Skipping {url}: Link already processed")
+            log_event('skipped', url, (url, "Link already processed"))
             continue
         
         # Skip if is_related doesn't match filter
         if related_filter != 'all' and info.get('is_related', '').lower() != related_filter.lower():
-            print("→ Skipping: is_related value doesn't match filter")
-            results['skipped'].append((url, f"is_related='{info.get('is_related', '')}'"))
+            print(f"→ Skipping {url}: is_related value doesn't match filter")
+            log_event('skipped', url, (url, f"is_related='{info.get('is_related', '')}'"))
             continue
         
         # Filter files based on regex pattern
         if not re.search(file_pattern, url, re.IGNORECASE):
-            print(f"→ Skipping: Path does not match pattern '{file_pattern}'")
-            results['skipped'].append((url, f"Path does not match pattern '{file_pattern}'"))
+            print(f"→ Skipping {url}: Path does not match pattern '{file_pattern}'")
+            log_event('skipped', url, (url, f"Path does not match pattern '{file_pattern}'"))
+            continue
+
+        # Failed before: wait out the backoff, and leave alone what was given up on
+        pending = retry_queue.get(url) if retry_queue and url else None
+        if pending and pending['gave_up']:
+            print(f"→ Skipping {url}: gave up after {pending['attempts']} attempts ({pending['error']})")
+            log_event('skipped', url, (url, f"Gave up after {pending['attempts']} attempts"))
+            continue
+        if pending and pending['next_eligible'] > time.time():
+            print(f"→ Skipping {url}: next retry after {format_time(pending['next_eligible'])}")
+            log_event('skipped', url, (url, f"Retry not due until {format_time(pending['next_eligible'])}"))
             continue
     
         if not url:
             print("✗ Error: No download link provided")
-            results['failed'].append((url, "No link provided"))
+            log_event('failed', url, (url, "No link provided"))
             continue
-        
-        print(f"→ Downloading from: {url}")
 
-        # add random sleep with configured duration
-        sleep_time = random.randint(sleep_duration // 2, sleep_duration)
-        time.sleep(sleep_time)
+        # Jina downloads hit r.jina.ai, not the page's own host
+        host = 'r.jina.ai' if download_type == 'jina' else host_of(url)
+        scheduler.add(host, (idx, url, info))
+        queued += 1
+
+    # Failures of earlier runs (and other links files) whose backoff has passed
+    retries = 0
+    for entry in retry_queue.due(download_type) if retry_queue else []:
+        url = entry['url']
+        if url in data or ledger.has_url(url) or not re.search(file_pattern, url, re.IGNORECASE):
+            continue
+        retries += 1
+        host = 'r.jina.ai' if download_type == 'jina' else host_of(url)
+        scheduler.add(host, (total + retries, url, entry['info']))
+    if retries:
+        print(f"Retrying {retries} earlier failures")
+    total += retries
+    queued += retries
+
+    print(f"Skipped {total - queued} entries, {queued} to download")
+
+    def download_entry(idx, url, info, host):
+        print(f"\nProcessing entry {idx}/{total}:")
+        print(f"URL: {url}")
+        print(f"is_related: '{info.get('is_related', 'unknown')}'")
+
+        # A host that keeps failing is left alone until its breaker's cooldown has passed
+        open_until = retry_queue.breaker_open_until(host) if retry_queue else None
+        if open_until:
+            print(f"→ Skipping {url}: circuit open for {host} until {format_time(open_until)}")
+            with state_lock:
+                log_event('skipped', url, (url, f"Circuit open for {host}"))
+            return
+
+        print(f"→ Downloading from: {url}")
         
         # Download file
         try:
@@ -146,93 +263,166 @@ def process_links_file(yaml_path, output_dir, related_filter='true', file_patter
             if not title or title == '' or title == 'Untitled':
                 title = info['snippet'][10:30]
             
+            # Validators and hash of the previous download make a re-fetch conditional;
+            # details carries the response's validators (and hashes, if the backend computed them)
+            cached = fetch_cache.get(url) if fetch_cache else None
+            details = {}
+
             # Choose download function based on download_type
+            backend = backends.get(download_type)
             if download_type == 'pdf':
-                success, result = download_pdf(url, output_dir, title)
+                success, result, details = download_pdf(url, output_dir, title, cached, session)
             elif download_type == 'webpage':
-                success, result = download_webpage(url, output_dir, title)
+                success, result = download_webpage(url, output_dir, title, chrome_pool)
             elif download_type == 'jina':
                 success, result = download_jina(url, output_dir, title)
+            elif download_type == 'auto':
+                success, result, backend, details = download_auto(url, output_dir, title, session, fetch_rules, chrome_pool, cached)
             else:
                 print(f"✗ Invalid download type: {download_type}")
-                continue
+                return
             
-            if success:
-                output_path = result  # result contains the file path on success
-                # Calculate MD5 and update visit_links.yml
-                md5 = get_file_md5(output_path)
-                if update_visit_links(url, info, md5, output_path):
-                    results['success'].append({
-                        'url': url,
-                        'path': output_path,
-                        'md5': md5,
-                        'title': info.get('title', ''),
-                        'snippet': info.get('snippet', '')
-                    })
-                    print(f"✓ Successfully downloaded ({os.path.getsize(output_path)} bytes)")
-                    print(f"  MD5: {md5}")
-                    
-                    # Move MD5 duplicate check here, inside the success block
-                    file_md5 = calculate_md5(output_path)
-                    if file_md5 in seen_md5s:
-                        print(f"→ Duplicate MD5 detected: {file_md5}")
-                        # Mark as not related since it's a duplicate
-                        data[url]['is_related'] = 'duplicate'
-                        # Save the changes back to the YAML file
-                        with open(yaml_path, 'w', encoding='utf-8') as f:
-                            yaml.dump(data, f, allow_unicode=True)
-                        print("→ Marked as not related due to duplicate content")
-                        # remove the file
-                        os.remove(output_path)
-                        print(f"  Removed duplicate file: {output_path}")
-                    else:
-                        seen_md5s.add(file_md5)
-                else:
-                    results['failed'].append({
-                        'url': url,
-                        'error': "Failed to update visit_links.yml",
-                        'title': info.get('title', ''),
-                        'snippet': info.get('snippet', '')
-                    })
-            else:
-                results['failed'].append({
-                    'url': url,
-                    'error': result,
-                    'title': info.get('title', ''),
-                    'snippet': info.get('snippet', '')
-                })
-                print(f"✗ Download failed: {result}")
+            record_download(url, info, host, success, result, backend, cached, details)
         except Exception as e:
-            results['failed'].append({
+            with state_lock:
+                record_failure(url, info, host, str(e))
+            print(f"✗ Unexpected error: {e}")
+
+    def record_unchanged(url, backend, cached, details, reason):
+        # Not added to success, so page.yml and the clean/markdown/AI steps never see it again
+        log_event('unchanged', url, {
+            'url': url,
+            'path': cached['path'] if cached else None,
+            'backend': backend,
+            'reason': reason
+        })
+        if fetch_cache and cached:
+            fetch_cache.mark_unchanged(url, details)
+        print(f"→ Unchanged since last fetch ({reason}), skipping further processing")
+
+    def record_failure(url, info, host, error):
+        log_event('failed', url, {
+            'url': url,
+            'error': error,
+            'title': info.get('title', ''),
+            'snippet': info.get('snippet', '')
+        })
+        if retry_queue:
+            entry = retry_queue.record_failure(url, host, error, info, download_type)
+            if entry['gave_up']:
+                print(f"→ Giving up on {url} after {entry['attempts']} attempts ({entry['category']})")
+            else:
+                print(f"→ Will retry after {format_time(entry['next_eligible'])} (attempt {entry['attempts']}, {entry['category']})")
+
+    def record_download(url, info, host, success, result, backend, cached, details):
+        # Hashing, fingerprinting and archiving read the whole file; only the
+        # journal and ledger updates hold state_lock
+        if success and retry_queue:
+            retry_queue.record_success(url, host)
+        if not success:
+            print(f"✗ Download failed: {result}")
+            with state_lock:
+                record_failure(url, info, host, result)
+            return
+        if result == NOT_MODIFIED:
+            with state_lock:
+                record_unchanged(url, backend, cached, details, "304 Not Modified")
+            return
+        output_path = result  # result contains the file path on success
+        # The PDF downloader hashes while streaming; other backends need one pass over the file
+        if details.get('md5'):
+            md5, sha256 = details['md5'], details['sha256']
+        else:
+            md5, sha256 = file_hashes(output_path)
+        if cached and cached['sha256'] == sha256:
+            # Same bytes as last time; keep the earlier copy only
+            if os.path.abspath(cached['path'] or '') != os.path.abspath(output_path):
+                os.remove(output_path)
+            with state_lock:
+                record_unchanged(url, backend, cached, details, "same content hash")
+            return
+        if fetch_cache:
+            fetch_cache.record(url, sha256, output_path, backend, details)
+        fingerprinted = file_fingerprint(output_path) if neardup_index else None
+
+        with state_lock:
+            if ledger.link_matches(md5, url):
+                # Visited before the fetch cache existed; now it has an entry for next time
+                record_unchanged(url, backend, None, details, "same MD5 as visit_links.yml")
+                return
+            # Duplicates are recorded as visited too, so they are not fetched again;
+            # their MD5 entry keeps pointing at the first copy
+            seen_md5 = ledger.has_md5(md5)
+            visit = {md5: visit_entry(url, info, backend)}
+            ledger.add(url, md5, visit[md5])
+        print(f"✓ Successfully downloaded via {backend} ({os.path.getsize(output_path)} bytes)")
+        print(f"  MD5: {md5}")
+
+        # Exact copies by MD5, then copies with different page chrome by body-text SimHash
+        duplicate_of = None
+        if seen_md5:
+            print(f"→ Duplicate MD5 detected: {md5}")
+            duplicate_of = md5
+        elif fingerprinted:
+            match = neardup_index.check_and_add(output_path, url, fingerprinted)
+            if match:
+                duplicate_of = match['url'] or match['path']
+                print(f"→ Near-duplicate of {duplicate_of} ({match['distance']} bits apart)")
+
+        if duplicate_of:
+            # remove the file; left out of success so cleanup never sees it
+            os.remove(output_path)
+            print(f"  Removed duplicate file: {output_path}")
+            with state_lock:
+                # Mark as not related since it's a duplicate; links.yml is saved with the journal
+                # (retries of earlier links files are not in this one)
+                mark = url in data
+                if mark:
+                    data[url]['is_related'] = 'duplicate'
+                    pending_marks.add(url)
+                    print("→ Marked as not related due to duplicate content")
+                log_event('duplicate', url, {'url': url, 'md5': md5, 'duplicate_of': duplicate_of}, visit, mark)
+            return
+        with state_lock:
+            log_event('success', url, {
                 'url': url,
-                'error': str(e),
+                'path': output_path,
+                'md5': md5,
+                'backend': backend,
                 'title': info.get('title', ''),
                 'snippet': info.get('snippet', '')
-            })
-            print(f"✗ Unexpected error: {e}")
-            continue
+            }, visit)
+        if raw_archive and Path(output_path).suffix.lower() in ARCHIVE_SUFFIXES:
+            record = raw_archive.add_file(url, output_path, backend=backend, md5=md5, sha256=sha256)
+            print(f"  Archived to {record['file']} @ {record['offset']}")
 
-        # Save results.json after each file
-        try:
-            with open(results_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'success': results['success'],
-                    'failed': results['failed'],
-                    'skipped': results['skipped']
-                }, f, indent=2)
-            print("✓ Updated results.json")
-        except Exception as e:
-            print(f"Error updating results.json: {e}")
-            continue
+    def worker():
+        while True:
+            task = scheduler.take()
+            if task is None:
+                return
+            host, (idx, url, info) = task
+            try:
+                download_entry(idx, url, info, host)
+            finally:
+                scheduler.done(host)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for future in [executor.submit(worker) for _ in range(max(1, workers))]:
+            future.result()
 
-def calculate_md5(filepath):
-    """Calculate MD5 hash of a file"""
-    md5_hash = hashlib.md5()
-    with open(filepath, "rb") as f:
-        # Read file in chunks to handle large files
-        for chunk in iter(lambda: f.read(4096), b""):
-            md5_hash.update(chunk)
-    return md5_hash.hexdigest()
+    with state_lock:
+        results = flush_progress(final=True)
+
+    served = {}
+    for entry in results['success']:
+        served[entry['backend']] = served.get(entry['backend'], 0) + 1
+    if served:
+        print("\nServed by: " + ", ".join(f"{backend} {count}" for backend, count in sorted(served.items())))
+    if results['unchanged']:
+        print(f"Unchanged since last fetch: {len(results['unchanged'])}")
+    if results['duplicate']:
+        print(f"Duplicates removed: {len(results['duplicate'])}")
 
 def main():
     parser = argparse.ArgumentParser(
@@ -255,9 +445,90 @@ def main():
 
     parser.add_argument(
         '--download-type',
-        choices=['pdf', 'webpage', 'jina', 'both'],
+        choices=['pdf', 'webpage', 'jina', 'auto', 'both'],
         default='pdf',
-        help='Type of download to perform (default: both)'
+        help='Type of download to perform; auto tries plain HTTP, then Chrome, then optionally Jina per URL (both is an alias of auto)'
+    )
+
+    parser.add_argument(
+        '--refetch',
+        action='store_true',
+        help='Re-check links already in visit_links.yml with conditional requests; unchanged ones are not processed again'
+    )
+
+    parser.add_argument(
+        '--fetch-cache',
+        default=DEFAULT_FETCH_CACHE_PATH,
+        help='SQLite file with the ETag, Last-Modified and content hash of every download'
+    )
+
+    parser.add_argument(
+        '--near-dup-threshold',
+        type=int,
+        default=DEFAULT_THRESHOLD,
+        help='Pages whose body-text SimHash differs in at most this many of 64 bits are marked duplicate'
+    )
+
+    parser.add_argument(
+        '--near-dup-index',
+        default=DEFAULT_NEARDUP_PATH,
+        help='SQLite index of SimHash fingerprints across the archive (see neardup.py index)'
+    )
+
+    parser.add_argument(
+        '--no-near-dup',
+        action='store_true',
+        help='Only drop exact MD5 duplicates'
+    )
+
+    parser.add_argument(
+        '--archive-dir',
+        default=None,
+        help='Also append raw pages to the compressed archive in this directory (see raw_archive.py)'
+    )
+
+    parser.add_argument(
+        '--retry-queue',
+        default=DEFAULT_RETRY_QUEUE_PATH,
+        help='SQLite database of failed downloads; due retries are picked up by later runs'
+    )
+
+    parser.add_argument(
+        '--no-retry-queue',
+        action='store_true',
+        help='Do not record failures, retry earlier ones or open per-host circuit breakers'
+    )
+
+    parser.add_argument(
+        '--breaker-threshold',
+        type=int,
+        default=DEFAULT_BREAKER_THRESHOLD,
+        help='Stop requesting a host after this many consecutive timeouts, 5xx or blocked responses'
+    )
+
+    parser.add_argument(
+        '--visited-index',
+        default=None,
+        help=f'Binary URL/MD5 index of visit_links.yml (default: {DEFAULT_INDEX_PATH})'
+    )
+
+    parser.add_argument(
+        '--compact-every',
+        type=int,
+        default=DEFAULT_COMPACT_EVERY,
+        help='Write results.json, visit_links.yml and links.yml from the progress journal every this many events'
+    )
+
+    parser.add_argument(
+        '--fetch-rules',
+        default=DEFAULT_FETCH_RULES_PATH,
+        help='JSON file with the JS-dependent domains and SPA markers used by --download-type auto'
+    )
+
+    parser.add_argument(
+        '--jina-fallback',
+        action='store_true',
+        help='In auto mode, try Jina when Chrome fails or renders an empty page'
     )
 
     parser.add_argument(
@@ -276,7 +547,20 @@ def main():
         '--sleep',
         type=int,
         default=30,
-        help='Maximum sleep duration between downloads in seconds (default: 30)'
+        help='Maximum sleep duration between downloads of the same host in seconds (default: 30)'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Maximum number of downloads running at once (across all hosts)'
+    )
+
+    parser.add_argument(
+        '--politeness',
+        default=DEFAULT_POLITENESS_PATH,
+        help='JSON file with per-domain minInterval, jitter and maxConcurrent overrides'
     )
 
     parser.add_argument(
@@ -286,7 +570,30 @@ def main():
         help='Order of processing downloads (sequential or random)'
     )
 
+    parser.add_argument(
+        '--chrome-pool',
+        type=int,
+        default=0,
+        help='Render webpages on this many long-lived Chrome instances over DevTools (0 = one Chrome process per page)'
+    )
+
+    parser.add_argument(
+        '--chrome-recycle',
+        type=int,
+        default=50,
+        help='Restart a pooled Chrome instance after this many pages'
+    )
+
+    parser.add_argument(
+        '--chrome-max-rss-growth',
+        type=int,
+        default=1024,
+        help='Restart a pooled Chrome instance once its memory grew by this many MB'
+    )
+
     args = parser.parse_args()
+    if args.download_type == 'both':
+        args.download_type = 'auto'
     
     print("\nStarting download script with settings:")
     print(f"  YAML path: {args.yaml_path}")
@@ -296,17 +603,39 @@ def main():
     print(f"  Download type: {args.download_type}")
     print(f"  Sleep duration: {args.sleep}s")
     print(f"  Download order: {args.order}")
+    print(f"  Workers: {args.workers}")
+    print(f"  Chrome pool: {args.chrome_pool or 'off'}")
+
+    chrome_pool = None
+    if args.chrome_pool > 0:
+        chrome_pool = ChromePool(args.chrome_pool, args.chrome_recycle, args.chrome_max_rss_growth)
 
     # Process the files
-    results = process_links_file(
-        args.yaml_path, 
-        args.output_dir, 
-        args.related, 
-        args.pattern, 
-        args.download_type,
-        args.sleep,
-        args.order
-    )
+    try:
+        results = process_links_file(
+            args.yaml_path, 
+            args.output_dir, 
+            args.related, 
+            args.pattern, 
+            args.download_type,
+            args.sleep,
+            args.order,
+            chrome_pool,
+            args.workers,
+            args.politeness,
+            args.fetch_rules,
+            args.jina_fallback,
+            FetchCache(args.fetch_cache),
+            args.refetch,
+            None if args.no_near_dup else NearDupIndex(args.near_dup_index, args.near_dup_threshold),
+            RawArchive(args.archive_dir) if args.archive_dir else None,
+            None if args.no_retry_queue else RetryQueue(args.retry_queue, args.breaker_threshold),
+            args.compact_every,
+            VisitedLedger(DEFAULT_VISIT_LINKS_PATH, args.visited_index)
+        )
+    finally:
+        if chrome_pool is not None:
+            chrome_pool.close()
 
     # Return non-zero exit code if there were any failures
     return 0
@@ -0,0 +1,146 @@
+import os
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+DEFAULT_FETCH_CACHE_PATH = '.github/cache/fetch_cache.sqlite'
+
+# Result of a download whose server answered 304 Not Modified; nothing was written
+NOT_MODIFIED = 'not modified'
+
+def file_hashes(filepath):
+    """Calculate MD5 and SHA-256 of a file in one read"""
+    md5_hash = hashlib.md5()
+    sha256_hash = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            md5_hash.update(chunk)
+            sha256_hash.update(chunk)
+    return md5_hash.hexdigest(), sha256_hash.hexdigest()
+
+def parse_validators(headers):
+    """Pick ETag and Last-Modified out of a response header mapping (any key case)."""
+    lowered = {key.lower(): value for key, value in headers.items()}
+    return {
+        'etag': lowered.get('etag'),
+        'last_modified': lowered.get('last-modified')
+    }
+
+def conditional_headers(entry):
+    """Request headers that let the server answer 304 for a cached entry."""
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+class FetchCache:
+    """Response validators and content hash of every downloaded URL, backed by SQLite."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('FETCH_CACHE_PATH') or DEFAULT_FETCH_CACHE_PATH
+        self._conn = None
+        # Download threads share one connection
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS fetches ('
+                'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, sha256 TEXT NOT NULL, '
+                'path TEXT, backend TEXT, fetched REAL NOT NULL, checked REAL NOT NULL, '
+                'unchanged INTEGER NOT NULL DEFAULT 0)'
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, url):
+        """Return the cached entry for url as a dict, or None."""
+        with self._lock:
+            row = self._connect().execute('SELECT * FROM fetches WHERE url = ?', (url,)).fetchone()
+        return dict(row) if row else None
+
+    def record(self, url, sha256, path, backend, validators=None):
+        """Store a fresh download of url."""
+        validators = validators or {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO fetches '
+                    '(url, etag, last_modified, sha256, path, backend, fetched, checked, unchanged) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)',
+                    (url, validators.get('etag'), validators.get('last_modified'), sha256, path, backend, now, now)
+                )
+
+    def mark_unchanged(self, url, validators=None):
+        """Note that a re-fetch found url unchanged; keep newer validators if the server sent any."""
+        validators = validators or {}
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    'UPDATE fetches SET checked = ?, unchanged = unchanged + 1, '
+                    'etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?',
+                    (time.time(), validators.get('etag'), validators.get('last_modified'), url)
+                )
+
+    def forget(self, url):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute('DELETE FROM fetches WHERE url = ?', (url,))
+
+    def stats(self):
+        """Return entry counts, how many carry validators, and how many re-fetches were unchanged."""
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT COUNT(*), SUM(etag IS NOT NULL OR last_modified IS NOT NULL), '
+                'COALESCE(SUM(unchanged), 0) FROM fetches'
+            ).fetchone()
+        return {
+            'entries': row[0],
+            'with_validators': row[1] or 0,
+            'unchanged': row[2]
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect the download re-fetch cache')
+    parser.add_argument('command', choices=['stats', 'show', 'forget'], help='Action to perform')
+    parser.add_argument('url', nargs='?', help='URL for show and forget')
+    parser.add_argument('--path', default=None, help=f'Cache database path (default: {DEFAULT_FETCH_CACHE_PATH})')
+    args = parser.parse_args()
+
+    cache = FetchCache(args.path)
+    if args.command in ('show', 'forget') and not args.url:
+        parser.error(f"{args.command} needs a URL")
+    if args.command == 'show':
+        entry = cache.get(args.url)
+        if entry is None:
+            print(f"Not cached: {args.url}")
+            return
+        for key, value in entry.items():
+            if key in ('fetched', 'checked'):
+                value = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(value))
+            print(f"  {key}: {value}")
+        return
+    if args.command == 'forget':
+        cache.forget(args.url)
+        print(f"Forgot {args.url}")
+        return
+
+    stats = cache.stats()
+    print(f"Fetch cache: {cache.path}")
+    print(f"  Entries: {stats['entries']} ({stats['with_validators']} with ETag/Last-Modified)")
+    print(f"  Unchanged re-fetches: {stats['unchanged']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import html
+from pathlib import Path
+from urllib.parse import urlparse
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.compat import chardet
+    import urllib3
+except ImportError:
+    requests = None
+
+from webdown import sanitize_filename
+from fetch_cache import NOT_MODIFIED, conditional_headers, parse_validators
+
+DEFAULT_FETCH_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fetch_rules.json')
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/124.0 Safari/537.36')
+
+DEFAULT_FETCH_RULES = {
+    'minTextChars': 200,
+    'jsDomains': [],
+    'staticDomains': [],
+    'spaMarkers': [],
+    'jinaFallback': False
+}
+
+# Bytes read at a time from a streamed response
+CHUNK_SIZE = 64 * 1024
+
+_INVISIBLE = re.compile(r'<(script|style|noscript|template|svg|head)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r'<[^>]+>')
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+def load_fetch_rules(path=DEFAULT_FETCH_RULES_PATH):
+    """Load the domains and page markers that decide when a page needs Chrome."""
+    rules = dict(DEFAULT_FETCH_RULES)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            rules.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    rules['spaMarkers'] = [re.compile(p) for p in rules['spaMarkers']]
+    return rules
+
+def make_session(pool_size=4):
+    """One keep-alive HTTP session shared by all download threads."""
+    if requests is None:
+        raise RuntimeError("Plain HTTP downloads need requests (pip install requests)")
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size * 4, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8'
+    })
+    # Same as curl --insecure in pdfdown.py; several archived sites have broken certificates
+    session.verify = False
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    return session
+
+def _matches_domain(host, domains):
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+def domain_needs_js(url, rules):
+    host = (urlparse(url).hostname or '').lower()
+    if _matches_domain(host, rules['staticDomains']):
+        return False
+    if _matches_domain(host, rules['jsDomains']):
+        return True
+    return None
+
+def visible_text(page):
+    """Rough visible text of an HTML page, enough to tell an article from an empty shell."""
+    text = _TAG.sub(' ', _INVISIBLE.sub(' ', page))
+    return re.sub(r'\s+', ' ', html.unescape(text)).strip()
+
+def js_dependence(page, rules):
+    """Return why a statically fetched page looks like it needs JavaScript, or None."""
+    text_chars = len(visible_text(page))
+    if text_chars < rules['minTextChars']:
+        for pattern in rules['spaMarkers']:
+            if pattern.search(page):
+                return f"SPA shell /{pattern.pattern}/"
+        return f"only {text_chars} visible chars"
+    return None
+
+def decode_html(response, content):
+    """Decode using the HTTP charset, then <meta charset>, then a guess from the bytes."""
+    encoding = None
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        encoding = response.encoding
+    if not encoding:
+        match = _META_CHARSET.search(content[:4096])
+        if match:
+            encoding = match.group(1).decode('ascii')
+    if not encoding:
+        encoding = chardet.detect(content)['encoding'] or 'utf-8'
+    try:
+        return content.decode(encoding, errors='replace')
+    except LookupError:
+        return content.decode('utf-8', errors='replace')
+
+def is_html_response(response, head):
+    """Decide by Content-Type; without one, by the first bytes of the body."""
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type:
+        return content_type in ('text/html', 'application/xhtml+xml')
+    return head[:1024].lstrip().lower().startswith((b'<!doctype html', b'<html'))
+
+def webpage_path(url, output_dir, title):
+    """Same file name download_webpage uses, so later steps do not care which tier fetched it."""
+    domain = urlparse(url).netloc.split('.')[0]
+    return os.path.join(output_dir, f"{domain}_{sanitize_filename(title)}.html")
+
+def download_http(url, output_dir, title, session, rules, timeout=60, cached=None):
+    """
+    Fetch a URL with a plain HTTP request
+
+    With a fetch cache entry the request is conditional on its ETag/Last-Modified.
+
+    Returns:
+        tuple: (status, result, validators)
+            - 'ok', output filepath: saved a static HTML page
+            - 'binary', content type: not HTML; nothing was read, stream it with download_pdf
+            - 'unchanged', NOT_MODIFIED: the server answered 304, nothing was written
+            - 'needs_js', reason: the page looks like it only renders in a browser
+            - 'gone', error message: the page does not exist, a browser will not help
+            - 'failed', error message
+            validators holds the response's etag and last_modified (None if absent)
+    """
+    validators = {}
+    try:
+        # Streamed, so a document's body is not read into memory before we know what it is
+        with session.get(url, timeout=timeout, headers=conditional_headers(cached), stream=True) as response:
+            validators = parse_validators(response.headers)
+            if response.status_code == 304:
+                return 'unchanged', NOT_MODIFIED, validators
+            if response.status_code in (404, 410):
+                return 'gone', f"HTTP {response.status_code}", validators
+            if response.status_code >= 400:
+                return 'failed', f"HTTP {response.status_code}", validators
+            # Only the first chunk is read before we know the body is a page
+            chunks = response.iter_content(CHUNK_SIZE)
+            head = next(chunks, b'')
+            if not is_html_response(response, head):
+                return 'binary', response.headers.get('Content-Type', ''), validators
+            page = decode_html(response, head + b''.join(chunks))
+
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        # Pages of static domains are kept even when they look thin
+        reason = js_dependence(page, rules) if domain_needs_js(url, rules) is not False else None
+        if reason:
+            return 'needs_js', reason, validators
+        output_path = webpage_path(url, output_dir, title)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(page)
+        return 'ok', output_path, validators
+    except requests.RequestException as e:
+        return 'failed', f"HTTP error: {str(e)}", validators
+    except Exception as e:
+        return 'failed', f"Unexpected error: {str(e)}", validators
@@ -12,15 +12,6 @@ def download_jina(url, output_dir, title):
         safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
         base_name = safe_title.replace(' ', '_')[:100]
 
-        # Use a specific download directory
-        download_dir = os.path.join(output_dir, "download")
-        print(f"Creating download directory: {download_dir}")
-        if os.path.exists(download_dir):
-            for file in os.listdir(download_dir):
-                os.remove(os.path.join(download_dir, file))
-            os.rmdir(download_dir)
-        os.makedirs(download_dir, exist_ok=False)
-
         # Download using Jina AI endpoint
         jina_url = f"https://r.jina.ai/{url}"
         command = [
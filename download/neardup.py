@@ -0,0 +1,266 @@
+import os
+import re
+import html
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from pathlib import Path
+
+import yaml
+
+DEFAULT_NEARDUP_PATH = '.github/cache/neardup.sqlite'
+DEFAULT_THRESHOLD = 4
+SHINGLE_CHARS = 4
+# Shorter texts are all "similar" (nav bars, error pages); leave them to the exact MD5 check
+MIN_TEXT_CHARS = 200
+# Text blocks shorter than this are menus, link lists, bylines and widget titles
+MIN_BLOCK_CHARS = 20
+TEXT_SUFFIXES = ('.html', '.htm', '.md', '.markdown', '.txt')
+
+_NOISE = re.compile(r'[\W\d_]+', re.UNICODE)
+_INVISIBLE = re.compile(r'<(script|style|noscript|template|svg|head)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_BLOCK = re.compile(r'</?(p|div|br|li|tr|td|h[1-6]|section|article|header|footer|blockquote|pre|table|ul|ol)\b[^>]*>', re.IGNORECASE)
+_ANCHOR = re.compile(r'<a\b[^>]*>.*?</a\s*>', re.IGNORECASE | re.DOTALL)
+_MD_LINK = re.compile(r'!?\[[^\]]*\]\([^)]*\)')
+_TAG = re.compile(r'<[^>]+>')
+
+def normalize_text(text):
+    """Lowercase and drop whitespace, punctuation and digits (dates, counters, ad ids)."""
+    return _NOISE.sub('', text.lower())
+
+def body_text(content, is_html):
+    """Text blocks long enough to be article body; the page chrome around them differs between copies.
+
+    Link text is dropped first, so menus and recommendation lists disappear even when long.
+    """
+    if is_html:
+        content = html.unescape(_TAG.sub('', _BLOCK.sub('\n', _ANCHOR.sub(' ', _INVISIBLE.sub(' ', content)))))
+    else:
+        content = _MD_LINK.sub(' ', content)
+    blocks = (block.strip() for block in content.split('\n'))
+    return '\n'.join(block for block in blocks if len(normalize_text(block)) >= MIN_BLOCK_CHARS)
+
+def page_text(path):
+    """Body text of a downloaded page, or None for files we do not fingerprint (PDFs etc.)."""
+    suffix = Path(path).suffix.lower()
+    if suffix not in TEXT_SUFFIXES:
+        return None
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        content = f.read()
+    return body_text(content, suffix in ('.html', '.htm'))
+
+def simhash(text):
+    """64-bit SimHash over character shingles of the normalized text, or None if too short."""
+    normalized = normalize_text(text)
+    if len(normalized) < MIN_TEXT_CHARS:
+        return None
+    shingles = Counter(normalized[i:i + SHINGLE_CHARS] for i in range(len(normalized) - SHINGLE_CHARS + 1))
+    weights = [0] * 64
+    for shingle, count in shingles.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            if h >> bit & 1:
+                weights[bit] += count
+            else:
+                weights[bit] -= count
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def file_fingerprint(path):
+    """(SimHash, text length) of a downloaded file, or None if it is binary or too short."""
+    text = page_text(path)
+    if text is None:
+        return None
+    fingerprint = simhash(text)
+    if fingerprint is None:
+        return None
+    return fingerprint, len(text)
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def _signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def _unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+class NearDupIndex:
+    """SimHash fingerprints of every downloaded page, with a banded lookup table.
+
+    With threshold k the 64 bits are split into k + 1 bands; two fingerprints
+    within k bits of each other agree exactly on at least one band, so only
+    pages sharing a band value are compared.
+    """
+
+    def __init__(self, path=None, threshold=DEFAULT_THRESHOLD):
+        self.path = path or os.getenv('NEARDUP_INDEX_PATH') or DEFAULT_NEARDUP_PATH
+        self.threshold = threshold
+        self.bands = threshold + 1
+        self._conn = None
+        # Re-entrant, so check_and_add can hold it across find and add
+        self._lock = threading.RLock()
+
+    def _band_keys(self, fingerprint):
+        width = 64 // self.bands
+        keys = []
+        for band in range(self.bands):
+            bits = width if band < self.bands - 1 else 64 - width * band
+            keys.append((band, (fingerprint >> (band * width)) & ((1 << bits) - 1)))
+        return keys
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS fingerprints ('
+                'id INTEGER PRIMARY KEY, simhash INTEGER NOT NULL, url TEXT, path TEXT, '
+                'chars INTEGER NOT NULL, added REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, key INTEGER NOT NULL, id INTEGER NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_bands ON bands(band, key)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            row = self._conn.execute("SELECT value FROM meta WHERE name = 'bands'").fetchone()
+            if row is None or int(row[0]) != self.bands:
+                self._rebuild_bands()
+            self._conn.commit()
+        return self._conn
+
+    def _rebuild_bands(self):
+        # The band layout depends on the threshold; re-split every stored fingerprint
+        conn = self._conn
+        conn.execute('DELETE FROM bands')
+        rows = conn.execute('SELECT id, simhash FROM fingerprints').fetchall()
+        conn.executemany(
+            'INSERT INTO bands (band, key, id) VALUES (?, ?, ?)',
+            [(band, key, fp_id) for fp_id, value in rows for band, key in self._band_keys(_unsigned(value))]
+        )
+        conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('bands', ?)", (str(self.bands),))
+
+    def find(self, fingerprint):
+        """Closest indexed page within the threshold as a dict with distance, or None."""
+        with self._lock:
+            conn = self._connect()
+            candidates = {}
+            for band, key in self._band_keys(fingerprint):
+                for fp_id, value, url, path in conn.execute(
+                        'SELECT f.id, f.simhash, f.url, f.path FROM bands b JOIN fingerprints f ON f.id = b.id '
+                        'WHERE b.band = ? AND b.key = ?', (band, key)):
+                    candidates[fp_id] = (value, url, path)
+            best = None
+            for fp_id, (value, url, path) in candidates.items():
+                distance = hamming(fingerprint, _unsigned(value))
+                if distance <= self.threshold and (best is None or distance < best['distance']):
+                    best = {'id': fp_id, 'url': url, 'path': path, 'distance': distance}
+        return best
+
+    def add(self, fingerprint, url, path, chars):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                fp_id = conn.execute(
+                    'INSERT INTO fingerprints (simhash, url, path, chars, added) VALUES (?, ?, ?, ?, ?)',
+                    (_signed(fingerprint), url, path, chars, time.time())
+                ).lastrowid
+                conn.executemany(
+                    'INSERT INTO bands (band, key, id) VALUES (?, ?, ?)',
+                    [(band, key, fp_id) for band, key in self._band_keys(fingerprint)]
+                )
+
+    def check_and_add(self, path, url=None, fingerprinted=None):
+        """Return the page a downloaded file nearly duplicates, or index it and return None.
+
+        fingerprinted is the file_fingerprint(path) result if the caller computed
+        it already, e.g. outside its own locks.
+        """
+        if fingerprinted is None:
+            fingerprinted = file_fingerprint(path)
+        if fingerprinted is None:
+            return None
+        fingerprint, chars = fingerprinted
+        with self._lock:
+            match = self.find(fingerprint)
+            if match is not None and url and match['url'] == url:
+                # A re-fetched page is not a duplicate of its own earlier version
+                match = None
+            if match is None:
+                self.add(fingerprint, url, str(path), chars)
+        return match
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            count = conn.execute('SELECT COUNT(*) FROM fingerprints').fetchone()[0]
+        return {'pages': count, 'bands': self.bands, 'threshold': self.threshold}
+
+def _page_links(directory):
+    page_yml = Path(directory) / 'page.yml'
+    if not page_yml.exists():
+        return {}
+    with open(page_yml, 'r', encoding='utf-8') as f:
+        pages = yaml.safe_load(f) or {}
+    return {name: info.get('link') for name, info in pages.items() if isinstance(info, dict)}
+
+def main():
+    parser = argparse.ArgumentParser(description='SimHash index of downloaded pages for near-duplicate detection')
+    parser.add_argument('command', choices=['index', 'check', 'stats'],
+                        help='index: add archive directories (reporting duplicates inside them); '
+                             'check: look files up without adding them; stats: index size')
+    parser.add_argument('paths', nargs='*', help='Directories for index, files for check')
+    parser.add_argument('--pattern', default='*.html', help='File pattern for index (default: *.html)')
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD,
+                        help='Maximum differing SimHash bits for a near-duplicate')
+    parser.add_argument('--path', default=None, help=f'Index database path (default: {DEFAULT_NEARDUP_PATH})')
+    args = parser.parse_args()
+
+    index = NearDupIndex(args.path, args.threshold)
+    if args.command == 'stats':
+        stats = index.stats()
+        print(f"Near-duplicate index: {index.path}")
+        print(f"  Pages: {stats['pages']}  Threshold: {stats['threshold']} bits ({stats['bands']} bands)")
+        return
+
+    if args.command == 'check':
+        for path in args.paths:
+            text = page_text(path)
+            fingerprint = simhash(text) if text is not None else None
+            if fingerprint is None:
+                print(f"-\t{path}\tnot fingerprinted (binary or too short)")
+                continue
+            match = index.find(fingerprint)
+            if match:
+                print(f"duplicate\t{path}\t{match['distance']} bits from {match['url'] or match['path']}")
+            else:
+                print(f"unique\t{path}")
+        return
+
+    if not args.paths:
+        parser.error("index needs at least one directory")
+    added = duplicates = skipped = 0
+    for directory in args.paths:
+        links = _page_links(directory)
+        for path in sorted(Path(directory).rglob(args.pattern)):
+            if not path.is_file():
+                continue
+            text = page_text(path)
+            fingerprint = simhash(text) if text is not None else None
+            if fingerprint is None:
+                skipped += 1
+                continue
+            match = index.find(fingerprint)
+            if match:
+                duplicates += 1
+                print(f"duplicate\t{path}\t{match['distance']} bits from {match['url'] or match['path']}")
+            else:
+                index.add(fingerprint, links.get(path.name), str(path), len(text))
+                added += 1
+    print(f"\nIndexed {added} pages, {duplicates} near-duplicates, {skipped} skipped", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,28 @@
 import os
+import json
+import time
 import hashlib
-import subprocess
-from pathlib import Path
-import filetype
+import mimetypes
+from urllib.parse import urlparse, unquote
+
+try:
+    import filetype
+except ImportError:
+    filetype = None
+
+from fetch_cache import NOT_MODIFIED, conditional_headers, parse_validators
+from httpdown import make_session
+
+CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 8192
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_RETRIES = 3
+
+# Unfinished downloads live here, one .part per URL, so a later attempt can resume them
+PARTIAL_DIR = '.partial'
+
+class DownloadRejected(Exception):
+    """The response can not become a usable file; retrying will not help."""
 
 def get_file_md5(filepath):
     """Calculate MD5 hash of a file"""
@@ -12,76 +32,180 @@ def get_file_md5(filepath):
             md5_hash.update(chunk)
     return md5_hash.hexdigest()
 
-def get_file_extension(file_path):
-    """Get the file extension using the filetype library"""
-    kind = filetype.guess(file_path)
-    print(kind)
-    if kind:
-        return f'.{kind.extension}'
-    else:
-        # Fallback to the original file extension
-        return os.path.splitext(file_path)[1]
-
-def download_pdf(url, output_dir, title):
-    """Download a PDF file from URL to output_dir using curl"""
+def sniff_extension(data, url=''):
+    """Guess a file extension from the first bytes of a download.
+
+    Returns '.html' for web pages (usually an error or login page served instead
+    of the file), None if the bytes are not recognised.
+    """
+    head = data[:1024].lstrip().lower()
+    if head.startswith((b'<!doctype html', b'<html', b'<head', b'<body')):
+        return '.html'
+    if filetype is not None:
+        kind = filetype.guess(data[:SNIFF_BYTES])
+        if kind:
+            extension = f'.{kind.extension}'
+            # docx/xlsx/epub are zip files; trust the URL when it names one of them
+            url_extension = os.path.splitext(unquote(urlparse(url).path))[1].lower()
+            if kind.extension == 'zip' and url_extension in ('.docx', '.xlsx', '.pptx', '.epub', '.odt'):
+                return url_extension
+            return extension
+    if data.startswith(b'%PDF-'):
+        return '.pdf'
+    return None
+
+def _partial_paths(output_dir, url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    partial_dir = os.path.join(output_dir, PARTIAL_DIR)
+    return os.path.join(partial_dir, f'{key}.part'), os.path.join(partial_dir, f'{key}.json')
+
+def _seed_hashes(part_path):
+    """Hash the bytes already on disk so a resumed download still gets full-file digests."""
+    md5_hash, sha256_hash = hashlib.md5(), hashlib.sha256()
+    head = b''
+    with open(part_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            if len(head) < SNIFF_BYTES:
+                head += chunk[:SNIFF_BYTES - len(head)]
+            md5_hash.update(chunk)
+            sha256_hash.update(chunk)
+    return md5_hash, sha256_hash, head
+
+def _fetch(session, url, part_path, meta_path, cached, max_bytes, allow_html, timeout):
+    """One request: resume the .part if the server allows it, stream the rest while hashing.
+
+    Returns ('done', md5, sha256, head, validators, content_type) or ('not_modified', validators);
+    raises on errors (the .part is kept for the next attempt unless it is useless).
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {}
+    if offset:
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                resume_validators = json.load(f)
+        except (FileNotFoundError, ValueError):
+            resume_validators = {}
+        if_range = resume_validators.get('etag') or resume_validators.get('last_modified')
+        if if_range:
+            # Only resume if the file is still the one the .part came from
+            headers['Range'] = f'bytes={offset}-'
+            headers['If-Range'] = if_range
+        else:
+            # Without a validator a changed file would be spliced onto the old bytes
+            os.remove(part_path)
+            offset = 0
+    if not offset:
+        headers.update(conditional_headers(cached))
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        validators = parse_validators(response.headers)
+        if response.status_code == 304:
+            return 'not_modified', validators
+        if response.status_code == 416:
+            # Our .part is already complete or longer than the file; start over
+            os.remove(part_path)
+            raise IOError("server rejected the resume range")
+        if response.status_code >= 400 and response.status_code not in (408, 429) and response.status_code < 500:
+            raise DownloadRejected(f"HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise IOError(f"HTTP {response.status_code}")
+
+        if response.status_code == 206 and offset:
+            md5_hash, sha256_hash, head = _seed_hashes(part_path)
+            mode = 'ab'
+        else:
+            md5_hash, sha256_hash, head = hashlib.md5(), hashlib.sha256(), b''
+            offset = 0
+            mode = 'wb'
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(validators, f)
+
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and offset + int(length) > max_bytes:
+            raise DownloadRejected(f"file too large ({(offset + int(length)) / 1024 / 1024:.1f} MB, limit {max_bytes / 1024 / 1024:.1f} MB)")
+
+        size = offset
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                    if len(head) >= 64 and not allow_html and sniff_extension(head, url) == '.html':
+                        f.close()
+                        os.remove(part_path)
+                        raise DownloadRejected("got an HTML page instead of a file")
+                size += len(chunk)
+                if size > max_bytes:
+                    f.close()
+                    os.remove(part_path)
+                    raise DownloadRejected(f"file too large (over the {max_bytes / 1024 / 1024:.1f} MB limit)")
+                f.write(chunk)
+                md5_hash.update(chunk)
+                sha256_hash.update(chunk)
+
+        if length and length.isdigit() and size - offset < int(length):
+            raise IOError(f"connection closed after {size} bytes")
+        if not allow_html and sniff_extension(head, url) == '.html':
+            os.remove(part_path)
+            raise DownloadRejected("got an HTML page instead of a file")
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        return 'done', md5_hash.hexdigest(), sha256_hash.hexdigest(), head, validators, content_type
+
+def download_pdf(url, output_dir, title, cached=None, session=None,
+                 max_bytes=DEFAULT_MAX_BYTES, allow_html=False, retries=DEFAULT_RETRIES, timeout=60):
+    """Download a PDF (or other document) from URL to output_dir, streaming to disk
+
+    The file is written to a per-URL .part under output_dir/.partial and hashed
+    while it is written; broken transfers resume with a Range request. With a
+    fetch cache entry the request is conditional on its ETag/Last-Modified.
+
+    Returns (success, result, details): result is the file path, NOT_MODIFIED
+    on a 304, or the error message; details holds etag, last_modified and,
+    for a finished file, its md5 and sha256.
+    """
+    details = {}
     try:
-        print(f"Creating output directory: {output_dir}")
         os.makedirs(output_dir, exist_ok=True)
-        
+        session = session or make_session(1)
+
         # Generate safe base filename from title
         safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
         base_name = safe_title.replace(' ', '_')[:100]
 
-        # Use a specific download directory
-        download_dir = os.path.join(output_dir, "download")
-        print(f"Creating download directory: {download_dir}")
-        # remove anything in the download directory
-        if os.path.exists(download_dir):
-            for file in os.listdir(download_dir):
-                os.remove(os.path.join(download_dir, file))
-            os.rmdir(download_dir)
-        os.makedirs(download_dir, exist_ok=False)
-
-        # Download to the specific directory
-        command = [
-            'curl',
-            '--location',
-            '--remote-name',
-            '--output-dir', download_dir,
-            '--no-progress-meter',
-            '-v',
-            '--insecure',
-            url
-        ]
-        
-        result = subprocess.run(command, capture_output=True, text=False)
-        if result.returncode != 0:
-            raise Exception(f"curl failed with error: {result.stderr.decode('utf-8', errors='ignore')}")
-        
-        # Decode stderr for logging purposes
-        print(result.stderr.decode('utf-8', errors='ignore'))
-        # Get the only file in the download directory
-        temp_files = list(Path(download_dir).iterdir())
-        if not temp_files:
-            raise Exception("Download failed: No file was created")
-        if len(temp_files) > 1:
-            raise Exception("Download failed: Multiple files were created")
-        
-        downloaded_file = temp_files[0]
-
-        # Move and rename the file
-        extension = os.path.splitext(downloaded_file)[1]
-        if not extension:
-            # try to get extension from url
-            extension = get_file_extension(downloaded_file)
-        new_filename = f"{base_name}{extension}"
-        print(extension, new_filename)
-        new_path = os.path.join(output_dir, new_filename)
-        print("renaming", downloaded_file, "to", new_path)
-        os.rename(downloaded_file, new_path)
-        
-        return True, new_path
-        
+        part_path, meta_path = _partial_paths(output_dir, url)
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+
+        for attempt in range(1, retries + 1):
+            try:
+                outcome = _fetch(session, url, part_path, meta_path, cached, max_bytes, allow_html, timeout)
+                break
+            except DownloadRejected:
+                # Nothing worth resuming
+                for path in (part_path, meta_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                print(f"→ Attempt {attempt} failed ({e}), resuming")
+                time.sleep(2 ** attempt)
+
+        if outcome[0] == 'not_modified':
+            return True, NOT_MODIFIED, outcome[1]
+        _, md5, sha256, head, validators, content_type = outcome
+        details = dict(validators, md5=md5, sha256=sha256)
+
+        # Name it like the URL's file when that has an extension, else by what the bytes are
+        extension = os.path.splitext(unquote(urlparse(url).path))[1]
+        if not extension or len(extension) > 6 or extension.lower() in ('.php', '.asp', '.aspx', '.jsp', '.do', '.cgi'):
+            extension = sniff_extension(head, url) or mimetypes.guess_extension(content_type) or ''
+        new_path = os.path.join(output_dir, f"{base_name}{extension}")
+        os.replace(part_path, new_path)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        print(f"Saved {new_path} ({os.path.getsize(new_path)} bytes)")
+        return True, new_path, details
+
     except Exception as e:
         print(f"✗ Unexpected error: {e}")
-        return False, str(e)
+        return False, str(e), details
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import random
+import threading
+from urllib.parse import urlparse
+
+DEFAULT_POLITENESS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'politeness.json')
+
+def load_politeness(path=DEFAULT_POLITENESS_PATH, sleep_duration=30):
+    """Load per-domain request pacing.
+
+    The default pace keeps the old --sleep behaviour (a random gap between
+    sleep/2 and sleep seconds), but per host instead of before every URL.
+    """
+    rules = {
+        'default': {
+            'minInterval': sleep_duration // 2,
+            'jitter': sleep_duration - sleep_duration // 2,
+            'maxConcurrent': 1
+        },
+        'domains': {}
+    }
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            loaded = json.load(f)
+    except FileNotFoundError:
+        loaded = {}
+    rules['default'].update(loaded.get('default', {}))
+    for domain, rule in loaded.get('domains', {}).items():
+        rules['domains'][domain.lower()] = dict(rules['default'], **rule)
+    return rules
+
+def host_of(url):
+    return (urlparse(url).hostname or '').lower()
+
+def domain_rule(host, rules):
+    """Rule of the longest configured domain that host belongs to, or the default."""
+    best = None
+    for domain in rules['domains']:
+        if host == domain or host.endswith('.' + domain):
+            if best is None or len(domain) > len(best):
+                best = domain
+    return rules['domains'][best] if best else rules['default']
+
+class PolitenessScheduler:
+    """Hand out queued downloads so that each host is paced by its own rule.
+
+    Workers call take() to get the next (host, item) whose host has a free slot
+    and whose minimum interval has passed, and done(host) when the request is
+    over. Items of different hosts never wait for each other.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.in_flight = {}
+        self.next_time = {}
+        self.sequence = 0
+
+    def add(self, host, item):
+        with self.cond:
+            self.sequence += 1
+            self.pending.setdefault(host, []).append((self.sequence, item))
+            self.cond.notify()
+
+    def _delay(self, host):
+        rule = domain_rule(host, self.rules)
+        return rule['minInterval'] + random.uniform(0, rule['jitter'])
+
+    def take(self):
+        """Block until some queued item may be fetched; None once the queue is empty."""
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                best = None
+                wake = None
+                for host, items in self.pending.items():
+                    if not items:
+                        continue
+                    if self.in_flight.get(host, 0) >= domain_rule(host, self.rules)['maxConcurrent']:
+                        continue
+                    ready = self.next_time.get(host, 0)
+                    if ready > now:
+                        wake = ready if wake is None else min(wake, ready)
+                    elif best is None or items[0][0] < self.pending[best][0][0]:
+                        # Among ready hosts keep the original (sequential or shuffled) order
+                        best = host
+                if best is not None:
+                    _, item = self.pending[best].pop(0)
+                    self.in_flight[best] = self.in_flight.get(best, 0) + 1
+                    self.next_time[best] = now + self._delay(best)
+                    return best, item
+                if not any(self.pending.values()):
+                    return None
+                self.cond.wait(None if wake is None else wake - now)
+
+    def done(self, host):
+        """Mark a request as finished; the next one to host waits a full interval from now."""
+        with self.cond:
+            self.in_flight[host] -= 1
+            self.next_time[host] = max(self.next_time.get(host, 0), time.monotonic() + self._delay(host))
+            self.cond.notify_all()
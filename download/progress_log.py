@@ -0,0 +1,152 @@
+import os
+import json
+import threading
+
+import yaml
+
+LOG_NAME = 'progress.jsonl'
+DEFAULT_COMPACT_EVERY = 500
+OUTCOMES = ('success', 'failed', 'skipped', 'unchanged', 'duplicate')
+# A URL keeps its highest-ranked event; among equals the latest wins. A link that
+# was downloaded before an interruption is "skipped" when the run resumes, and
+# that must not hide the download.
+RANK = {'skipped': 0, 'failed': 1, 'unchanged': 2, 'duplicate': 2, 'success': 2}
+
+def write_atomic(path, text):
+    """Replace path with text so readers never see a half-written file."""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def page_entries(success):
+    """page.yml entries (file name -> link, md5, title, snippet) for results.json success entries."""
+    return {
+        os.path.basename(entry['path']): {
+            'link': entry['url'],
+            'md5': entry['md5'],
+            'title': entry['title'],
+            'snippet': entry.get('snippet', '')
+        }
+        for entry in success
+    }
+
+class ProgressLog:
+    """Append-only JSONL journal of one download run in its output directory.
+
+    Every outcome is one line, so recording it costs the same however long the
+    run is. Success and duplicate events carry the visit_links.yml entry they
+    add, duplicates the links.yml mark; the YAML files and results.json are
+    written from the journal only when it is compacted. A journal left behind
+    by an interrupted run is replayed by the next run into the same directory.
+    """
+
+    def __init__(self, output_dir, compact_every=DEFAULT_COMPACT_EVERY):
+        self.path = os.path.join(output_dir, LOG_NAME)
+        self.compact_every = compact_every
+        self._events = {}
+        # Events without a URL ("No link provided") can not replace each other
+        self._anonymous = []
+        self._since_compact = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _keep(self, event):
+        url = event.get('url')
+        if not url:
+            self._anonymous.append(event)
+            return
+        previous = self._events.get(url)
+        if previous is None or RANK[event['event']] >= RANK[previous['event']]:
+            self._events[url] = event
+
+    def load(self):
+        """Replay the journal of an interrupted run; returns the number of events read."""
+        if not os.path.exists(self.path):
+            return 0
+        count = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # The last line of a killed run may be cut off
+                    continue
+                self._keep(event)
+                count += 1
+        return count
+
+    def record(self, event, url, entry, visit=None, mark=False):
+        """Append one outcome; returns True when the journal is due for compaction.
+
+        entry is the results.json entry, visit a {md5: visit_links entry} to
+        add, mark whether the URL is marked duplicate in links.yml.
+        """
+        line = {'event': event, 'url': url, 'entry': entry}
+        if visit:
+            line['visit'] = visit
+        if mark:
+            line['mark'] = True
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(line, ensure_ascii=False) + '\n')
+            self._file.flush()
+            self._keep(line)
+            self._since_compact += 1
+            return self._since_compact >= self.compact_every
+
+    def _retained(self):
+        return list(self._events.values()) + self._anonymous
+
+    def results(self):
+        """results.json content derived from the journal."""
+        results = {outcome: [] for outcome in OUTCOMES}
+        with self._lock:
+            for event in self._retained():
+                results[event['event']].append(event['entry'])
+        return results
+
+    def visits(self):
+        with self._lock:
+            visits = {}
+            for event in self._retained():
+                visits.update(event.get('visit') or {})
+        return visits
+
+    def marked(self):
+        with self._lock:
+            return [event['url'] for event in self._retained() if event.get('mark')]
+
+    def compact(self):
+        """Rewrite the journal with only the events that still count."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            write_atomic(self.path, ''.join(
+                json.dumps(event, ensure_ascii=False) + '\n' for event in self._retained()))
+            self._since_compact = 0
+
+    def close(self, remove=False):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if remove and os.path.exists(self.path):
+                os.remove(self.path)
+
+def save_results(path, results):
+    write_atomic(path, json.dumps(results, indent=2))
+
+def save_page_yml(path, success):
+    """Merge successful downloads into page.yml, keeping entries of earlier runs."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        pages = {}
+    pages.update(page_entries(success))
+    write_atomic(path, yaml.dump(pages, allow_unicode=True, sort_keys=False))
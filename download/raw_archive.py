@@ -0,0 +1,248 @@
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import hashlib
+import argparse
+import mimetypes
+import threading
+from pathlib import Path
+
+import yaml
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_MAX_FILE_MB = 256
+DEFAULT_LEVEL = 10
+INDEX_NAME = 'index.sqlite'
+# Text downloads compress well; PDFs and images are already compressed and stay loose
+ARCHIVE_SUFFIXES = ('.html', '.htm', '.md', '.txt')
+
+def warc_date(timestamp):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+
+def build_record(url, payload, fetched, backend=None, content_type=None, md5=None, sha256=None, name=None):
+    """A WARC/1.1 resource record: header block, blank line, payload, two CRLFs."""
+    headers = [
+        ('WARC-Type', 'resource'),
+        ('WARC-Record-ID', f'<urn:uuid:{uuid.uuid4()}>'),
+        ('WARC-Target-URI', url),
+        ('WARC-Date', warc_date(fetched)),
+        ('WARC-Payload-Digest', f'sha256:{sha256}'),
+        ('Content-Type', content_type or 'application/octet-stream'),
+        ('X-Payload-MD5', md5),
+        ('X-Fetch-Backend', backend),
+        ('X-File-Name', name),
+        ('Content-Length', str(len(payload)))
+    ]
+    head = 'WARC/1.1\r\n' + ''.join(f'{key}: {value}\r\n' for key, value in headers if value)
+    return head.encode('utf-8') + b'\r\n' + payload + b'\r\n\r\n'
+
+def parse_record(data):
+    """Split a decompressed record into (headers dict, payload)."""
+    head, _, rest = data.partition(b'\r\n\r\n')
+    headers = {}
+    for line in head.decode('utf-8').split('\r\n')[1:]:
+        key, _, value = line.partition(': ')
+        headers[key] = value
+    length = int(headers.get('Content-Length', len(rest)))
+    return headers, rest[:length]
+
+class RawArchive:
+    """Append-only store of raw downloads in size-rotated .warc.zst files.
+
+    Every record is its own zstd frame, so a record can be read back from its
+    (file, offset, length) without decompressing the rest of the file. The
+    offsets live in an SQLite index next to the archive files, keyed by URL,
+    SHA-256 and MD5.
+    """
+
+    def __init__(self, directory, max_file_bytes=DEFAULT_MAX_FILE_MB * 1024 * 1024, level=DEFAULT_LEVEL):
+        if zstandard is None:
+            raise RuntimeError("The raw archive needs zstandard (pip install zstandard)")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_file_bytes = max_file_bytes
+        self.level = level
+        self.decompressor = zstandard.ZstdDecompressor()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.directory / INDEX_NAME, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS records ('
+            'id INTEGER PRIMARY KEY, url TEXT NOT NULL, sha256 TEXT NOT NULL, md5 TEXT NOT NULL, '
+            'file TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL, size INTEGER NOT NULL, '
+            'fetched REAL NOT NULL, backend TEXT, content_type TEXT, name TEXT)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_records_url ON records(url)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_records_sha256 ON records(sha256)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_records_md5 ON records(md5)')
+        self._conn.commit()
+
+    def _current_file(self, incoming):
+        files = sorted(self.directory.glob('archive-*.warc.zst'))
+        if files and files[-1].stat().st_size + incoming <= self.max_file_bytes:
+            return files[-1]
+        number = int(files[-1].name.split('-')[1].split('.')[0]) + 1 if files else 1
+        return self.directory / f'archive-{number:05d}.warc.zst'
+
+    def _find(self, url, sha256):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT * FROM records WHERE url = ? AND sha256 = ?', (url, sha256)).fetchone()
+        return dict(row) if row else None
+
+    def add(self, url, payload, fetched=None, backend=None, content_type=None, md5=None, sha256=None, name=None):
+        """Append one raw response; the same URL with the same bytes is stored only once.
+
+        Returns the index row as a dict.
+        """
+        md5 = md5 or hashlib.md5(payload).hexdigest()
+        sha256 = sha256 or hashlib.sha256(payload).hexdigest()
+        fetched = fetched or time.time()
+        content_type = content_type or mimetypes.guess_type(name or url)[0]
+        existing = self._find(url, sha256)
+        if existing:
+            return existing
+        # Compress before taking the lock; a compressor must not be shared between threads
+        frame = zstandard.ZstdCompressor(level=self.level).compress(
+            build_record(url, payload, fetched, backend, content_type, md5, sha256, name))
+        with self._lock:
+            # Another thread may have stored the same response meanwhile
+            existing = self._conn.execute(
+                'SELECT * FROM records WHERE url = ? AND sha256 = ?', (url, sha256)).fetchone()
+            if existing:
+                return dict(existing)
+            with open(self.directory / '.lock', 'w') as lock_file:
+                # Other download processes may append to the same archive
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                path = self._current_file(len(frame))
+                with open(path, 'ab') as f:
+                    offset = f.tell()
+                    f.write(frame)
+                    f.flush()
+                    os.fsync(f.fileno())
+                with self._conn:
+                    cursor = self._conn.execute(
+                        'INSERT INTO records (url, sha256, md5, file, offset, length, size, fetched, backend, content_type, name) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (url, sha256, md5, path.name, offset, len(frame), len(payload), fetched, backend, content_type, name)
+                    )
+            return dict(self._conn.execute('SELECT * FROM records WHERE id = ?', (cursor.lastrowid,)).fetchone())
+
+    def add_file(self, url, path, **meta):
+        with open(path, 'rb') as f:
+            payload = f.read()
+        meta.setdefault('name', Path(path).name)
+        meta.setdefault('fetched', os.path.getmtime(path))
+        return self.add(url, payload, **meta)
+
+    def lookup(self, key):
+        """Latest record for a URL, SHA-256 or MD5, as an index row dict (or None)."""
+        column = 'url'
+        if '://' not in key:
+            column = 'sha256' if len(key) == 64 else 'md5'
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT * FROM records WHERE {column} = ? ORDER BY fetched DESC LIMIT 1', (key,)).fetchone()
+        return dict(row) if row else None
+
+    def read(self, record):
+        """Return (headers, payload) of an index row."""
+        with open(self.directory / record['file'], 'rb') as f:
+            f.seek(record['offset'])
+            frame = f.read(record['length'])
+        return parse_record(self.decompressor.decompress(frame))
+
+    def stats(self):
+        with self._lock:
+            count, raw, stored = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0) FROM records').fetchone()
+        files = len(list(self.directory.glob('archive-*.warc.zst')))
+        return {'records': count, 'raw_bytes': raw, 'stored_bytes': stored, 'files': files}
+
+    def close(self):
+        self._conn.close()
+
+def _page_links(directory):
+    page_yml = Path(directory) / 'page.yml'
+    if not page_yml.exists():
+        return {}
+    with open(page_yml, 'r', encoding='utf-8') as f:
+        pages = yaml.safe_load(f) or {}
+    return {name: info.get('link') for name, info in pages.items() if isinstance(info, dict)}
+
+def import_directory(archive, directory, pattern, delete=False):
+    """Archive loose downloads; files without a page.yml link are stored under a file:// URL."""
+    links = _page_links(directory)
+    imported = 0
+    for path in sorted(Path(directory).rglob(pattern)):
+        if not path.is_file() or path.name in ('page.yml', 'results.json'):
+            continue
+        url = links.get(path.name) or path.resolve().as_uri()
+        record = archive.add_file(url, path, backend='import')
+        # Only drop the loose file once its record reads back identically
+        if delete:
+            _, payload = archive.read(record)
+            if hashlib.sha256(payload).hexdigest() == record['sha256']:
+                path.unlink()
+        imported += 1
+    return imported
+
+def main():
+    parser = argparse.ArgumentParser(description='Compressed WARC-style archive of raw downloads')
+    parser.add_argument('command', choices=['import', 'get', 'stats'],
+                        help='import: archive loose files from directories; get: print a record by URL, SHA-256 or MD5; stats: archive size')
+    parser.add_argument('args', nargs='*', help='Directories for import, a URL or hash for get')
+    parser.add_argument('--archive', required=True, help='Archive directory')
+    parser.add_argument('--pattern', default='*.html', help='File pattern for import (default: *.html)')
+    parser.add_argument('--delete', action='store_true', help='Delete imported files after they were verified')
+    parser.add_argument('--max-file-mb', type=int, default=DEFAULT_MAX_FILE_MB, help='Start a new archive file at this size')
+    parser.add_argument('--headers', action='store_true', help='For get, print the record headers instead of the payload')
+    parser.add_argument('-o', '--output', default=None, help='For get, write the payload to this file')
+    args = parser.parse_args()
+
+    archive = RawArchive(args.archive, args.max_file_mb * 1024 * 1024)
+    if args.command == 'import':
+        if not args.args:
+            parser.error("import needs at least one directory")
+        for directory in args.args:
+            count = import_directory(archive, directory, args.pattern, args.delete)
+            print(f"Imported {count} files from {directory}")
+    elif args.command == 'get':
+        if len(args.args) != 1:
+            parser.error("get needs one URL or hash")
+        record = archive.lookup(args.args[0])
+        if record is None:
+            print(f"Not in archive: {args.args[0]}", file=sys.stderr)
+            sys.exit(1)
+        headers, payload = archive.read(record)
+        if args.headers:
+            for key, value in headers.items():
+                print(f"{key}: {value}")
+        elif args.output:
+            with open(args.output, 'wb') as f:
+                f.write(payload)
+        else:
+            sys.stdout.buffer.write(payload)
+    if args.command == 'stats':
+        stats = archive.stats()
+        ratio = stats['raw_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 0
+        print(f"Archive: {args.archive}")
+        print(f"  Records: {stats['records']} in {stats['files']} files")
+        print(f"  Raw: {stats['raw_bytes'] / 1024 / 1024:.1f} MB  Stored: {stats['stored_bytes'] / 1024 / 1024:.1f} MB  ({ratio:.1f}x)")
+    archive.close()
+
+if __name__ == '__main__':
+    main()
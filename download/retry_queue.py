@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import argparse
+import threading
+
+DEFAULT_RETRY_QUEUE_PATH = '.github/cache/retry_queue.sqlite'
+
+# (pattern, category) in order; the first match wins
+ERROR_CATEGORIES = [
+    (re.compile(r'HTTP (404|410)\b'), 'gone'),
+    (re.compile(r'(?i)HTTP (403|429|451)\b|captcha|blocked|HTML page instead of a file'), 'blocked'),
+    (re.compile(r'(?i)file too large'), 'rejected'),
+    (re.compile(r'HTTP 4\d\d\b'), 'client'),
+    (re.compile(r'HTTP 5\d\d\b'), 'server'),
+    (re.compile(r'(?i)timed? ?out|timeout'), 'timeout'),
+    (re.compile(r'(?i)not found in PATH|No space left'), 'local'),
+    (re.compile(r'(?i)connection|resolve|name or service|ssl|reset|refused|curl failed|HTTP error'), 'network')
+]
+
+# category -> (first backoff in seconds, maximum attempts); the backoff doubles per attempt
+RETRY_POLICY = {
+    'timeout': (1800, 6),
+    'server': (1800, 6),
+    'network': (1800, 6),
+    'other': (3600, 4),
+    'blocked': (6 * 3600, 5),
+    'client': (6 * 3600, 2),
+    'local': (0, 10),
+    'gone': (0, 1),
+    'rejected': (0, 1)
+}
+MAX_BACKOFF = 7 * 24 * 3600
+
+# Failures that say something about the host (not the URL or this machine) count for its breaker
+BREAKER_CATEGORIES = {'timeout', 'server', 'network', 'blocked'}
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 1800
+MAX_BREAKER_COOLDOWN = 24 * 3600
+
+def classify_error(message):
+    for pattern, category in ERROR_CATEGORIES:
+        if pattern.search(message or ''):
+            return category
+    return 'other'
+
+def format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp))
+
+class RetryQueue:
+    """Failed downloads with attempt counts and backoff, plus a circuit breaker per host.
+
+    A failure is classified from its error message; its category decides how long
+    to wait before the next attempt and when to give up. A host whose requests
+    keep failing is skipped until its cooldown has passed, after which one
+    request is let through: success closes the breaker, failure re-opens it for
+    twice as long.
+    """
+
+    def __init__(self, path=None, breaker_threshold=DEFAULT_BREAKER_THRESHOLD,
+                 breaker_cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.path = path or os.getenv('RETRY_QUEUE_PATH') or DEFAULT_RETRY_QUEUE_PATH
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS failures ('
+                'url TEXT PRIMARY KEY, host TEXT NOT NULL, download_type TEXT, info TEXT, '
+                'error TEXT, category TEXT NOT NULL, attempts INTEGER NOT NULL, '
+                'first_failed REAL NOT NULL, last_failed REAL NOT NULL, next_eligible REAL NOT NULL, '
+                'gave_up INTEGER NOT NULL DEFAULT 0)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_failures_due ON failures(gave_up, next_eligible)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS breakers ('
+                'host TEXT PRIMARY KEY, failures INTEGER NOT NULL, trips INTEGER NOT NULL DEFAULT 0, '
+                'open_until REAL NOT NULL DEFAULT 0)'
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, url):
+        with self._lock:
+            row = self._connect().execute('SELECT * FROM failures WHERE url = ?', (url,)).fetchone()
+        return dict(row) if row else None
+
+    def due(self, download_type=None):
+        """Entries whose backoff has passed, oldest first, as dicts with info decoded."""
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT * FROM failures WHERE gave_up = 0 AND next_eligible <= ? ORDER BY next_eligible',
+                (time.time(),)
+            ).fetchall()
+        entries = []
+        for row in rows:
+            if download_type and row['download_type'] not in (None, download_type):
+                continue
+            entry = dict(row)
+            entry['info'] = json.loads(entry['info'] or '{}')
+            entries.append(entry)
+        return entries
+
+    def record_failure(self, url, host, error, info=None, download_type=None):
+        """Count a failed attempt; returns the updated entry (see gave_up and next_eligible)."""
+        category = classify_error(error)
+        first_backoff, max_attempts = RETRY_POLICY[category]
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                row = conn.execute('SELECT attempts, first_failed FROM failures WHERE url = ?', (url,)).fetchone()
+                attempts = (row['attempts'] if row else 0) + 1
+                backoff = min(first_backoff * 2 ** (attempts - 1), MAX_BACKOFF) * random.uniform(0.9, 1.1)
+                entry = {
+                    'url': url,
+                    'host': host,
+                    'download_type': download_type,
+                    'info': json.dumps(info or {}, ensure_ascii=False),
+                    'error': error,
+                    'category': category,
+                    'attempts': attempts,
+                    'first_failed': row['first_failed'] if row else now,
+                    'last_failed': now,
+                    'next_eligible': now + backoff,
+                    'gave_up': int(attempts >= max_attempts)
+                }
+                conn.execute(
+                    'INSERT OR REPLACE INTO failures (' + ', '.join(entry) + ') VALUES (' +
+                    ', '.join('?' for _ in entry) + ')',
+                    tuple(entry.values())
+                )
+                if category in BREAKER_CATEGORIES:
+                    self._breaker_failure(conn, host, now)
+        return entry
+
+    def record_success(self, url, host):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute('DELETE FROM failures WHERE url = ?', (url,))
+                conn.execute('DELETE FROM breakers WHERE host = ?', (host,))
+
+    def _breaker_failure(self, conn, host, now):
+        row = conn.execute('SELECT failures, trips, open_until FROM breakers WHERE host = ?', (host,)).fetchone()
+        failures = (row['failures'] if row else 0) + 1
+        trips = row['trips'] if row else 0
+        open_until = row['open_until'] if row else 0
+        # A failure after the cooldown (the trial request) re-opens at once
+        if failures >= self.breaker_threshold or (trips and open_until <= now):
+            trips += 1
+            open_until = now + min(self.breaker_cooldown * 2 ** (trips - 1), MAX_BREAKER_COOLDOWN)
+            failures = 0
+        conn.execute(
+            'INSERT OR REPLACE INTO breakers (host, failures, trips, open_until) VALUES (?, ?, ?, ?)',
+            (host, failures, trips, open_until)
+        )
+
+    def breaker_open_until(self, host):
+        """When the host's breaker closes again, or None if requests may go out now."""
+        with self._lock:
+            row = self._connect().execute('SELECT open_until FROM breakers WHERE host = ?', (host,)).fetchone()
+        if row and row['open_until'] > time.time():
+            return row['open_until']
+        return None
+
+    def reset(self, url=None, host=None):
+        """Make a URL due now (and un-give-up it), or close a host's breaker."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                if url:
+                    conn.execute('UPDATE failures SET next_eligible = 0, gave_up = 0 WHERE url = ?', (url,))
+                if host:
+                    conn.execute('DELETE FROM breakers WHERE host = ?', (host,))
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            categories = conn.execute(
+                'SELECT category, COUNT(*), SUM(gave_up), SUM(next_eligible <= ? AND gave_up = 0) '
+                'FROM failures GROUP BY category ORDER BY COUNT(*) DESC', (time.time(),)
+            ).fetchall()
+            breakers = conn.execute(
+                'SELECT host, trips, open_until FROM breakers WHERE open_until > ? ORDER BY open_until',
+                (time.time(),)
+            ).fetchall()
+        return {
+            'categories': [tuple(row) for row in categories],
+            'open_breakers': [tuple(row) for row in breakers]
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or reset the download retry queue')
+    parser.add_argument('command', choices=['stats', 'list', 'reset'], help='Action to perform')
+    parser.add_argument('target', nargs='?', help='For reset: a URL (make it due now) or a host (close its breaker)')
+    parser.add_argument('--path', default=None, help=f'Queue database path (default: {DEFAULT_RETRY_QUEUE_PATH})')
+    args = parser.parse_args()
+
+    queue = RetryQueue(args.path)
+    if args.command == 'reset':
+        if not args.target:
+            parser.error("reset needs a URL or host")
+        if '://' in args.target:
+            queue.reset(url=args.target)
+        else:
+            queue.reset(host=args.target)
+        print(f"Reset {args.target}")
+        return
+
+    if args.command == 'list':
+        for entry in queue.due():
+            print(f"{entry['category']}\t{entry['attempts']}\t{entry['url']}\t{entry['error']}")
+        return
+
+    stats = queue.stats()
+    print(f"Retry queue: {queue.path}")
+    print(f"  {'category':<10} {'total':>6} {'gave up':>8} {'due':>6}")
+    for category, total, gave_up, due in stats['categories']:
+        print(f"  {category:<10} {total:>6} {gave_up or 0:>8} {due or 0:>6}")
+    for host, trips, open_until in stats['open_breakers']:
+        print(f"  Breaker open for {host} until {format_time(open_until)} (tripped {trips}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+import os
+import sys
+import json
+import time
+import bisect
+import hashlib
+import argparse
+import threading
+from array import array
+from itertools import chain
+
+import yaml
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from progress_log import write_atomic
+
+# libyaml parses a large visit_links.yml many times faster
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+DEFAULT_VISIT_LINKS_PATH = '.github/visit_links.yml'
+DEFAULT_INDEX_PATH = '.github/cache/visited_index.bin'
+INDEX_VERSION = 1
+
+def url_key(url):
+    """64-bit key of a URL; collisions are negligible at archive sizes."""
+    return int.from_bytes(hashlib.blake2b(url.strip().encode('utf-8'), digest_size=8).digest(), 'big')
+
+def md5_key(md5):
+    md5 = str(md5)
+    try:
+        return int(md5[:16], 16)
+    except ValueError:
+        return url_key(md5)
+
+def _position(values, key):
+    i = bisect.bisect_left(values, key)
+    return i if i < len(values) and values[i] == key else None
+
+def _fingerprint(path):
+    """Size and digest of visit_links.yml; the index is only valid for exactly this file."""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return f'{os.path.getsize(path)}:{digest.hexdigest()}'
+    except FileNotFoundError:
+        return None
+
+class VisitedLedger:
+    """visit_links.yml indexed by URL and content MD5, for lookups without scanning it.
+
+    The keys are 64-bit hashes in sorted array('Q')s (8 bytes per link), cached
+    in a binary index file that is reused while visit_links.yml is unchanged, so
+    most runs never parse the YAML. A visit is written to a JSONL journal when
+    it is added and to visit_links.yml on flush, where new entries are appended
+    rather than the file rewritten. The journal also keeps the URLs visit_links.yml
+    can not: a page whose content duplicates an earlier one shares its MD5 entry.
+    """
+
+    def __init__(self, path=None, index_path=None):
+        self.path = path or DEFAULT_VISIT_LINKS_PATH
+        self.index_path = index_path or os.getenv('VISITED_INDEX_PATH') or DEFAULT_INDEX_PATH
+        self.journal_path = os.path.splitext(self.index_path)[0] + '.jsonl'
+        self._urls = array('Q')
+        self._md5s = array('Q')
+        # URL key of each MD5's link, parallel to _md5s
+        self._md5_urls = array('Q')
+        # Added since the index was loaded
+        self._new_urls = set()
+        self._new_md5s = {}
+        # md5 -> entry not yet in visit_links.yml
+        self._pending = {}
+        self._journal = None
+        # Whether the saved index is behind (journal lines or entries added since)
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            offset = self._read_index()
+            if offset is None:
+                self._rebuild()
+            else:
+                for line in self._journal_lines(offset):
+                    if self._add(line['url'], line['md5'], line['entry']):
+                        self._dirty = True
+        return self
+
+    def _read_index(self):
+        """Load the cached arrays; returns the journal offset they cover, or None if stale."""
+        try:
+            f = open(self.index_path, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                return None
+            if (header.get('version') != INDEX_VERSION or header.get('byteorder') != sys.byteorder
+                    or header.get('visit_links') != _fingerprint(self.path)
+                    or header.get('journal_offset', 0) > self._journal_size()):
+                return None
+            arrays = []
+            for count in (header['urls'], header['md5s'], header['md5s']):
+                values = array('Q')
+                values.frombytes(f.read(count * values.itemsize))
+                if len(values) != count:
+                    return None
+                arrays.append(values)
+        self._urls, self._md5s, self._md5_urls = arrays
+        return header['journal_offset']
+
+    def _journal_size(self):
+        return os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+
+    def _journal_lines(self, offset):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # The last line of a killed run may be cut off
+                    continue
+
+    def _rebuild(self):
+        """Index visit_links.yml and the journal from scratch (the one slow path)."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                visited = yaml.load(f, Loader=Loader) or {}
+        except FileNotFoundError:
+            visited = {}
+        md5_urls = {}
+        urls = set()
+        for md5, entry in visited.items():
+            link = entry.get('link') if isinstance(entry, dict) else None
+            md5_urls[md5_key(md5)] = url_key(link) if link else 0
+            if link:
+                urls.add(url_key(link))
+
+        # Only journal lines visit_links.yml does not cover are kept
+        kept = []
+        for line in self._journal_lines(0):
+            ukey, mkey = url_key(line['url']), md5_key(line['md5'])
+            if ukey in urls and mkey in md5_urls:
+                continue
+            if mkey not in md5_urls:
+                # Visited, but the run stopped before visit_links.yml was written
+                md5_urls[mkey] = ukey
+                self._pending[line['md5']] = line['entry']
+            urls.add(ukey)
+            kept.append(json.dumps(line, ensure_ascii=False) + '\n')
+        os.makedirs(os.path.dirname(self.journal_path) or '.', exist_ok=True)
+        write_atomic(self.journal_path, ''.join(kept))
+
+        self._urls = array('Q', sorted(urls))
+        pairs = sorted(md5_urls.items())
+        self._md5s = array('Q', (mkey for mkey, _ in pairs))
+        self._md5_urls = array('Q', (ukey for _, ukey in pairs))
+        self._new_urls, self._new_md5s = set(), {}
+        # With recovered entries the index waits for flush, or they would be skipped next load
+        if self._pending:
+            self._dirty = True
+        else:
+            self._save_index()
+
+    def _save_index(self):
+        if self._new_urls or self._new_md5s:
+            self._urls = array('Q', sorted(chain(self._urls, self._new_urls)))
+            pairs = sorted(chain(zip(self._md5s, self._md5_urls), self._new_md5s.items()))
+            self._md5s = array('Q', (mkey for mkey, _ in pairs))
+            self._md5_urls = array('Q', (ukey for _, ukey in pairs))
+            self._new_urls, self._new_md5s = set(), {}
+        if self._journal is not None:
+            self._journal.flush()
+        header = {
+            'version': INDEX_VERSION,
+            'byteorder': sys.byteorder,
+            'visit_links': _fingerprint(self.path),
+            'journal_offset': self._journal_size(),
+            'urls': len(self._urls),
+            'md5s': len(self._md5s)
+        }
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            for values in (self._urls, self._md5s, self._md5_urls):
+                values.tofile(f)
+        os.replace(tmp_path, self.index_path)
+
+    def _has_url(self, ukey):
+        return ukey in self._new_urls or _position(self._urls, ukey) is not None
+
+    def _md5_url(self, mkey):
+        """URL key recorded for an MD5, 0 for an entry without link, None if unknown."""
+        if mkey in self._new_md5s:
+            return self._new_md5s[mkey]
+        i = _position(self._md5s, mkey)
+        return self._md5_urls[i] if i is not None else None
+
+    def has_url(self, url):
+        with self._lock:
+            return self._has_url(url_key(url))
+
+    def has_md5(self, md5):
+        with self._lock:
+            return self._md5_url(md5_key(md5)) is not None
+
+    def link_matches(self, md5, url):
+        """Whether md5's visit_links.yml entry is for this URL."""
+        with self._lock:
+            return self._md5_url(md5_key(md5)) == url_key(url)
+
+    def _add(self, url, md5, entry):
+        ukey, mkey = url_key(url), md5_key(md5)
+        known_url = self._has_url(ukey)
+        known_md5 = self._md5_url(mkey) is not None
+        if not known_md5:
+            self._new_md5s[mkey] = ukey
+            self._pending[md5] = entry
+        if not known_url:
+            self._new_urls.add(ukey)
+        return not (known_url and known_md5)
+
+    def add(self, url, md5, entry):
+        """Record a visit. An MD5 that is already known keeps its first entry; the URL is still indexed.
+
+        Returns False if both were known already.
+        """
+        with self._lock:
+            if not self._add(url, md5, entry):
+                return False
+            self._dirty = True
+            if self._journal is None:
+                os.makedirs(os.path.dirname(self.journal_path) or '.', exist_ok=True)
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal.write(json.dumps({'url': url, 'md5': md5, 'entry': entry}, ensure_ascii=False) + '\n')
+            self._journal.flush()
+            return True
+
+    def _append_yaml(self, entries):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'ab+') as f:
+            # Other download runs may append at the same time
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            content = f.read()
+            if content.lstrip().startswith(b'{'):
+                # A flow mapping ("{}") can not be appended to; write it out in block style
+                existing = yaml.load(content.decode('utf-8'), Loader=Loader) or {}
+                existing.update(entries)
+                f.truncate(0)
+                f.write(yaml.dump(existing, allow_unicode=True).encode('utf-8'))
+            else:
+                if content and not content.endswith(b'\n'):
+                    f.write(b'\n')
+                f.write(yaml.dump(entries, allow_unicode=True).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def flush(self):
+        """Append pending entries to visit_links.yml and save the index; returns how many were written."""
+        with self._lock:
+            count = len(self._pending)
+            if self._pending:
+                self._append_yaml(self._pending)
+                self._pending = {}
+                self._dirty = True
+            if self._dirty:
+                self._save_index()
+                self._dirty = False
+            return count
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'urls': len(self._urls) + len(self._new_urls),
+                'md5s': len(self._md5s) + len(self._new_md5s),
+                'pending': len(self._pending)
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description='Indexed view of visit_links.yml')
+    parser.add_argument('command', choices=['stats', 'check', 'rebuild'],
+                        help='stats: index size; check: whether URLs were visited; rebuild: re-index visit_links.yml')
+    parser.add_argument('urls', nargs='*', help='URLs for check')
+    parser.add_argument('--visit-links', default=DEFAULT_VISIT_LINKS_PATH, help='Path to visit_links.yml')
+    parser.add_argument('--index', default=None, help=f'Index file (default: {DEFAULT_INDEX_PATH})')
+    args = parser.parse_args()
+
+    ledger = VisitedLedger(args.visit_links, args.index)
+    if args.command == 'rebuild' and os.path.exists(ledger.index_path):
+        os.remove(ledger.index_path)
+    start = time.time()
+    ledger.load()
+    elapsed = time.time() - start
+    # Entries recovered from the journal of a killed run go to visit_links.yml now
+    if ledger.stats()['pending']:
+        print(f"Recovered {ledger.flush()} visits into {ledger.path}")
+
+    if args.command == 'check':
+        for url in args.urls:
+            print(f"{'visited' if ledger.has_url(url) else 'new'}\t{url}")
+    else:
+        stats = ledger.stats()
+        print(f"Visited ledger: {ledger.path} (index {ledger.index_path})")
+        print(f"  URLs: {stats['urls']}  MD5s: {stats['md5s']}  loaded in {elapsed:.2f}s")
+    ledger.close()
+
+if __name__ == '__main__':
+    main()
@@ -24,7 +24,7 @@ def get_file_md5(filepath):
             md5_hash.update(chunk)
     return md5_hash.hexdigest()
 
-def download_webpage(url, output_dir, title):
+def download_webpage(url, output_dir, title, pool=None):
     """
     Download a webpage using headless Chrome and save it as HTML
     
@@ -32,6 +32,8 @@ def download_webpage(url, output_dir, title):
         url (str): URL to download
         output_dir (str): Directory to save the file
         title (str): Title to use for the filename
+        pool (ChromePool): Optional pool of running Chrome instances; without it
+            a new Chrome process is started for the page
     
     Returns:
         tuple: (success (bool), result (str))
@@ -41,7 +43,7 @@ def download_webpage(url, output_dir, title):
     try:
         # Check if Chrome/Chromium is available
         chrome_path = shutil.which('chromium') or shutil.which('chrome') or shutil.which('google-chrome')
-        if not chrome_path:
+        if not chrome_path and pool is None:
             return False, "Chrome/Chromium not found in PATH"
 
         # Create sanitized filename from title
@@ -57,6 +59,13 @@ def download_webpage(url, output_dir, title):
         # Ensure the output directory exists
         Path(output_dir).mkdir(parents=True, exist_ok=True)
 
+        if pool is not None:
+            # Render on an already running browser instead of paying startup per page
+            html = pool.render(url)
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(html + '\n')
+            return True, output_path
+
         # Chrome command arguments
         chrome_args = [
             chrome_path,
@@ -87,8 +96,8 @@ def download_webpage(url, output_dir, title):
         
         return True, output_path
         
-    except subprocess.TimeoutExpired:
-        return False, "Chrome timeout after 30 seconds"
+    except (subprocess.TimeoutExpired, TimeoutError):
+        return False, "Chrome timeout after 300 seconds"
     except subprocess.SubprocessError as e:
         return False, f"Chrome subprocess error: {str(e)}"
     except Exception as e:
@@ -33,6 +33,17 @@ def append_original_link(file_path, original_link):
     except Exception as e:
         print(f"Error appending original link to {file_path}: {e}")
 
+def prepend_front_matter(file_path, meta):
+    """Prepend metadata extracted at clean time as YAML front matter."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        front_matter = yaml.safe_dump(meta, allow_unicode=True, sort_keys=False)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(f"---\n{front_matter}---\n\n{content}")
+    except Exception as e:
+        print(f"Error writing front matter to {file_path}: {e}")
+
 def process_files(source_dir, target_dir):
     """Process and copy valid files from source to target directory."""
     source_dir = Path(source_dir)
@@ -63,6 +74,8 @@ def process_files(source_dir, target_dir):
                 if file_name_html in original_links:
                     original_link = original_links[file_name_html]['link']
                     append_original_link(target_file, original_link)
+                    if original_links[file_name_html].get('meta'):
+                        prepend_front_matter(target_file, original_links[file_name_html]['meta'])
                 else:
                     print("not found" + file_name_html)
             except Exception as e:
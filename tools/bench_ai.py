@@ -0,0 +1,184 @@
+"""Benchmark the AI stages against the local fake OpenAI server.
+
+Generates a synthetic workload, runs check_related.py, process_dir.py,
+gen.py and gen_struct.py against tools/fake_openai_server.py and reports
+throughput, server-side latency percentiles and retry behavior per stage.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shlex
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from fake_openai_server import start_server, add_server_arguments, server_options
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+STAGES = ['check_related', 'process_dir', 'gen', 'gen_struct']
+
+CHECK_RELATED_TEMPLATE = """判断以下新闻是否与多元性别相关。
+
+标题：{title}
+链接：{link}
+摘要：{snippet}
+"""
+
+CLASSIFY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_related": {"type": "string", "enum": ["True", "False", "NotSure"]}
+    },
+    "required": ["is_related"],
+    "additionalProperties": False
+}
+
+def make_paragraph(rng, length):
+    words = ['跨性别', '社区', '报道', '活动', '权益', '法律', '医疗', '教育', '城市', '志愿者', '调查', '访谈']
+    return ''.join(rng.choice(words) for _ in range(length)) + '。'
+
+def make_workload(work_dir, links, docs, seed):
+    """Write links.yml, a check_related template and a markdown directory."""
+    rng = random.Random(seed)
+    links_data = {
+        f"https://news.example.com/{i}.html": {
+            'title': f"新闻标题 {i} {make_paragraph(rng, 3)}",
+            'snippet': make_paragraph(rng, 20),
+            'is_related': 'unknown'
+        }
+        for i in range(links)
+    }
+    with open(work_dir / 'links.yml', 'w', encoding='utf-8') as f:
+        yaml.dump(links_data, f, allow_unicode=True)
+    (work_dir / 'check_related.md.template').write_text(CHECK_RELATED_TEMPLATE, encoding='utf-8')
+    (work_dir / 'schema.json').write_text(json.dumps(CLASSIFY_SCHEMA), encoding='utf-8')
+
+    markdown_dir = work_dir / 'markdown'
+    markdown_dir.mkdir()
+    for i in range(docs):
+        # Lognormal lengths: most articles are short, a few are very long
+        paragraphs = max(1, int(rng.lognormvariate(2.3, 0.8)))
+        body = '\n\n'.join(make_paragraph(rng, rng.randint(20, 80)) for _ in range(paragraphs))
+        (markdown_dir / f"doc_{i}.md").write_text(f"# 文章 {i}\n\n{body}\n", encoding='utf-8')
+    return markdown_dir
+
+def server_call(base, path, method='GET'):
+    request = urllib.request.Request(base + path, method=method, data=b'' if method == 'POST' else None)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def run_command(cmd, env, quiet):
+    output = subprocess.DEVNULL if quiet else None
+    return subprocess.run(cmd, env=env, stdout=output, stderr=output).returncode
+
+def stage_commands(stage, work_dir, markdown_dir, args):
+    """Return the list of commands that make up one stage, plus how many to run at once."""
+    python = sys.executable
+    if stage == 'check_related':
+        return [[python, str(REPO_ROOT / 'ai/check_related.py'),
+                 '-i', str(work_dir / 'links.yml'),
+                 '-t', str(work_dir / 'check_related.md.template'),
+                 '-g', str(REPO_ROOT / 'ai/gen_struct.py')] + shlex.split(args.check_related_args)], 1
+    if stage == 'process_dir':
+        return [[python, str(REPO_ROOT / 'web_cleanup/ai/process_dir.py'),
+                 str(markdown_dir), str(work_dir / 'ready'),
+                 str(REPO_ROOT / 'web_cleanup/ai/prompt/clean.template'),
+                 '--gen', str(REPO_ROOT / 'web_cleanup/ai/gen.py')] + shlex.split(args.process_dir_args)], 1
+    files = sorted(markdown_dir.glob('*.md'))[:args.calls]
+    out_dir = work_dir / f"{stage}_out"
+    out_dir.mkdir(exist_ok=True)
+    if stage == 'gen':
+        return [[python, str(REPO_ROOT / 'web_cleanup/ai/gen.py'), str(f), str(out_dir / f.name)]
+                for f in files], args.parallel
+    return [[python, str(REPO_ROOT / 'ai/gen_struct.py'), str(f), str(out_dir / (f.stem + '.json')),
+             str(work_dir / 'schema.json')] for f in files], args.parallel
+
+def run_stage(stage, base, env, work_dir, markdown_dir, args):
+    commands, parallel = stage_commands(stage, work_dir, markdown_dir, args)
+    server_call(base, '/stats/reset', 'POST')
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        codes = list(executor.map(lambda cmd: run_command(cmd, env, args.quiet), commands))
+    wall = time.monotonic() - started
+    stats = server_call(base, '/stats')
+    stats.update({
+        'stage': stage,
+        'wall': wall,
+        'throughput': stats['requests'] / wall if wall else 0.0,
+        'failed_commands': sum(1 for code in codes if code != 0)
+    })
+    return stats
+
+def print_report(results):
+    print("\n" + "=" * 105)
+    print(f"{'stage':<14}{'requests':>9}{'wall s':>9}{'req/s':>8}{'p50 s':>8}{'p99 s':>8}"
+          f"{'429':>6}{'5xx':>6}{'retries':>9}{'aborted':>9}{'failed':>8}")
+    print("-" * 105)
+    for r in results:
+        statuses = r['statuses']
+        errors_5xx = sum(v for k, v in statuses.items() if k.startswith('5'))
+        print(f"{r['stage']:<14}{r['requests']:>9}{r['wall']:>9.1f}{r['throughput']:>8.2f}"
+              f"{r['p50']:>8.2f}{r['p99']:>8.2f}{statuses.get('429', 0):>6}{errors_5xx:>6}"
+              f"{r['retries']:>9}{r.get('aborted_streams', 0):>9}{r['failed_commands']:>8}")
+    print("=" * 105)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the AI stages against a local fake OpenAI server')
+    parser.add_argument('--stages', default=','.join(STAGES), help=f"Comma-separated stages to run ({', '.join(STAGES)})")
+    parser.add_argument('--links', type=int, default=50, help='Number of links for check_related')
+    parser.add_argument('--docs', type=int, default=30, help='Number of markdown documents for process_dir')
+    parser.add_argument('--calls', type=int, default=20, help='Direct gen.py / gen_struct.py invocations')
+    parser.add_argument('--parallel', type=int, default=4, help='Concurrent direct gen.py / gen_struct.py invocations')
+    parser.add_argument('--check-related-args', default='', help='Extra arguments for check_related.py')
+    parser.add_argument('--process-dir-args', default='', help='Extra arguments for process_dir.py')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic workload')
+    parser.add_argument('--json', default=None, help='Also write the results to this JSON file')
+    parser.add_argument('--quiet', action='store_true', help='Hide the output of the benchmarked scripts')
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)}")
+
+    server = start_server(**server_options(args))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"Fake OpenAI server ({args.mode}) listening on {base}/v1")
+
+    env = os.environ.copy()
+    env.update({
+        'OPENAI_BASE_URL': base + '/v1',
+        'OPENAI_API_KEY': env.get('OPENAI_API_KEY', 'bench'),
+        # Measure the API path, not the local response cache
+        'LLM_CACHE_DISABLE': '1'
+    })
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_ai_') as temp_dir:
+        work_dir = Path(temp_dir)
+        # Keep the fake calls out of the real ledger, its budgets and spend summaries
+        env['LLM_LEDGER_PATH'] = str(work_dir / 'llm_ledger.sqlite')
+        env['LLM_RUN_ID'] = f"bench-{time.strftime('%Y%m%d-%H%M%S')}"
+        markdown_dir = make_workload(work_dir, args.links, args.docs, args.seed)
+        for stage in stages:
+            print(f"\nRunning stage: {stage}")
+            results.append(run_stage(stage, base, env, work_dir, markdown_dir, args))
+
+    server.shutdown()
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.json}")
+
+if __name__ == '__main__':
+    main()
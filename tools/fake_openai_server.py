@@ -0,0 +1,442 @@
+"""Local OpenAI-compatible stand-in for exercising the AI stages offline.
+
+Modes:
+    synthetic  Echo the last user message for plain completions and return
+               schema-valid JSON for json_schema requests.
+    replay     Answer from a JSONL recordings file (falls back to synthetic
+               on a miss unless --strict-replay is given).
+    record     Forward requests to the real API and append the responses to
+               the recordings file.
+
+Requests with "stream": true are answered as server-sent events in every mode.
+Synthetic and replayed answers report usage.prompt_tokens_details.cached_tokens
+from a simulated prompt prefix cache.
+
+Point the scripts at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+import urllib.request
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def estimate_tokens(text):
+    """Rough token estimate: about one token per CJK character, four other characters per token."""
+    cjk = len(re.findall(r'[　-〿㐀-䶿一-鿿＀-￯]', text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+# Characters per streamed delta
+STREAM_CHUNK_CHARS = 8
+
+def request_key(body):
+    """Key a request by everything that affects the answer."""
+    relevant = {
+        'model': body.get('model'),
+        'messages': body.get('messages'),
+        'response_format': body.get('response_format')
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def _message_text(message):
+    content = message.get('content')
+    if isinstance(content, list):
+        return '\n'.join(part.get('text', '') for part in content if part.get('type') == 'text')
+    return content or ''
+
+def synthesize_value(schema):
+    """Build a minimal value that validates against a JSON schema."""
+    if 'enum' in schema:
+        return random.choice(schema['enum'])
+    if 'const' in schema:
+        return schema['const']
+    if 'anyOf' in schema:
+        return synthesize_value(schema['anyOf'][0])
+    kind = schema.get('type')
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != 'null'), 'null')
+    if kind == 'object':
+        return {name: synthesize_value(sub) for name, sub in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [synthesize_value(schema.get('items', {}))] if schema.get('minItems', 0) else []
+    if kind == 'integer':
+        return int(schema.get('minimum', 0))
+    if kind == 'number':
+        return float(schema.get('minimum', 0))
+    if kind == 'boolean':
+        return False
+    if kind == 'null':
+        return None
+    return ''
+
+def synthesize_content(body):
+    response_format = body.get('response_format') or {}
+    if response_format.get('type') == 'json_schema':
+        schema = response_format['json_schema'].get('schema', {})
+        return json.dumps(synthesize_value(schema), ensure_ascii=False)
+    user_messages = [m for m in body.get('messages', []) if m.get('role') == 'user']
+    return _message_text(user_messages[-1]) if user_messages else ''
+
+def build_completion(body, content):
+    prompt = ''.join(_message_text(m) for m in body.get('messages', []))
+    prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = estimate_tokens(content)
+    return {
+        'id': 'chatcmpl-' + hashlib.md5(content.encode('utf-8')).hexdigest()[:24],
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'fake'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'finish_reason': 'stop'
+        }],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+    }
+
+class PrefixCache:
+    """Simulated provider prompt cache: a prompt reuses the longest prefix seen before.
+
+    Like the real one it only counts prefixes of at least min_tokens and matches in fixed-size steps.
+    """
+
+    STEP_CHARS = 256
+
+    def __init__(self, min_tokens=1024, max_entries=200000):
+        self.min_tokens = min_tokens
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+    def lookup_and_store(self, prompt):
+        """Return how many prompt tokens would be cache hits, then remember this prompt's prefixes."""
+        digest = hashlib.sha256()
+        prefixes = []
+        for end in range(self.STEP_CHARS, len(prompt) + 1, self.STEP_CHARS):
+            digest.update(prompt[end - self.STEP_CHARS:end].encode('utf-8'))
+            prefixes.append((end, digest.hexdigest()))
+        cached_chars = 0
+        with self.lock:
+            for end, key in prefixes:
+                if key not in self.entries:
+                    break
+                cached_chars = end
+                self.entries.move_to_end(key)
+            for _, key in prefixes:
+                self.entries[key] = True
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        cached_tokens = estimate_tokens(prompt[:cached_chars])
+        return cached_tokens if cached_tokens >= self.min_tokens else 0
+
+def prompt_text(body):
+    """The request as the provider sees it for caching: response format first, then messages."""
+    response_format = json.dumps(body.get('response_format'), sort_keys=True) if body.get('response_format') else ''
+    return response_format + ''.join(_message_text(m) for m in body.get('messages', []))
+
+class Recordings:
+    """Thread-safe JSONL store of {key, response} records."""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.records[record['key']] = record['response']
+
+    def get(self, key):
+        return self.records.get(key)
+
+    def add(self, key, response):
+        with self.lock:
+            self.records[key] = response
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': key, 'response': response}, ensure_ascii=False) + '\n')
+
+class Metrics:
+    """Per-request latency and status counters, resettable between benchmark stages."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.latencies = []
+            self.statuses = {}
+            self.failed_keys = set()
+            self.retries = 0
+            self.aborted_streams = 0
+            self.started = time.monotonic()
+
+    def record(self, key, status, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            # A request repeated after an injected failure is a client retry
+            if key in self.failed_keys:
+                self.retries += 1
+            if status != 200:
+                self.failed_keys.add(key)
+            else:
+                self.failed_keys.discard(key)
+
+    def record_abort(self):
+        with self.lock:
+            self.aborted_streams += 1
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            elapsed = time.monotonic() - self.started
+
+            def percentile(p):
+                if not latencies:
+                    return 0.0
+                return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+            return {
+                'requests': len(latencies),
+                'elapsed': elapsed,
+                'statuses': {str(k): v for k, v in self.statuses.items()},
+                'retries': self.retries,
+                'aborted_streams': self.aborted_streams,
+                'p50': percentile(50),
+                'p99': percentile(99)
+            }
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, mode='synthetic', recordings=None, latency_ms=0, latency_sigma=0.0,
+                 output_tps=0, error_429=0.0, error_5xx=0.0, strict_replay=False, upstream=None,
+                 stream_stall=0.0, prefix_cache_min_tokens=1024):
+        super().__init__(address, FakeOpenAIHandler)
+        self.mode = mode
+        self.recordings = Recordings(recordings)
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.output_tps = output_tps
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.strict_replay = strict_replay
+        self.stream_stall = stream_stall
+        self.upstream = upstream or 'https://api.openai.com/v1'
+        self.prefix_cache = PrefixCache(prefix_cache_min_tokens)
+        self.metrics = Metrics()
+
+    def sample_latency(self, completion_tokens):
+        """Lognormal base latency plus time to emit the output tokens."""
+        latency = 0.0
+        if self.latency_ms:
+            latency = self.latency_ms / 1000 * random.lognormvariate(0, self.latency_sigma)
+        if self.output_tps:
+            latency += completion_tokens / self.output_tps
+        return latency
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self._send_json(200, self.server.metrics.snapshot())
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        if self.path.rstrip('/') == '/stats/reset':
+            self.server.metrics.reset()
+            self._send_json(200, {'ok': True})
+            return
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        started = time.monotonic()
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        key = request_key(body)
+        status, payload, headers = self._complete(body, key)
+        if status == 200 and body.get('stream'):
+            if not self._send_stream(body, payload):
+                self.server.metrics.record_abort()
+        else:
+            self._send_json(status, payload, headers)
+        self.server.metrics.record(key, status, time.monotonic() - started)
+
+    def _send_event(self, payload):
+        self.wfile.write(b'data: ' + json.dumps(payload, ensure_ascii=False).encode('utf-8') + b'\n\n')
+        self.wfile.flush()
+
+    def _send_stream(self, body, response):
+        """Send a completion as chat.completion.chunk events, paced at the simulated output rate.
+
+        Returns False if the client hung up before the end of the stream.
+        """
+        server = self.server
+        content = response['choices'][0]['message'].get('content') or ''
+        base = {'id': response['id'], 'object': 'chat.completion.chunk',
+                'created': response['created'], 'model': response['model']}
+
+        def chunk(delta, finish_reason=None):
+            return {**base, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        try:
+            self._send_event(chunk({'role': 'assistant', 'content': ''}))
+            for i in range(0, len(content), STREAM_CHUNK_CHARS):
+                piece = content[i:i + STREAM_CHUNK_CHARS]
+                if server.output_tps:
+                    time.sleep(estimate_tokens(piece) / server.output_tps)
+                self._send_event(chunk({'content': piece}))
+                if i == 0 and random.random() < server.stream_stall:
+                    # Simulate a hung upstream: keep the connection open without sending anything
+                    time.sleep(3600)
+                    return False
+            self._send_event(chunk({}, 'stop'))
+            if (body.get('stream_options') or {}).get('include_usage'):
+                self._send_event({**base, 'choices': [], 'usage': response.get('usage')})
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. after spotting a sentinel
+            return False
+        return True
+
+    def _complete(self, body, key):
+        server = self.server
+        roll = random.random()
+        if roll < server.error_429:
+            time.sleep(server.sample_latency(0) / 10)
+            return 429, {'error': {'message': 'Rate limit reached (injected)', 'type': 'rate_limit_error'}}, {'retry-after': '1'}
+        if roll < server.error_429 + server.error_5xx:
+            time.sleep(server.sample_latency(0))
+            return 503, {'error': {'message': 'Service unavailable (injected)', 'type': 'server_error'}}, None
+
+        if server.mode == 'record':
+            try:
+                response = self._forward(body)
+            except urllib.error.HTTPError as e:
+                return e.code, json.loads(e.read() or b'{}'), None
+            server.recordings.add(key, response)
+            return 200, response, None
+
+        response = server.recordings.get(key) if server.mode == 'replay' else None
+        if response is None:
+            if server.mode == 'replay' and server.strict_replay:
+                return 404, {'error': {'message': f'No recording for request {key[:12]}'}}, None
+            response = build_completion(body, synthesize_content(body))
+        # Report prefix-cache hits per request, without touching the stored recording
+        usage = dict(response.get('usage') or {})
+        usage['prompt_tokens_details'] = {'cached_tokens': server.prefix_cache.lookup_and_store(prompt_text(body))}
+        response = {**response, 'usage': usage}
+        # A stream pays the base latency up front and then emits its output at output_tps
+        completion_tokens = 0 if body.get('stream') else response.get('usage', {}).get('completion_tokens', 0)
+        time.sleep(server.sample_latency(completion_tokens))
+        return 200, response, None
+
+    def _forward(self, body):
+        request = urllib.request.Request(
+            server_url(self.server.upstream, '/chat/completions'),
+            # Recordings hold whole completions; streams are re-chunked locally
+            data=json.dumps({k: v for k, v in body.items() if k not in ('stream', 'stream_options')}).encode('utf-8'),
+            headers={
+                'Content-Type': 'application/json',
+                'Authorization': self.headers.get('Authorization') or f"Bearer {os.getenv('OPENAI_API_KEY', '')}"
+            }
+        )
+        with urllib.request.urlopen(request, timeout=600) as response:
+            return json.loads(response.read())
+
+def server_url(base, path):
+    return base.rstrip('/') + path
+
+def start_server(host='127.0.0.1', port=0, **options):
+    """Start the server on a background thread and return it."""
+    server = FakeOpenAIServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def add_server_arguments(parser):
+    parser.add_argument('--mode', choices=['synthetic', 'replay', 'record'], default='synthetic',
+                        help='How completions are produced')
+    parser.add_argument('--recordings', default='.github/llm_recordings.jsonl',
+                        help='JSONL file of recorded completions (replay/record modes)')
+    parser.add_argument('--strict-replay', action='store_true',
+                        help='Answer 404 instead of synthesizing when a replayed request has no recording')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Median base latency per request')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Lognormal sigma of the base latency')
+    parser.add_argument('--output-tps', type=float, default=0,
+                        help='Simulated output tokens per second (0 = instant)')
+    parser.add_argument('--error-429', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--error-5xx', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--upstream', default=None, help='Real API base URL for record mode')
+    parser.add_argument('--stream-stall', type=float, default=0.0,
+                        help='Fraction of streams that hang after the first chunk (tests idle timeouts)')
+    parser.add_argument('--prefix-cache-min-tokens', type=int, default=1024,
+                        help='Shortest prompt prefix the simulated provider cache reports as cached')
+
+def server_options(args):
+    return {
+        'mode': args.mode,
+        'recordings': args.recordings,
+        'latency_ms': args.latency_ms,
+        'latency_sigma': args.latency_sigma,
+        'output_tps': args.output_tps,
+        'error_429': args.error_429,
+        'error_5xx': args.error_5xx,
+        'strict_replay': args.strict_replay,
+        'upstream': args.upstream,
+        'stream_stall': args.stream_stall,
+        'prefix_cache_min_tokens': args.prefix_cache_min_tokens
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local OpenAI-compatible stand-in server')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer((args.host, args.port), **server_options(args))
+    print(f"Serving {args.mode} completions on http://{args.host}:{server.server_address[1]}/v1")
+    print(f"Use: OPENAI_BASE_URL=http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping")
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import re
+from tokens import count_tokens
+
+_HEADING = re.compile(r'^#{1,6}\s')
+
+def _split_blocks(text):
+    """Split markdown into heading sections, then into paragraphs."""
+    sections = []
+    current = []
+    for line in text.split('\n'):
+        if _HEADING.match(line) and current:
+            sections.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append('\n'.join(current))
+    return sections
+
+def _split_oversized(block, max_tokens):
+    """Split a block that alone exceeds max_tokens at paragraph, line, then character boundaries."""
+    for separator in ('\n\n', '\n'):
+        parts = block.split(separator)
+        if len(parts) > 1:
+            return [p for part in _pack(parts, max_tokens, separator) for p in _ensure_fits(part, max_tokens)]
+    # A single enormous line: fall back to a hard character split
+    step = max(1, len(block) * max_tokens // max(count_tokens(block), 1))
+    return [block[i:i + step] for i in range(0, len(block), step)]
+
+def _ensure_fits(block, max_tokens):
+    if count_tokens(block) <= max_tokens:
+        return [block]
+    return _split_oversized(block, max_tokens)
+
+def _pack(blocks, max_tokens, separator):
+    """Greedily join consecutive blocks into chunks of at most max_tokens."""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for block in blocks:
+        tokens = count_tokens(block)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(separator.join(current))
+            current = []
+            current_tokens = 0
+        current.append(block)
+        current_tokens += tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+def split_markdown(text, max_tokens):
+    """Split markdown into ordered chunks of at most max_tokens, preferring heading and paragraph boundaries."""
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    blocks = []
+    for section in _split_blocks(text):
+        blocks.extend(_ensure_fits(section, max_tokens))
+    return [chunk for chunk in _pack(blocks, max_tokens, '\n') if chunk.strip()]
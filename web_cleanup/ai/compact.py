@@ -0,0 +1,177 @@
+import os
+import re
+import json
+from urllib.parse import urlparse
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'compact_rules.json')
+
+_IMAGE = re.compile(r'!\[[^\]]*\]\(([^)\s]+)[^)]*\)')
+_LINK = re.compile(r'(?<!!)\[([^\]]*)\]\([^)]*\)')
+_LIST_ITEM = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+')
+_TABLE_RULE = re.compile(r'^[\s|:\-]*$')
+# Link lists under these headings are the article's own citations, not navigation
+_REFERENCE_HEADING = re.compile(
+    r'^\s*(?:#{1,6}\s*|\*\*)?\s*(?:参考资料|参考文献|参考链接|相关链接|引用|注释|脚注|资料来源|'
+    r'references?|sources?|notes|footnotes|bibliography|citations?)\b', re.IGNORECASE)
+_SENTENCE_END = re.compile(r'[。！？.!?;；:：]\s*$')
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    """Load per-domain footer patterns."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {domain: [re.compile(p) for p in patterns]
+            for domain, patterns in rules.get('footerPatterns', {}).items()}
+
+def _visible_text(line):
+    """Text a reader sees: link labels are kept, images and URLs are dropped."""
+    line = _IMAGE.sub('', line)
+    line = _LINK.sub(lambda m: m.group(1), line)
+    return re.sub(r'[\s*_#>|`-]+', '', line)
+
+def _link_text(line):
+    return ''.join(re.sub(r'\s+', '', m.group(1)) for m in _LINK.finditer(_IMAGE.sub('', line)))
+
+def _is_link_only(line):
+    """A line whose visible text is entirely link labels, such as a navigation entry."""
+    if _IMAGE.search(line) or not _LINK.search(line):
+        return False
+    stripped = _LIST_ITEM.sub('', line)
+    visible = _visible_text(stripped)
+    return len(_link_text(stripped)) >= len(visible) - 2
+
+def drop_link_only_blocks(lines, min_run=3):
+    """Drop runs of consecutive link-only lines, e.g. recommendation lists.
+
+    A run right after a reference or footnote heading is kept.
+    """
+    result = []
+    run = []
+    heading = ''
+
+    def flush():
+        if len([l for l in run if l.strip()]) < min_run or _REFERENCE_HEADING.match(heading):
+            result.extend(run)
+        run.clear()
+
+    for line in lines:
+        if _is_link_only(line):
+            run.append(line)
+            continue
+        if not line.strip():
+            # Blank lines inside a link list do not end it
+            (run if run else result).append(line)
+            continue
+        flush()
+        heading = line
+        result.append(line)
+    flush()
+    return result
+
+def _is_navigation(line, max_chars=12):
+    """A link-only line, or a short label without sentence punctuation ("返回顶部", "分享到")."""
+    if _is_link_only(line):
+        return True
+    visible = _visible_text(_LIST_ITEM.sub('', line))
+    return 0 < len(visible) <= max_chars and not _SENTENCE_END.search(line.strip())
+
+def drop_repeated_lines(lines, min_repeats=3):
+    """Keep only the first occurrence of navigation lines repeated at least min_repeats times.
+
+    Article text, table rows and longer lines are never touched, even when repeated.
+    """
+    counts = {}
+    for line in lines:
+        key = line.strip()
+        if key:
+            counts[key] = counts.get(key, 0) + 1
+    seen = set()
+    result = []
+    for line in lines:
+        key = line.strip()
+        if (not key or counts[key] < min_repeats or key.startswith('|')
+                or _TABLE_RULE.match(key) or not _is_navigation(key)):
+            result.append(line)
+            continue
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append(line)
+    return result
+
+def collapse_duplicate_images(lines):
+    """Remove later references to an image URL that was already shown."""
+    seen = set()
+    result = []
+    for line in lines:
+        def replace(match):
+            url = match.group(1)
+            if url in seen:
+                return ''
+            seen.add(url)
+            return match.group(0)
+        new_line = _IMAGE.sub(replace, line)
+        if new_line != line and not new_line.strip():
+            continue
+        result.append(new_line)
+    return result
+
+def drop_link_dense_paragraphs(lines, max_density=0.6, min_links=2):
+    """Remove paragraphs whose visible text is mostly link labels, except citations under a reference heading."""
+    result = []
+    paragraph = []
+    heading = ['']
+
+    def flush():
+        text = '\n'.join(paragraph)
+        visible = sum(len(_visible_text(l)) for l in paragraph)
+        links = len(_LINK.findall(_IMAGE.sub('', text)))
+        density = sum(len(_link_text(l)) for l in paragraph) / visible if visible else 0
+        under_references = _REFERENCE_HEADING.match(heading[0]) or _REFERENCE_HEADING.match(paragraph[0])
+        if _IMAGE.search(text) or links < min_links or density <= max_density or under_references:
+            result.extend(paragraph)
+        heading[0] = paragraph[-1]
+        paragraph.clear()
+
+    for line in lines:
+        if line.strip():
+            paragraph.append(line)
+            continue
+        if paragraph:
+            flush()
+        result.append(line)
+    if paragraph:
+        flush()
+    return result
+
+def cut_footer(lines, patterns):
+    """Cut everything from the first line matching a known footer pattern."""
+    for index, line in enumerate(lines):
+        if any(p.search(line.strip()) for p in patterns):
+            return lines[:index]
+    return lines
+
+def footer_patterns_for(url, rules):
+    """Return the footer patterns configured for the URL's domain or any parent domain."""
+    if not url:
+        return []
+    host = urlparse(url).netloc.lower()
+    patterns = []
+    for domain, domain_patterns in rules.items():
+        if host == domain or host.endswith('.' + domain):
+            patterns.extend(domain_patterns)
+    return patterns
+
+def compact_markdown(text, url=None, rules=None):
+    """Strip boilerplate that the cleanup prompt would otherwise pay to read and drop."""
+    lines = text.split('\n')
+    if rules:
+        lines = cut_footer(lines, footer_patterns_for(url, rules))
+    lines = drop_link_only_blocks(lines)
+    lines = drop_link_dense_paragraphs(lines)
+    lines = collapse_duplicate_images(lines)
+    lines = drop_repeated_lines(lines)
+    # Collapse the blank lines left behind by removed blocks
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip() + '\n'
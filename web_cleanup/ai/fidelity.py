@@ -0,0 +1,68 @@
+import re
+import argparse
+import difflib
+from pathlib import Path
+
+def normalize_lines(text):
+    """Non-empty lines with markdown formatting and whitespace stripped."""
+    lines = []
+    for line in text.split('\n'):
+        line = re.sub(r'[\s*_#>`|-]+', '', line)
+        if line:
+            lines.append(line)
+    return lines
+
+def compare(reference, candidate, source=None):
+    """Compare a candidate cleanup against a reference one (and optionally the source markdown)."""
+    ref_lines = normalize_lines(reference)
+    cand_lines = normalize_lines(candidate)
+    cand_set = set(cand_lines)
+    ref_set = set(ref_lines)
+    result = {
+        'similarity': difflib.SequenceMatcher(None, '\n'.join(ref_lines), '\n'.join(cand_lines), autojunk=False).ratio(),
+        'recall': sum(1 for line in ref_lines if line in cand_set) / len(ref_lines) if ref_lines else 1.0,
+        'precision': sum(1 for line in cand_lines if line in ref_set) / len(cand_lines) if cand_lines else 1.0
+    }
+    if source is not None:
+        # Share of output lines copied verbatim from the source
+        source_set = set(normalize_lines(source))
+        result['verbatim'] = sum(1 for line in cand_lines if line in source_set) / len(cand_lines) if cand_lines else 1.0
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare keep-lines cleanup output against rewrite-mode output')
+    parser.add_argument('reference', help='Directory of rewrite-mode outputs')
+    parser.add_argument('candidate', help='Directory of keep-lines-mode outputs')
+    parser.add_argument('--source', help='Directory of the markdown inputs, to check verbatim copying')
+    parser.add_argument('--pattern', default='*.md', help='File pattern to compare (default: *.md)')
+    args = parser.parse_args()
+
+    reference_dir = Path(args.reference)
+    candidate_dir = Path(args.candidate)
+    rows = []
+    for reference_path in sorted(reference_dir.rglob(args.pattern)):
+        rel_path = reference_path.relative_to(reference_dir)
+        candidate_path = candidate_dir / rel_path
+        if not candidate_path.exists():
+            continue
+        source = None
+        if args.source and (Path(args.source) / rel_path).exists():
+            source = (Path(args.source) / rel_path).read_text(encoding='utf-8')
+        result = compare(reference_path.read_text(encoding='utf-8'), candidate_path.read_text(encoding='utf-8'), source)
+        rows.append((str(rel_path), result))
+
+    if not rows:
+        print("No files found in both directories")
+        return
+
+    print(f"{'file':<50}{'similarity':>11}{'recall':>8}{'precision':>10}{'verbatim':>10}")
+    for name, r in rows:
+        verbatim = f"{r['verbatim']:.3f}" if 'verbatim' in r else '-'
+        print(f"{name[:49]:<50}{r['similarity']:>11.3f}{r['recall']:>8.3f}{r['precision']:>10.3f}{verbatim:>10}")
+    for key in ('similarity', 'recall', 'precision', 'verbatim'):
+        values = [r[key] for _, r in rows if key in r]
+        if values:
+            print(f"Mean {key}: {sum(values) / len(values):.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,16 @@
 import os
+import sys
+import time
+import types
 import openai
 import argparse
 from openai import OpenAI
 from dotenv import load_dotenv
+from llm_cache import LLMCache, make_key
+from llm_ledger import LLMLedger, BudgetExceeded
+from tokens import count_tokens
+from model_router import (routing_enabled, load_policy, choose_route, small_model_name,
+                          cleanup_needs_escalation, ROUTE_DEFAULT, ROUTE_LARGE, ROUTE_ESCALATED)
 
 load_dotenv()
 openai.api_key = os.getenv('OPENAI_API_KEY')
@@ -13,6 +21,17 @@ temperature = os.getenv('OPENAI_TEMPERATURE')
 if not temperature:
     temperature = 0.7
 client = OpenAI()
+cache = LLMCache()
+ledger = LLMLedger()
+
+# Exit codes understood by process_dir.py
+EXIT_FAILED = 1
+EXIT_RATE_LIMITED = 2
+EXIT_BUDGET_EXHAUSTED = 3
+
+# Outputs the cleanup prompt uses to reject a page; streaming stops as soon as one appears
+SENTINELS = ['太长', '爬取错误']
+TOO_LONG = '太长'
 
 def read_file(file_path):
     """Read the content of the input file."""
@@ -24,17 +43,122 @@ def write_file(file_path, content):
     with open(file_path, 'w', encoding='utf-8') as file:
         file.write(content)
 
-def generate_cleanup_content(content):
-    """Send the prompt and content to OpenAI's API and get the cleaned content."""
+def partial_path(file_path):
+    return file_path + '.part'
+
+def leading_sentinel(text):
+    """Return the sentinel the output starts with, or None."""
+    head = text.lstrip()
+    return next((s for s in SENTINELS if head.startswith(s)), None)
 
-    completion = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "user", "content": content}
-                ]
+def stream_completion(model, messages, stream_to, max_output_chars, idle_timeout):
+    """Stream a completion into stream_to as it arrives.
+
+    Returns (text, usage, stop_reason); stop_reason is None for a complete answer,
+    otherwise the answer was cut short and text is the sentinel to write instead.
+    """
+    # Without a stream the read timeout covers the whole generation; here it is the gap between chunks
+    stream = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=idle_timeout
             )
+    parts = []
+    length = 0
+    usage = None
+    stop_reason = None
+    with open(stream_to, 'w', encoding='utf-8') as partial:
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                delta = chunk.choices[0].delta.content
+                parts.append(delta)
+                partial.write(delta)
+                length += len(delta)
+                # Only the first characters can be a sentinel; skip the join once past them
+                sentinel = leading_sentinel(''.join(parts)) if length <= 32 else None
+                if sentinel is not None:
+                    stop_reason = f"output starts with {sentinel}"
+                    parts = [sentinel]
+                    break
+                if max_output_chars and length > max_output_chars:
+                    stop_reason = f"output longer than {max_output_chars} characters"
+                    parts = [TOO_LONG]
+                    break
+        finally:
+            stream.close()
+
+    text = ''.join(parts)
+    if usage is None:
+        # Aborted streams never receive the usage chunk; estimate what was billed
+        prompt = ''.join(m['content'] for m in messages if isinstance(m['content'], str))
+        usage = types.SimpleNamespace(prompt_tokens=count_tokens(prompt),
+                                      completion_tokens=max(count_tokens(text), length // 2))
+    return text, usage, stop_reason
+
+def request_completion(model, messages, route, stream_to=None, max_output_chars=None, idle_timeout=60):
+    """Get a completion from the cache or the API; returns (text, ledger row id).
+
+    With stream_to the answer is streamed into that file as it arrives.
+    """
+    cache_key = make_key(model, temperature, messages)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        print(f"Cache hit: {cache_key[:12]}")
+        return cached, ledger.record(model, cache_hit=True, route=route)
+
+    ledger.check_budget()
+    started = time.monotonic()
+    if stream_to is None:
+        completion = client.chat.completions.create(
+                    model=model,
+                    messages=messages
+                )
+        usage = completion.usage
+        result = str(completion.choices[0].message.content)
+        stop_reason = None
+    else:
+        result, usage, stop_reason = stream_completion(model, messages, stream_to, max_output_chars, idle_timeout)
+    row_id = ledger.record(model, usage, time.monotonic() - started, route=route)
+
+    if stop_reason is not None:
+        # A cut-short answer depends on the caller's limits, so it is not cached
+        print(f"Stopped streaming early: {stop_reason}")
+        ledger.set_outcome(row_id, 'aborted')
+        return result, row_id
+
+    cache.put(cache_key, result)
+    return result, row_id
+
+def generate_cleanup_content(content, stream_to=None, max_output_chars=None, idle_timeout=60):
+    """Send the prompt and content to OpenAI's API and get the cleaned content."""
+    messages = [
+        {"role": "user", "content": content}
+    ]
+    options = {'stream_to': stream_to, 'max_output_chars': max_output_chars, 'idle_timeout': idle_timeout}
+
+    if not routing_enabled():
+        return request_completion(model_name, messages, ROUTE_DEFAULT, **options)[0]
+
+    policy = load_policy()
+    route, reason = choose_route(content, os.getenv('LLM_STAGE'), policy)
+    if route == ROUTE_LARGE:
+        print(f"Routing to {model_name}: {reason}")
+        return request_completion(model_name, messages, route, **options)[0]
 
-    return str(completion.choices[0].message.content)
+    print(f"Routing to {small_model_name()}: {reason}")
+    result, row_id = request_completion(small_model_name(), messages, route, **options)
+    problem = cleanup_needs_escalation(content, result, policy)
+    if problem is None:
+        return result
+    print(f"Escalating to {model_name}: {problem}")
+    ledger.set_outcome(row_id, 'escalated')
+    return request_completion(model_name, messages, ROUTE_ESCALATED, **options)[0]
 
 def main():
     # Set up command-line argument parsing
@@ -43,8 +167,16 @@ def main():
     )
     parser.add_argument('input_file', help='Path to the input .txt file')
     parser.add_argument('output_file', help='Path to save the cleaned output file')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream the answer and stop early on a sentinel or an overlong output')
+    parser.add_argument('--max-output-chars', type=int, default=None,
+                        help='With --stream, give up and write 太长 past this many characters '
+                             '(default: 1.5x the input plus 1000)')
+    parser.add_argument('--idle-timeout', type=float, default=60,
+                        help='With --stream, seconds to wait for the next chunk before failing')
 
     args = parser.parse_args()
+    output_part = partial_path(args.output_file)
 
     try:
 
@@ -52,15 +184,33 @@ def main():
         input_content = read_file(args.input_file)
 
         # Generate cleaned content
-        cleaned_content = generate_cleanup_content(input_content)
+        if args.stream:
+            max_output_chars = args.max_output_chars
+            if max_output_chars is None:
+                max_output_chars = int(len(input_content) * 1.5) + 1000
+            cleaned_content = generate_cleanup_content(input_content, output_part, max_output_chars,
+                                                       args.idle_timeout)
+        else:
+            cleaned_content = generate_cleanup_content(input_content)
 
-        # Write to output file
-        write_file(args.output_file, cleaned_content)
+        # Write to a partial file and rename, so an interrupted run never leaves a truncated output
+        write_file(output_part, cleaned_content)
+        os.replace(output_part, args.output_file)
 
         print(f"Successfully processed '{args.input_file}' and saved to '{args.output_file}'.")
 
+    except BudgetExceeded as e:
+        print(f"LLM budget exhausted: {e}")
+        sys.exit(EXIT_BUDGET_EXHAUSTED)
+    except openai.RateLimitError as e:
+        print(f"Rate limited: {e}")
+        sys.exit(EXIT_RATE_LIMITED)
     except Exception as e:
         print(f"An error occurred: {e}")
+        sys.exit(EXIT_FAILED)
+    finally:
+        if os.path.exists(output_part):
+            os.remove(output_part)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,94 @@
+import io
+import os
+import hashlib
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    import filetype
+except ImportError:
+    filetype = None
+
+DEFAULT_CACHE_DIR = '.github/cache/images'
+DEFAULT_MAX_EDGE = 1568
+DEFAULT_FORMAT = 'webp'
+DEFAULT_QUALITY = 85
+
+# Formats the vision API accepts: name -> (Pillow format, MIME type, extension)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+    'png': ('PNG', 'image/png', '.png')
+}
+
+_MAGIC = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif')
+]
+
+def sniff_mime(data):
+    """Guess an image MIME type from its first bytes."""
+    if filetype is not None:
+        kind = filetype.guess(data[:262])
+        if kind and kind.mime.startswith('image/'):
+            return kind.mime
+    for magic, mime in _MAGIC:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+def _reencode(data, max_edge, image_format, quality):
+    pil_format, mime, _ = FORMATS[image_format]
+    with Image.open(io.BytesIO(data)) as source:
+        # Apply EXIF rotation before the metadata is dropped
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if pil_format == 'JPEG' and image.mode != 'RGB':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.split()[-1])
+            image = background
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+        output = io.BytesIO()
+        # No exif/icc arguments are passed, so metadata is stripped
+        image.save(output, format=pil_format, quality=quality, optimize=True)
+    return output.getvalue(), mime
+
+def prepare_image(image_path, max_edge=DEFAULT_MAX_EDGE, image_format=DEFAULT_FORMAT,
+                  quality=DEFAULT_QUALITY, cache_dir=None):
+    """Downscale and re-encode an image for the API, returning (bytes, mime type).
+
+    Prepared bytes are cached by source hash and settings. Without Pillow the
+    original bytes are returned with a sniffed MIME type.
+    """
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    if Image is None:
+        print("Pillow not installed, sending the original image")
+        return data, sniff_mime(data)
+
+    cache_dir = cache_dir or os.getenv('IMAGE_CACHE_DIR') or DEFAULT_CACHE_DIR
+    source_hash = hashlib.sha256(data).hexdigest()
+    extension = FORMATS[image_format][2]
+    cache_path = os.path.join(cache_dir, f"{source_hash}-{max_edge}-{quality}{extension}")
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            return f.read(), FORMATS[image_format][1]
+
+    prepared, mime = _reencode(data, max_edge, image_format, quality)
+    print(f"Prepared image {image_path}: {len(data)} -> {len(prepared)} bytes ({mime})")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(prepared)
+    os.replace(temp_path, cache_path)
+    return prepared, mime
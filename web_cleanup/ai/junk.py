@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import argparse
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urlparse
+
+import yaml
+
+from compact import footer_patterns_for
+
+DEFAULT_JUNK_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'junk_rules.json')
+
+# Same sentinel the cleanup prompt asks for; file_processor.py discards it.
+# Long pages are not flagged: process_dir.py cleans them in chunks.
+CRAWL_ERROR = '爬取错误'
+
+DEFAULT_JUNK_RULES = {
+    'minChars': 60,
+    'maxLinkDensity': 0.75,
+    'shortPageChars': 1500,
+    'markerLineChars': 40,
+    'blockMarkers': [],
+    'domainSignatures': {},
+    'boilerplate': {'minDocs': 3, 'docRatio': 0.3}
+}
+
+_IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+_LINK = re.compile(r'(?<!!)\[([^\]]*)\]\([^)]*\)')
+_MARKUP = re.compile(r'[\s*_#>|`\-]+')
+_LEADING_MARKUP = re.compile(r'^[\s*_#>|`\-]+')
+_BLOCK_TAGS = {'p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+               'section', 'article', 'header', 'footer', 'blockquote', 'pre', 'table', 'ul', 'ol'}
+_SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head'}
+
+def load_junk_rules(path=DEFAULT_JUNK_RULES_PATH):
+    """Load thresholds, block markers and per-domain error signatures."""
+    rules = dict(DEFAULT_JUNK_RULES)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            rules.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    rules['blockMarkers'] = [re.compile(p) for p in rules['blockMarkers']]
+    rules['domainSignatures'] = {domain: [re.compile(p) for p in patterns]
+                                 for domain, patterns in rules['domainSignatures'].items()}
+    return rules
+
+class _HTMLLines(HTMLParser):
+    """Collect visible text lines of an HTML page with their link text and heading flag."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self._text = []
+        self._links = []
+        self._heading = False
+        self._skip = 0
+        self._anchor = 0
+
+    def _flush(self):
+        text = ''.join(self._text)
+        if text.strip():
+            self.lines.append((text.strip(), ''.join(self._links), self._heading))
+        self._text, self._links, self._heading = [], [], False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag == 'a':
+            self._anchor += 1
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+            self._heading = tag in ('h1', 'h2')
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == 'a':
+            self._anchor = max(0, self._anchor - 1)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self._text.append(data)
+        if self._anchor:
+            self._links.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+def page_lines(text, is_html=False):
+    """Return (line, visible, link_chars, is_heading) for every non-blank line of a page."""
+    if is_html:
+        parser = _HTMLLines()
+        parser.feed(text)
+        parser.close()
+        raw = parser.lines
+    else:
+        raw = []
+        for line in text.split('\n'):
+            if not line.strip():
+                continue
+            links = ''.join(m.group(1) for m in _LINK.finditer(_IMAGE.sub('', line)))
+            raw.append((line.strip(), links, line.lstrip().startswith('#')))
+    result = []
+    for line, links, heading in raw:
+        visible = _MARKUP.sub('', _LINK.sub(lambda m: m.group(1), _IMAGE.sub('', line)))
+        if visible:
+            result.append((line, visible, len(_MARKUP.sub('', links)), heading))
+    return result
+
+def _host(url):
+    return urlparse(url).netloc.lower() if url else ''
+
+def build_boilerplate(pages, rules):
+    """Find lines shared by many pages of the same host, e.g. a block page served for every URL.
+
+    pages is an iterable of (url, text, is_html); returns {host: set of visible lines}.
+    """
+    settings = rules['boilerplate']
+    counts = {}
+    totals = {}
+    for url, text, is_html in pages:
+        host = _host(url)
+        totals[host] = totals.get(host, 0) + 1
+        host_counts = counts.setdefault(host, {})
+        for visible in {visible for _, visible, _, _ in page_lines(text, is_html) if len(visible) >= 4}:
+            host_counts[visible] = host_counts.get(visible, 0) + 1
+    boilerplate = {}
+    for host, host_counts in counts.items():
+        threshold = max(settings['minDocs'], settings['docRatio'] * totals[host])
+        boilerplate[host] = {line for line, count in host_counts.items() if count >= threshold}
+    return boilerplate
+
+def classify(text, url=None, rules=None, boilerplate=None, is_html=False):
+    """Return (sentinel, reason) for a junk page, or (None, None) if it should go to the LLM."""
+    rules = rules or load_junk_rules()
+    lines = page_lines(text, is_html)
+
+    for pattern in footer_patterns_for(url, rules['domainSignatures']):
+        if any(pattern.search(line) for line, _, _, _ in lines):
+            return CRAWL_ERROR, f"domain error signature /{pattern.pattern}/"
+
+    shared = (boilerplate or {}).get(_host(url), set())
+    visible_chars = sum(len(visible) for _, visible, _, _ in lines)
+    shared_chars = sum(len(visible) for _, visible, _, _ in lines if visible in shared)
+    body_chars = sum(len(visible) for _, visible, _, heading in lines if not heading and visible not in shared)
+    if body_chars < rules['minChars']:
+        return CRAWL_ERROR, f"too short ({body_chars} body chars, {shared_chars} chars of shared boilerplate)"
+
+    # Block markers only count on short pages, and only as the title or a whole short line;
+    # an article may well report that a post "已被删除" or quote an "access denied"
+    if visible_chars <= rules['shortPageChars']:
+        marker_lines = [_LEADING_MARKUP.sub('', line) for line, visible, _, heading in lines
+                        if heading or len(visible) <= rules['markerLineChars']]
+        for pattern in rules['blockMarkers']:
+            if any(pattern.search(line) for line in marker_lines):
+                return CRAWL_ERROR, f"block marker /{pattern.pattern}/"
+
+    link_chars = sum(links for _, _, links, _ in lines)
+    if visible_chars and link_chars / visible_chars > rules['maxLinkDensity']:
+        return CRAWL_ERROR, f"link density {link_chars / visible_chars:.0%}"
+
+    return None, None
+
+def _is_html(path):
+    return Path(path).suffix.lower() in ('.html', '.htm')
+
+def _page_links(src_dir):
+    page_yml = Path(src_dir) / 'page.yml'
+    if not page_yml.exists():
+        return {}
+    with open(page_yml, 'r', encoding='utf-8') as f:
+        pages = yaml.safe_load(f) or {}
+    return {Path(name).stem: info.get('link') for name, info in pages.items() if isinstance(info, dict)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Flag blocked and empty pages before AI cleanup')
+    parser.add_argument('src', help='Directory of cleaned HTML or markdown files (with page.yml)')
+    parser.add_argument('--pattern', default='*.*', help='File pattern to match (default: *.*)')
+    parser.add_argument('--rules', default=DEFAULT_JUNK_RULES_PATH, help='Junk detection rules')
+    parser.add_argument('--write', metavar='DST', default=None,
+                        help='Write the sentinel output for flagged files into DST so process_dir.py skips them')
+    args = parser.parse_args()
+
+    rules = load_junk_rules(args.rules)
+    links = _page_links(args.src)
+    files = [f for f in sorted(Path(args.src).rglob(args.pattern)) if f.is_file() and f.name != 'page.yml']
+    pages = []
+    for file_path in files:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            pages.append((file_path, links.get(file_path.stem), f.read()))
+    boilerplate = build_boilerplate(((url, text, _is_html(path)) for path, url, text in pages), rules)
+
+    flagged = 0
+    for file_path, url, text in pages:
+        sentinel, reason = classify(text, url, rules, boilerplate, _is_html(file_path))
+        if sentinel is None:
+            continue
+        flagged += 1
+        print(f"{sentinel}\t{file_path}\t{reason}")
+        if args.write:
+            output_path = Path(args.write) / file_path.relative_to(args.src)
+            if not output_path.exists():
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                output_path.write_text(sentinel, encoding='utf-8')
+
+    print(f"\nFlagged {flagged}/{len(pages)} files as {CRAWL_ERROR}")
+
+if __name__ == '__main__':
+    main()
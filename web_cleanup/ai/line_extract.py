@@ -0,0 +1,57 @@
+import re
+import json
+
+# Structured answer for the keep-lines mode; status carries the same sentinels as the rewrite prompt
+KEEP_LINES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "status": {
+            "type": "string",
+            "enum": ["ok", "太长", "爬取错误"],
+            "description": "ok, or the sentinel for a page that is too long or was not crawled correctly"
+        },
+        "title": {
+            "type": "string",
+            "description": "A title for the article if it has none, otherwise an empty string"
+        },
+        "ranges": {
+            "type": "array",
+            "description": "Inclusive line-number ranges of the article to keep, in order",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "start": {"type": "integer"},
+                    "end": {"type": "integer"}
+                },
+                "required": ["start", "end"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["status", "title", "ranges"],
+    "additionalProperties": False
+}
+
+def number_lines(text):
+    """Prefix every line with its 1-based line number, e.g. '12| text'."""
+    return '\n'.join(f"{i}| {line}" for i, line in enumerate(text.split('\n'), 1))
+
+def parse_result(raw):
+    """Parse a gen_struct.py output file into (status, title, ranges)."""
+    result = json.loads(raw)
+    ranges = [(int(r['start']), int(r['end'])) for r in result.get('ranges', [])]
+    return result.get('status', 'ok'), result.get('title', '').strip(), ranges
+
+def reconstruct(text, ranges, title=''):
+    """Rebuild the article from the kept line ranges; kept lines are copied verbatim."""
+    lines = text.split('\n')
+    keep = set()
+    for start, end in ranges:
+        start, end = max(1, min(start, end)), min(len(lines), max(start, end))
+        keep.update(range(start, end + 1))
+    kept = [lines[i - 1] for i in sorted(keep)]
+    body = re.sub(r'\n{3,}', '\n\n', '\n'.join(kept)).strip()
+    first_line = next((line for line in kept if line.strip()), '')
+    if title and not first_line.lstrip().startswith('#'):
+        body = f"# {title}\n\n{body}"
+    return body + '\n'
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+
+DEFAULT_LEDGER_PATH = '.github/cache/llm_ledger.sqlite'
+
+# USD per million (prompt, completion[, cached prompt]) tokens; override with LLM_PRICES='{"model": [in, out]}'
+DEFAULT_PRICES = {
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60)
+}
+
+class BudgetExceeded(Exception):
+    """Raised when the run or day budget does not allow another LLM call."""
+
+def _env_float(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+def current_run_id():
+    return os.getenv('LLM_RUN_ID') or datetime.now().strftime('%Y-%m-%d')
+
+def load_prices():
+    prices = dict(DEFAULT_PRICES)
+    if os.getenv('LLM_PRICES'):
+        prices.update({model: tuple(p) for model, p in json.loads(os.getenv('LLM_PRICES')).items()})
+    return prices
+
+def estimate_cost(model, prompt_tokens, completion_tokens, prices=None, cached_tokens=0):
+    prices = prices or load_prices()
+    # Dated snapshots (gpt-4o-2024-08-06) are billed like their base model
+    match = max((name for name in prices if model == name or model.startswith(name + '-')), key=len, default=None)
+    if match is None:
+        return 0.0
+    prompt_price, completion_price = prices[match][:2]
+    # Prompt tokens served from the provider's prefix cache are billed at a discount (half by default)
+    cached_price = prices[match][2] if len(prices[match]) > 2 else prompt_price / 2
+    return ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price
+            + completion_tokens * completion_price) / 1_000_000
+
+def cached_prompt_tokens(usage):
+    """Prompt tokens the provider served from its prefix cache, if reported."""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    if isinstance(details, dict):
+        return details.get('cached_tokens') or 0
+    return getattr(details, 'cached_tokens', 0) or 0
+
+class LLMLedger:
+    """SQLite ledger of LLM calls, attributed to run, stage and document."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('LLM_LEDGER_PATH') or DEFAULT_LEDGER_PATH
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS calls ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, day TEXT NOT NULL, '
+                'run_id TEXT NOT NULL, stage TEXT, document TEXT, model TEXT, '
+                'prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL, '
+                'latency REAL NOT NULL, cost REAL NOT NULL, cache_hit INTEGER NOT NULL)'
+            )
+            # Columns added after the first release of the ledger
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(calls)')}
+            for column in ('route', 'outcome'):
+                if column not in columns:
+                    self._conn.execute(f'ALTER TABLE calls ADD COLUMN {column} TEXT')
+            if 'cached_tokens' not in columns:
+                self._conn.execute('ALTER TABLE calls ADD COLUMN cached_tokens INTEGER NOT NULL DEFAULT 0')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_calls_run ON calls(run_id)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_calls_day ON calls(day)')
+            self._conn.commit()
+        return self._conn
+
+    def record(self, model, usage=None, latency=0.0, cache_hit=False, route=None):
+        """Record one call and return its row id; usage is completion.usage or None for cache hits."""
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        cached_tokens = cached_prompt_tokens(usage)
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                'INSERT INTO calls (ts, day, run_id, stage, document, model, prompt_tokens, '
+                'completion_tokens, latency, cost, cache_hit, route, cached_tokens) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (time.time(), datetime.now().strftime('%Y-%m-%d'), current_run_id(),
+                 os.getenv('LLM_STAGE', 'adhoc'), os.getenv('LLM_DOCUMENT'), model,
+                 prompt_tokens, completion_tokens, latency,
+                 estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=cached_tokens),
+                 int(cache_hit), route, cached_tokens)
+            )
+        return cursor.lastrowid
+
+    def set_outcome(self, row_id, outcome):
+        """Mark a recorded call, e.g. as 'escalated' when its answer was not good enough."""
+        conn = self._connect()
+        with conn:
+            conn.execute('UPDATE calls SET outcome = ? WHERE id = ?', (outcome, row_id))
+
+    def totals(self, column, value):
+        """Return (tokens, cost) spent for a run_id or day."""
+        row = self._connect().execute(
+            f'SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0), COALESCE(SUM(cost), 0) '
+            f'FROM calls WHERE {column} = ?', (value,)
+        ).fetchone()
+        return row[0], row[1]
+
+    def check_budget(self):
+        """Raise BudgetExceeded if the current run or day has used up its budget."""
+        limits = [
+            ('run', 'run_id', current_run_id(), _env_float('LLM_RUN_BUDGET_TOKENS'), _env_float('LLM_RUN_BUDGET_USD')),
+            ('day', 'day', datetime.now().strftime('%Y-%m-%d'),
+             _env_float('LLM_DAY_BUDGET_TOKENS'), _env_float('LLM_DAY_BUDGET_USD'))
+        ]
+        for scope, column, value, max_tokens, max_usd in limits:
+            if max_tokens is None and max_usd is None:
+                continue
+            tokens, cost = self.totals(column, value)
+            if max_tokens is not None and tokens >= max_tokens:
+                raise BudgetExceeded(f"{scope} token budget reached: {tokens} >= {max_tokens:.0f}")
+            if max_usd is not None and cost >= max_usd:
+                raise BudgetExceeded(f"{scope} cost budget reached: ${cost:.4f} >= ${max_usd:.2f}")
+
+    def summary(self, run_id=None, day=None):
+        """Aggregate spend by stage for a run or day."""
+        column, value = ('run_id', run_id) if run_id else ('day', day or datetime.now().strftime('%Y-%m-%d'))
+        rows = self._connect().execute(
+            'SELECT stage, COUNT(*), SUM(cache_hit), SUM(prompt_tokens), SUM(completion_tokens), '
+            'SUM(cost), AVG(latency), SUM(cached_tokens) '
+            f'FROM calls WHERE {column} = ? GROUP BY stage ORDER BY SUM(cost) DESC',
+            (value,)
+        ).fetchall()
+        return column, value, rows
+
+    def route_stats(self, run_id=None, day=None):
+        """Per-route call counts, latency percentiles and escalation rate (cache hits excluded)."""
+        column, value = ('run_id', run_id) if run_id else ('day', day or datetime.now().strftime('%Y-%m-%d'))
+        rows = self._connect().execute(
+            f'SELECT route, model, latency, outcome FROM calls WHERE {column} = ? AND cache_hit = 0',
+            (value,)
+        ).fetchall()
+        stats = {}
+        for route, model, latency, outcome in rows:
+            entry = stats.setdefault((route or '-', model), {'latencies': [], 'escalated': 0})
+            entry['latencies'].append(latency)
+            if outcome == 'escalated':
+                entry['escalated'] += 1
+        return column, value, stats
+
+def print_route_stats(ledger=None, run_id=None, day=None):
+    ledger = ledger or LLMLedger()
+    column, value, stats = ledger.route_stats(run_id, day)
+    print(f"\nLLM routes for {column}={value}:")
+    if not stats:
+        print("  No LLM calls recorded")
+        return
+    print(f"  {'route':<11}{'model':<22}{'calls':>7}{'p50 s':>8}{'p90 s':>8}{'escalated':>11}")
+    for (route, model), entry in sorted(stats.items()):
+        latencies = sorted(entry['latencies'])
+        p50 = latencies[len(latencies) // 2]
+        p90 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))]
+        rate = entry['escalated'] / len(latencies)
+        print(f"  {route:<11}{model or '-':<22}{len(latencies):>7}{p50:>8.2f}{p90:>8.2f}{rate:>11.1%}")
+
+def print_summary(ledger=None, run_id=None, day=None):
+    ledger = ledger or LLMLedger()
+    column, value, rows = ledger.summary(run_id, day)
+    print(f"\nLLM spend for {column}={value}:")
+    if not rows:
+        print("  No LLM calls recorded")
+        return
+    print(f"  {'stage':<16}{'calls':>7}{'cached':>8}{'prompt':>10}{'prefix hit':>12}{'completion':>12}"
+          f"{'cost $':>10}{'avg s':>8}")
+    for stage, calls, hits, prompt, completion, cost, latency, prefix_cached in rows:
+        # Share of prompt tokens served from the provider's prefix cache
+        prefix_rate = (prefix_cached or 0) / prompt if prompt else 0.0
+        print(f"  {stage or '-':<16}{calls:>7}{hits or 0:>8}{prompt or 0:>10}{prefix_rate:>12.1%}"
+              f"{completion or 0:>12}{cost or 0:>10.4f}{latency or 0:>8.2f}")
+    total_cost = sum(row[5] or 0 for row in rows)
+    total_tokens = sum((row[3] or 0) + (row[4] or 0) for row in rows)
+    total_prompt = sum(row[3] or 0 for row in rows)
+    total_prefix = sum(row[7] or 0 for row in rows)
+    print(f"  Total: {total_tokens} tokens, ${total_cost:.4f}")
+    if total_prompt:
+        print(f"  Prompt prefix cache: {total_prefix}/{total_prompt} prompt tokens ({total_prefix / total_prompt:.1%})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize LLM token usage and spend')
+    parser.add_argument('--path', default=None, help=f'Ledger database path (default: {DEFAULT_LEDGER_PATH})')
+    parser.add_argument('--run', default=None, help='Summarize one run id (default: today)')
+    parser.add_argument('--day', default=None, help='Summarize one day (YYYY-MM-DD)')
+    parser.add_argument('--routes', action='store_true', help='Show per-route latency and escalation stats')
+    args = parser.parse_args()
+    ledger = LLMLedger(args.path)
+    print_summary(ledger, args.run, args.day)
+    if args.routes:
+        print_route_stats(ledger, args.run, args.day)
+
+if __name__ == "__main__":
+    main()
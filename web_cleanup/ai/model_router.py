@@ -0,0 +1,92 @@
+import os
+import re
+import json
+from tokens import count_tokens
+
+ROUTE_DEFAULT = 'default'
+ROUTE_SMALL = 'small'
+ROUTE_LARGE = 'large'
+ROUTE_ESCALATED = 'escalated'
+
+DEFAULT_POLICY = {
+    # Stages that always start on the small model, whatever their size
+    'small_stages': ['check_related'],
+    # Cleanup inputs up to this many tokens may use the small model
+    'small_max_tokens': 3000,
+    # Structural complexity that sends a page straight to the large model
+    'max_tables': 1,
+    'max_images': 15,
+    'max_headings': 20,
+    # Small-model cleanup output shorter than this fraction of the prompt is suspect
+    'min_output_ratio': 0.15,
+    # Small-model sentinel answers that are retried on the large model
+    'escalate_sentinels': ['太长'],
+    # Structured answers that count as low confidence
+    'low_confidence_values': ['NotSure']
+}
+
+def routing_enabled():
+    return os.getenv('LLM_ROUTING', '').lower() in ('1', 'true', 'yes')
+
+def load_policy():
+    """Default policy, overridden by the JSON file in LLM_ROUTING_POLICY if set."""
+    policy = dict(DEFAULT_POLICY)
+    policy_path = os.getenv('LLM_ROUTING_POLICY')
+    if policy_path:
+        with open(policy_path, 'r', encoding='utf-8') as f:
+            policy.update(json.load(f))
+    return policy
+
+def small_model_name():
+    return os.getenv('OPENAI_SMALL_MODEL_NAME') or 'gpt-4o-mini'
+
+def complexity(content):
+    """Count the structures that small models tend to mangle."""
+    return {
+        'tables': len(re.findall(r'^\s*\|?\s*:?-{3,}', content, re.MULTILINE)),
+        'images': len(re.findall(r'!\[[^\]]*\]\(', content)),
+        'headings': len(re.findall(r'^#{1,6}\s', content, re.MULTILINE))
+    }
+
+def choose_route(content, stage, policy):
+    """Return (route, reason) for a request."""
+    if stage in policy['small_stages']:
+        return ROUTE_SMALL, f"stage {stage}"
+    tokens = count_tokens(content)
+    if tokens > policy['small_max_tokens']:
+        return ROUTE_LARGE, f"{tokens} tokens"
+    counts = complexity(content)
+    if (counts['tables'] > policy['max_tables'] or counts['images'] > policy['max_images']
+            or counts['headings'] > policy['max_headings']):
+        return ROUTE_LARGE, f"complex page {counts}"
+    return ROUTE_SMALL, f"{tokens} tokens"
+
+def cleanup_needs_escalation(prompt, output, policy):
+    """Decide whether a small-model cleanup answer should be redone by the large model."""
+    stripped = output.strip()
+    if not stripped:
+        return "empty output"
+    if stripped in policy['escalate_sentinels']:
+        return f"sentinel {stripped}"
+    if stripped == '爬取错误':
+        return None
+    ratio = count_tokens(stripped) / max(count_tokens(prompt), 1)
+    if ratio < policy['min_output_ratio']:
+        return f"output only {ratio:.0%} of input"
+    return None
+
+def structured_needs_escalation(raw_output, schema, policy):
+    """Decide whether a small-model structured answer is invalid or low confidence."""
+    try:
+        result = json.loads(raw_output)
+    except (TypeError, json.JSONDecodeError):
+        return "invalid JSON"
+    if not isinstance(result, dict):
+        return "not an object"
+    missing = [key for key in schema.get('required', []) if key not in result]
+    if missing:
+        return f"missing {', '.join(missing)}"
+    for key, value in result.items():
+        if value in policy['low_confidence_values']:
+            return f"low confidence {key}={value}"
+    return None
@@ -3,11 +3,37 @@ import argparse
 import tempfile
 import subprocess
 import logging
+import random
+import threading
+import json
+import yaml
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from tokens import count_tokens
+from rate_limit import TokenRateLimiter
+from chunking import split_markdown
+from compact import compact_markdown, load_rules, DEFAULT_RULES_PATH
+from llm_ledger import print_summary, current_run_id
+from line_extract import KEEP_LINES_SCHEMA, number_lines, parse_result, reconstruct
+from junk import classify, build_boilerplate, load_junk_rules, DEFAULT_JUNK_RULES_PATH
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Exit codes used by gen.py (keep in sync with gen.py)
+EXIT_RATE_LIMITED = 2
+EXIT_BUDGET_EXHAUSTED = 3
+
+# Set once gen.py reports the LLM budget is used up; no new work is scheduled after that
+budget_exhausted = threading.Event()
+
+# Sentinel outputs the cleanup prompt asks for; file_processor.py discards them
+TOO_LONG = '太长'
+CRAWL_ERROR = '爬取错误'
+
+# Files answered by the junk detector without an LLM call
+junk_skipped = []
+
 def read_file_content(file_path):
     """Read content from a file with various encodings."""
     encodings = ['utf-8', 'gbk', 'gb2312', 'gb18030']
@@ -22,7 +48,129 @@ def read_file_content(file_path):
     logging.error(f"Failed to read {file_path} with any supported encoding")
     return None
 
-def process_file(file_path, prompt_template, gen_script_path, output_dir, counter, total_files):
+def run_gen(input_content, output_path, gen_script_path, limiter, max_retries, document=None,
+            extra_args=(), output_ratio=1.0):
+    """Run gen.py (or gen_struct.py with extra_args) on input_content, backing off when rate limited."""
+    if budget_exhausted.is_set():
+        return False
+
+    # Budget for the prompt plus the expected output relative to it
+    tokens = int(count_tokens(input_content) * (1 + output_ratio))
+
+    # Create temporary file for input
+    with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.txt') as temp_input:
+        temp_input.write(input_content)
+        temp_input_path = temp_input.name
+
+    try:
+        cmd = [
+            'python', gen_script_path,
+            temp_input_path, output_path, *extra_args
+        ]
+        # Attribute the spend in the LLM ledger
+        env = os.environ.copy()
+        env['LLM_STAGE'] = 'cleanup'
+        env['LLM_DOCUMENT'] = document or output_path
+        for attempt in range(max_retries + 1):
+            limiter.acquire(tokens)
+            result = subprocess.run(cmd, env=env)
+            if result.returncode == 0:
+                return True
+            if result.returncode == EXIT_BUDGET_EXHAUSTED:
+                if not budget_exhausted.is_set():
+                    logging.error("LLM budget exhausted; no new files will be scheduled")
+                budget_exhausted.set()
+                return False
+            if result.returncode != EXIT_RATE_LIMITED or attempt == max_retries:
+                break
+            delay = min(2 ** attempt * 5, 120) * random.uniform(0.8, 1.2)
+            logging.warning(f"Rate limited, backing off {delay:.0f}s (attempt {attempt + 1}/{max_retries})")
+            limiter.backoff(delay)
+        logging.error(f"{os.path.basename(gen_script_path)} exited with code {result.returncode}")
+        return False
+    finally:
+        os.unlink(temp_input_path)
+
+def load_page_links(src_dir):
+    """Map markdown file names to their original URL using page.yml."""
+    page_yml = Path(src_dir) / 'page.yml'
+    if not page_yml.exists():
+        return {}
+    try:
+        with open(page_yml, 'r', encoding='utf-8') as f:
+            pages = yaml.safe_load(f) or {}
+    except Exception as e:
+        logging.warning(f"Failed to read {page_yml}: {e}")
+        return {}
+    return {Path(name).stem: info.get('link') for name, info in pages.items() if isinstance(info, dict)}
+
+def map_chunks(prompts, gen_script_path, limiter, max_retries, workers, document=None,
+               extra_args=(), output_ratio=1.0):
+    """Run one prompt per chunk in parallel and return the outputs in order, or None on failure."""
+    outputs = [None] * len(prompts)
+    with tempfile.TemporaryDirectory() as temp_dir, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for index, prompt in enumerate(prompts):
+            chunk_output = os.path.join(temp_dir, f"{index}.out")
+            future = executor.submit(run_gen, prompt, chunk_output, gen_script_path, limiter, max_retries,
+                                     document, extra_args, output_ratio)
+            futures[future] = (index, chunk_output)
+        for future in as_completed(futures):
+            index, chunk_output = futures[future]
+            if not future.result():
+                return None
+            outputs[index] = read_file_content(chunk_output) or ''
+    return outputs
+
+def stitch_cleaned(outputs):
+    """Stitch cleaned chunks back together in order."""
+    # A chunk of pure boilerplate may come back as a crawl error; drop it.
+    # If any chunk was still too long the stitched article would have a hole, so give up.
+    stripped = [output.strip() for output in outputs]
+    if TOO_LONG in stripped:
+        return TOO_LONG
+    kept = [output for output in stripped if output and output != CRAWL_ERROR]
+    if not kept:
+        return CRAWL_ERROR
+    return '\n\n'.join(kept) + '\n'
+
+def extract_kept_lines(content, prompt_template, limiter, max_retries, document=None):
+    """Ask gen_struct.py which numbered lines to keep and rebuild the article locally."""
+    numbered = number_lines(content)
+    chunks = [numbered]
+    if args.max_chunk_tokens and count_tokens(numbered) > args.max_chunk_tokens:
+        # Line numbers are global, so ranges from every chunk apply to the whole document
+        chunks = split_markdown(numbered, args.max_chunk_tokens)
+    outputs = map_chunks([prompt_template.format(file=chunk) for chunk in chunks], args.gen_struct,
+                         limiter, max_retries, args.chunk_workers, document,
+                         extra_args=(keep_lines_schema_path,), output_ratio=0.05)
+    if outputs is None:
+        return None
+
+    ranges = []
+    title = ''
+    statuses = []
+    for output in outputs:
+        try:
+            status, chunk_title, chunk_ranges = parse_result(output)
+        except (ValueError, KeyError, TypeError) as e:
+            logging.error(f"Invalid keep-lines answer for {document}: {e}")
+            return None
+        statuses.append(status)
+        ranges.extend(chunk_ranges)
+        title = title or chunk_title
+    if TOO_LONG in statuses:
+        return TOO_LONG
+    if not ranges:
+        return CRAWL_ERROR
+    return reconstruct(content, ranges, title)
+
+def gen_args():
+    """Extra gen.py arguments for rewrite mode."""
+    return ('--stream',) if args.stream else ()
+
+def process_file(file_path, prompt_template, gen_script_path, output_dir, counter, total_files,
+                 limiter, max_retries=5, verbose=True):
     """Process a single file using the provided prompt template."""
     # Create output path in dst directory
     rel_path = os.path.relpath(file_path, start=args.src)
@@ -38,10 +186,33 @@ def process_file(file_path, prompt_template, gen_script_path, output_dir, counte
         logging.info(f"Skipping {file_path} - it's a page.yml file")
         return True
 
+    # Leave the file for the next run once the budget is gone
+    if budget_exhausted.is_set():
+        return False
+
     content = read_file_content(file_path)
     if content is None:
         return False
 
+    # Answer blocked, empty and oversized pages locally instead of paying the LLM to say so
+    if junk_rules is not None:
+        sentinel, reason = classify(content, page_links.get(Path(file_path).stem), junk_rules, junk_boilerplate)
+        if sentinel is not None:
+            logging.info(f"Skipping LLM for {file_path} ({reason}): writing {sentinel}")
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(sentinel)
+            junk_skipped.append(file_path)
+            return True
+
+    # Drop navigation, link lists and known footers before paying for them
+    if compact_rules is not None:
+        original_tokens = count_tokens(content)
+        content = compact_markdown(content, page_links.get(Path(file_path).stem), compact_rules)
+        compacted_tokens = count_tokens(content)
+        saved = 1 - compacted_tokens / original_tokens if original_tokens else 0
+        logging.info(f"Compacted {file_path}: {original_tokens} -> {compacted_tokens} tokens (-{saved:.0%})")
+
     # Format the prompt template with the file content
     try:
         input_content = prompt_template.format(file=content)
@@ -49,37 +220,43 @@ def process_file(file_path, prompt_template, gen_script_path, output_dir, counte
         logging.error(f"Invalid placeholder in template: {e}")
         return False
     
-    print("input_content:")
-    print("============================================")
-    print(input_content)
-    print("============================================")
-    print(f"Processed file {counter}/{total_files}")
-
-    # Create temporary file for input
-    with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.txt') as temp_input:
-        temp_input.write(input_content)
-        temp_input_path = temp_input.name
-
-    try:
-        # Run gen.py
-        cmd = [
-            'python', gen_script_path,
-            temp_input_path, output_path
-        ]
-        
-        subprocess.run(cmd, check=True)
-        logging.info(f"Successfully processed {file_path} -> {output_path}")
+    if verbose:
+        print("input_content:")
         print("============================================")
-        print(read_file_content(output_path))
+        print(input_content)
         print("============================================")
-        return True
+    print(f"Processing file {counter}/{total_files}")
 
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error processing {file_path}: {e}")
+    # Make sure nested output directories exist before gen.py writes into them
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    content_tokens = count_tokens(content)
+    if args.mode == 'lines' or (args.max_chunk_tokens and content_tokens > args.max_chunk_tokens):
+        if args.mode == 'lines':
+            # The model only picks line ranges; the text itself is copied verbatim
+            cleaned = extract_kept_lines(content, prompt_template, limiter, max_retries, file_path)
+        else:
+            # Long articles are split and cleaned in parallel instead of coming back as TOO_LONG
+            chunks = split_markdown(content, args.max_chunk_tokens)
+            logging.info(f"Splitting {file_path} ({content_tokens} tokens) into {len(chunks)} chunks")
+            outputs = map_chunks([prompt_template.format(file=chunk) for chunk in chunks], gen_script_path,
+                                 limiter, max_retries, args.chunk_workers, file_path, gen_args())
+            cleaned = stitch_cleaned(outputs) if outputs is not None else None
+        if cleaned is None:
+            logging.error(f"Error processing {file_path}")
+            return False
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(cleaned)
+    elif not run_gen(input_content, output_path, gen_script_path, limiter, max_retries, file_path, gen_args()):
+        logging.error(f"Error processing {file_path}")
         return False
 
-    finally:
-        os.unlink(temp_input_path)
+    logging.info(f"Successfully processed {file_path} -> {output_path}")
+    if verbose:
+        print("============================================")
+        print(read_file_content(output_path))
+        print("============================================")
+    return True
 
 def check_file_sizes(src_dir, pattern, max_size_kb=50):
     """Check if any file in the directory exceeds the maximum size."""
@@ -98,11 +275,33 @@ def main():
     parser.add_argument('dst', help='Destination directory for output files')
     parser.add_argument('prompt', help='Path to prompt template file')
     parser.add_argument('--gen', help='Path to gen.py script', default='.github/downloader/web_cleanup/ai/gen.py')
+    parser.add_argument('--gen-struct', help='Path to gen_struct.py script (lines mode)',
+                        default='.github/downloader/web_cleanup/ai/gen_struct.py')
+    parser.add_argument('--mode', choices=['rewrite', 'lines'], default='rewrite',
+                        help='rewrite: the model re-emits the article; lines: the model returns line ranges '
+                             'to keep (use prompt/keep_lines.template)')
     parser.add_argument('--pattern', default='*.*', help='File pattern to match (default: *.*)')
     parser.add_argument('--skip-size-check', default=True, help='Skip file size check')
+    parser.add_argument('--concurrency', type=int, default=1, help='Number of files to process in parallel')
+    parser.add_argument('--rpm', type=int, default=0, help='Requests-per-minute budget (0 = unlimited)')
+    parser.add_argument('--tpm', type=int, default=0, help='Tokens-per-minute budget (0 = unlimited)')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries per file after a 429 response')
+    parser.add_argument('--max-chunk-tokens', type=int, default=6000,
+                        help='Split documents longer than this many tokens into chunks (0 = never split)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Let gen.py stream answers and stop early on 太长/爬取错误 or runaway output')
+    parser.add_argument('--chunk-workers', type=int, default=4, help='Chunks of one document cleaned in parallel')
+    parser.add_argument('--no-compact', action='store_true', help='Send markdown to the LLM without rule-based compaction')
+    parser.add_argument('--compact-rules', default=DEFAULT_RULES_PATH, help='Per-domain footer patterns for compaction')
+    parser.add_argument('--no-junk-filter', action='store_true',
+                        help='Send blocked, empty and oversized pages to the LLM instead of answering them locally')
+    parser.add_argument('--junk-rules', default=DEFAULT_JUNK_RULES_PATH, help='Junk page detection rules')
 
-    global args
+    global args, compact_rules, junk_rules, page_links, keep_lines_schema_path
     args = parser.parse_args()
+    compact_rules = None if args.no_compact else load_rules(args.compact_rules)
+    junk_rules = None if args.no_junk_filter else load_junk_rules(args.junk_rules)
+    page_links = load_page_links(args.src)
 
     # Check file sizes before processing, unless skipping is specified
     if not check_file_sizes(args.src, args.pattern) and not args.skip_size_check:
@@ -120,17 +319,59 @@ def main():
     # Create destination directory if it doesn't exist
     os.makedirs(args.dst, exist_ok=True)
 
+    # gen_struct.py reads its schema from a file
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as schema_file:
+        json.dump(KEEP_LINES_SCHEMA, schema_file)
+        keep_lines_schema_path = schema_file.name
+    try:
+        run_all(prompt_template)
+    finally:
+        os.unlink(keep_lines_schema_path)
+
+def run_all(prompt_template):
+    """Process every matching file in args.src."""
+
     # Process all files in source directory
     src_path = Path(args.src)
-    files = list(src_path.rglob(args.pattern))
+    files = [f for f in src_path.rglob(args.pattern) if f.is_file()]
     total_files = len(files)
-    counter = 0
+    limiter = TokenRateLimiter(args.rpm, args.tpm)
+
+    # Lines shared by many pages of one site are boilerplate (e.g. the same block page for every URL)
+    global junk_boilerplate
+    junk_boilerplate = {}
+    if junk_rules is not None:
+        pages = [(page_links.get(f.stem), read_file_content(str(f)) or '', False)
+                 for f in files if f.name != 'page.yml']
+        junk_boilerplate = build_boilerplate(pages, junk_rules)
 
-    for file_path in files:
-        if file_path.is_file():
-            counter += 1
-            process_file(str(file_path), prompt_template, args.gen, args.dst, counter, total_files)
+    failed = 0
+    if args.concurrency <= 1:
+        for counter, file_path in enumerate(files, 1):
+            if not process_file(str(file_path), prompt_template, args.gen, args.dst, counter, total_files,
+                                limiter, args.max_retries):
+                failed += 1
             print(f"Processed {counter}/{total_files} files")
+    else:
+        # Keep several gen.py requests in flight; the limiter keeps them within budget
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            futures = {
+                executor.submit(process_file, str(file_path), prompt_template, args.gen, args.dst,
+                                counter, total_files, limiter, args.max_retries, False): file_path
+                for counter, file_path in enumerate(files, 1)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                if not future.result():
+                    failed += 1
+                print(f"Processed {done}/{total_files} files")
+
+    if junk_skipped:
+        logging.info(f"Answered {len(junk_skipped)} junk pages locally without an LLM call")
+    if budget_exhausted.is_set():
+        logging.warning(f"Stopped early: LLM budget exhausted, {failed} files left for the next run")
+    elif failed:
+        logging.warning(f"{failed} files failed and will be retried on the next run")
+    print_summary(run_id=current_run_id())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,60 @@
+import time
+import threading
+from collections import deque
+
+WINDOW_SECONDS = 60
+
+class TokenRateLimiter:
+    """Block callers so requests stay within requests-per-minute and tokens-per-minute budgets.
+
+    A budget of 0 means unlimited. Requests larger than the whole token budget
+    are let through alone once the window is empty, instead of blocking forever.
+    """
+
+    def __init__(self, rpm=0, tpm=0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.events = deque()
+        self.tokens_in_window = 0
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        while self.events and now - self.events[0][0] >= WINDOW_SECONDS:
+            _, tokens = self.events.popleft()
+            self.tokens_in_window -= tokens
+
+    def _wait_time(self, now, tokens):
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rpm and len(self.events) >= self.rpm:
+            return self.events[0][0] + WINDOW_SECONDS - now
+        if self.tpm and self.events and tokens > self.tpm:
+            # Larger than the whole budget: wait until the window is empty
+            return self.events[-1][0] + WINDOW_SECONDS - now
+        if self.tpm and self.events and self.tokens_in_window + tokens > self.tpm:
+            # Wait until enough old requests leave the window to fit this one
+            freed = self.tokens_in_window + tokens - self.tpm
+            for timestamp, event_tokens in self.events:
+                freed -= event_tokens
+                if freed <= 0:
+                    return timestamp + WINDOW_SECONDS - now
+        return 0
+
+    def acquire(self, tokens):
+        """Wait until a request of the given token size fits the budgets, then record it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self.events.append((now, tokens))
+                    self.tokens_in_window += tokens
+                    return
+            time.sleep(min(wait, 5))
+
+    def backoff(self, seconds):
+        """Pause every caller, e.g. after the API answered 429."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
@@ -0,0 +1,44 @@
+from compact import compact_markdown, drop_link_only_blocks, drop_repeated_lines
+
+ARTICLE = """# 标题
+
+第一段正文，介绍事件经过。
+
+这一段在原文中出现了两次。
+
+这一段在原文中出现了两次。
+
+| 年份 | 数值 |
+| --- | --- |
+| 合计 | 10 |
+| 合计 | 10 |
+
+## 参考资料
+
+- [国家统计局公报](https://www.stats.gov.cn/a)
+- [人民日报报道](https://paper.people.com.cn/b)
+- [新华社消息](https://www.news.cn/c)
+"""
+
+def test_article_text_passes_through_unchanged():
+    assert compact_markdown(ARTICLE) == ARTICLE
+
+def test_reference_list_is_kept():
+    lines = ARTICLE.split('\n')
+    assert drop_link_only_blocks(lines) == lines
+
+def test_recommendation_list_is_dropped():
+    lines = ['正文结束。', '', '- [推荐一](https://a/1)', '- [推荐二](https://a/2)', '- [推荐三](https://a/3)', '']
+    assert drop_link_only_blocks(lines) == ['正文结束。', '']
+
+def test_repeated_paragraphs_and_table_rows_are_kept():
+    lines = ['同一句正文重复出现。'] * 3 + ['| 合计 | 10 |'] * 3
+    assert drop_repeated_lines(lines) == lines
+
+def test_repeated_navigation_is_collapsed():
+    lines = ['[首页](https://a/)', '正文。', '[首页](https://a/)', '返回顶部', '[首页](https://a/)', '返回顶部']
+    assert drop_repeated_lines(lines) == ['[首页](https://a/)', '正文。', '返回顶部', '返回顶部']
+
+def test_navigation_repeated_twice_is_kept():
+    lines = ['[首页](https://a/)', '正文。', '[首页](https://a/)']
+    assert drop_repeated_lines(lines) == lines
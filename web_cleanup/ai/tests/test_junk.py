@@ -0,0 +1,23 @@
+from junk import classify, load_junk_rules, CRAWL_ERROR
+
+RULES = load_junk_rules()
+
+def test_short_article_about_deleted_content_is_kept():
+    text = ("# 多篇维权文章被平台删除\n\n"
+            "记者注意到，当事人此前发布的文章已被删除，相关页面不存在后，网友在评论区继续讨论此事，"
+            "并整理了事件的时间线。平台方面暂未回应记者的采访请求。\n")
+    assert classify(text, 'https://www.sohu.com/a/1', RULES) == (None, None)
+
+def test_article_quoting_access_denied_is_kept():
+    text = ("# 访问受限\n\n"
+            "多名用户反映，打开该网站时只看到一行 access denied 的提示，"
+            "运营方称这是防火墙误判所致，已在当天下午恢复正常访问。\n")
+    assert classify(text, 'https://example.com/a', RULES) == (None, None)
+
+def test_block_page_is_flagged():
+    text = "# 页面不存在\n\n抱歉，您访问的页面不存在。\n\n[返回首页](https://example.com/)\n\n" + "请检查网址是否正确，或稍后再试。" * 3 + "\n"
+    assert classify(text, 'https://example.com/a', RULES)[0] == CRAWL_ERROR
+
+def test_long_article_is_not_flagged():
+    text = "# 长文\n\n" + "这是一段很长的正文内容，用来确认长文章不会在本地被判为太长。\n\n" * 5000
+    assert classify(text, 'https://example.com/a', RULES) == (None, None)
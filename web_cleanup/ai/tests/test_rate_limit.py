@@ -0,0 +1,19 @@
+from rate_limit import TokenRateLimiter, WINDOW_SECONDS
+
+def test_request_fitting_the_budget_waits_for_old_requests():
+    limiter = TokenRateLimiter(tpm=100)
+    limiter.events.extend([(0.0, 60), (10.0, 30)])
+    limiter.tokens_in_window = 90
+    assert limiter._wait_time(20.0, 50) == WINDOW_SECONDS - 20.0
+
+def test_request_larger_than_budget_waits_for_empty_window():
+    limiter = TokenRateLimiter(tpm=100)
+    limiter.events.extend([(0.0, 60), (10.0, 30)])
+    limiter.tokens_in_window = 90
+    assert limiter._wait_time(20.0, 150) == 10.0 + WINDOW_SECONDS - 20.0
+
+def test_request_larger_than_budget_passes_alone():
+    limiter = TokenRateLimiter(tpm=100)
+    assert limiter._wait_time(0.0, 150) == 0
+    limiter.acquire(150)
+    assert limiter.tokens_in_window == 150
@@ -28,9 +28,78 @@ function loadConfig() {
 
 const config = loadConfig();
 
+// Metadata fields that never stay in the body; the title is kept as the article heading
+const REMOVABLE_METADATA = ['published', 'author', 'editor', 'source'];
+
+// Same labels and date pattern as normalize_field in config/merge_extracted_meta.py,
+// which decides what is kept; a node is only removed if its value passes there too
+const LABELS = {
+    author: /(?:作者|记者|文)\s*[:：|丨]\s*/,
+    editor: /(?:责任编辑|责编|编辑)\s*[:：|丨]\s*/,
+    source: /(?:来源|来自|出处)\s*[:：|丨]\s*/,
+    published: /(?:发布时间|发布于|发表于|时间|日期)\s*[:：|丨]?\s*/
+};
+const DATE_PATTERN = /(\d{4})\s*[-\/.年]\s*(\d{1,2})\s*[-\/.月]\s*(\d{1,2})/;
+
+function isAccepted(field, text) {
+    if (field === 'published') {
+        return DATE_PATTERN.test(text);
+    }
+    if (LABELS[field]) {
+        if (new RegExp(LABELS[field].source + '[^\\s|丨]+').test(text)) {
+            return true;
+        }
+        // A line that carries another field's label (or a date) is not this field
+        const otherLabel = Object.entries(LABELS).some(([other, label]) => other !== field && label.test(text));
+        if (otherLabel || DATE_PATTERN.test(text)) {
+            return false;
+        }
+    }
+    return true;
+}
+
+// Resolve a "selector" or "selector@attr" entry to a trimmed value and the matched element
+function selectValue($, entry) {
+    const at = entry.lastIndexOf('@');
+    const hasAttr = at > 0 && !entry.slice(at).includes(']');
+    const selector = hasAttr ? entry.slice(0, at) : entry;
+    const element = $(selector).first();
+    if (!element.length) {
+        return null;
+    }
+    const value = hasAttr ? element.attr(entry.slice(at + 1)) : element.text();
+    const text = (value || '').replace(/\s+/g, ' ').trim();
+    return text ? { text, element, fromAttr: hasAttr } : null;
+}
+
+// Extract metadata with the configured selectors; the first accepted match per field wins
+function extractMetadata($) {
+    const metadata = {};
+    const matched = [];
+    Object.entries(config.metadataSelectors || {}).forEach(([field, selectors]) => {
+        for (const entry of selectors) {
+            const result = selectValue($, entry);
+            if (result && isAccepted(field, result.text)) {
+                metadata[field] = result.text;
+                if (REMOVABLE_METADATA.includes(field) && !result.fromAttr) {
+                    matched.push(result.element);
+                }
+                break;
+            }
+        }
+    });
+    return { metadata, matched };
+}
+
 function cleanHTML(htmlContent) {
     const $ = cheerio.load(htmlContent);
 
+    // Read metadata before any removal, since it often lives in the header
+    const { metadata, matched } = extractMetadata($);
+    if (config.removeMetadataNodes) {
+        matched.forEach(element => element.remove());
+    }
+
     // Remove all matched elements using config
     config.selectorsToRemove.forEach(selector => {
         $(selector).remove();
@@ -67,7 +136,7 @@ function cleanHTML(htmlContent) {
         }
     });
 
-    return $.html();
+    return { html: $.html(), metadata };
 }
 
 function processFile(inputPath, outputDir) {
@@ -103,12 +172,19 @@ function processFile(inputPath, outputDir) {
         const htmlContent = fs.readFileSync(inputPath, 'utf8');
 
         // Clean the HTML
-        const cleanedHTML = cleanHTML(htmlContent);
+        const { html, metadata } = cleanHTML(htmlContent);
 
         // Write the cleaned HTML to specified output file
-        fs.writeFileSync(outputPath, cleanedHTML);
+        fs.writeFileSync(outputPath, html);
         console.log(`Successfully cleaned HTML. Saved to: ${outputPath}`);
 
+        // Write extracted metadata next to it; merge_extracted_meta.py moves it into page.yml
+        if (Object.keys(metadata).length) {
+            const metaPath = path.join(outputDir, fileName.replace(/\.html$/i, '.meta.json'));
+            fs.writeFileSync(metaPath, JSON.stringify(metadata, null, 2));
+            console.log(`Extracted metadata (${Object.keys(metadata).join(', ')}) to: ${metaPath}`);
+        }
+
     } catch (error) {
         console.error(`Error processing file: ${error.message}`);
     }
@@ -0,0 +1,110 @@
+import re
+import sys
+import json
+import yaml
+import argparse
+from pathlib import Path
+
+FIELDS = ['title', 'published', 'author', 'editor', 'source']
+
+# Label prefixes sites put in front of the value, e.g. "来源：新华社"
+LABELS = {
+    'author': r'(?:作者|记者|文)\s*[:：|丨]\s*',
+    'editor': r'(?:责任编辑|责编|编辑)\s*[:：|丨]\s*',
+    'source': r'(?:来源|来自|出处)\s*[:：|丨]\s*',
+    'published': r'(?:发布时间|发布于|发表于|时间|日期)\s*[:：|丨]?\s*'
+}
+
+DATE_PATTERN = re.compile(
+    r'(\d{4})\s*[-/.年]\s*(\d{1,2})\s*[-/.月]\s*(\d{1,2})\s*日?'
+    r'(?:[\sT]*(\d{1,2}):(\d{2})(?::(\d{2}))?)?'
+)
+
+def normalize_date(value):
+    """Return 'YYYY-MM-DD[ HH:MM[:SS]]' for the first date in value, or None."""
+    match = DATE_PATTERN.search(value)
+    if not match:
+        return None
+    year, month, day, hour, minute, second = match.groups()
+    date = f"{year}-{int(month):02d}-{int(day):02d}"
+    if hour is not None:
+        date += f" {int(hour):02d}:{minute}"
+        if second is not None:
+            date += f":{second}"
+    return date
+
+def normalize_field(field, value):
+    """Clean one extracted value; several fields may come from the same "time / source" line."""
+    value = re.sub(r'\s+', ' ', str(value)).strip()
+    if field == 'published':
+        return normalize_date(value)
+    if field in LABELS:
+        labeled = re.search(LABELS[field] + r'([^\s|丨]+)', value)
+        if labeled:
+            return labeled.group(1)
+        # A line that carries another field's label (or a date) is not this field
+        if any(re.search(label, value) for other, label in LABELS.items() if other != field) or normalize_date(value):
+            return None
+    return value or None
+
+def merge_extracted_meta(cleaned_dir, page_yml_path):
+    # Read page.yml
+    try:
+        with open(page_yml_path, 'r', encoding='utf-8') as f:
+            pages = yaml.safe_load(f) or {}
+        print(f"Loaded page data with {len(pages)} entries")
+    except Exception as e:
+        print(f"Error reading page.yml: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+    updates = 0
+    for meta_path in sorted(Path(cleaned_dir).glob('*.meta.json')):
+        file_name = meta_path.name[:-len('.meta.json')] + '.html'
+        if file_name not in pages:
+            print(f"No page.yml entry for {file_name}, skipping")
+            continue
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                extracted = json.load(f)
+        except Exception as e:
+            print(f"Error reading {meta_path}: {str(e)}", file=sys.stderr)
+            continue
+
+        meta = {}
+        for field in FIELDS:
+            if field in extracted:
+                value = normalize_field(field, extracted[field])
+                if value:
+                    meta[field] = value
+        if meta:
+            pages[file_name]['meta'] = meta
+            updates += 1
+
+    print(f"Completed with {updates} updates")
+
+    # Write updated page.yml
+    try:
+        with open(page_yml_path, 'w', encoding='utf-8') as f:
+            yaml.dump(pages, f, allow_unicode=True, sort_keys=False)
+        print(f"Successfully updated {page_yml_path} with extracted metadata")
+    except Exception as e:
+        print(f"Error writing output file: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge metadata extracted by clean_cheerio.js into page.yml')
+    parser.add_argument('cleaned_dir',
+                      help='Directory with the cleaned HTML and its .meta.json files')
+    parser.add_argument('page_yml',
+                      help='Path to the page.yml file to update')
+
+    args = parser.parse_args()
+
+    if not Path(args.page_yml).exists():
+        print(f"Error: page.yml not found: {args.page_yml}", file=sys.stderr)
+        sys.exit(1)
+
+    merge_extracted_meta(args.cleaned_dir, args.page_yml)
+
+if __name__ == "__main__":
+    main()